@@ -0,0 +1,47 @@
+-- Búsqueda aproximada de derechohabientes por nombre o CURP
+-- (fertilizantes/busqueda_dh.py).
+--
+-- Tabla de búsqueda materializada con el nombre completo y las CURP ya
+-- en mayúsculas y sin acentos, e índices de trigramas (pg_trgm) para que
+-- "JOSE PEREZ" encuentre a "José Pérez Hernández" o una CURP con un
+-- carácter equivocado sin recorrer millones de renglones.
+--
+-- actualizar_todo.py ejecuta este archivo antes de refrescar las vistas
+-- materializadas (todo es IF NOT EXISTS / OR REPLACE) y luego refresca
+-- mv_busqueda_derechohabientes junto con las demás: los índices se
+-- reconstruyen en cada carga.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() es STABLE; para usarlo en índices hace falta una versión IMMUTABLE
+CREATE OR REPLACE FUNCTION f_normalizar(texto text) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS $$
+    SELECT upper(public.unaccent('public.unaccent'::regdictionary, texto))
+$$;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_busqueda_derechohabientes AS
+SELECT
+    acuse_estatal,
+    curp_solicitud,
+    curp_renapo,
+    concat_ws(' ', ln_nombre, sn_primer_apellido, sn_segundo_apellido) AS nombre_completo,
+    f_normalizar(concat_ws(' ', ln_nombre, sn_primer_apellido, sn_segundo_apellido)) AS nombre_busqueda,
+    f_normalizar(curp_solicitud) AS curp_solicitud_busqueda,
+    f_normalizar(curp_renapo) AS curp_renapo_busqueda,
+    unidad_operativa,
+    estado,
+    municipio_predio_capturada,
+    fecha_entrega
+FROM vw_derechohabientes_con_contexto;
+
+CREATE INDEX IF NOT EXISTS idx_busq_dh_nombre_trgm
+  ON mv_busqueda_derechohabientes USING gin (nombre_busqueda gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_busq_dh_curp_sol_trgm
+  ON mv_busqueda_derechohabientes USING gin (curp_solicitud_busqueda gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_busq_dh_curp_ren_trgm
+  ON mv_busqueda_derechohabientes USING gin (curp_renapo_busqueda gin_trgm_ops);
+
+-- Las consultas (similitud por palabra con el operador de pg_trgm que usa
+-- estos índices) están en fertilizantes/busqueda_dh.py. Este archivo no
+-- lleva el símbolo de porcentaje para poder ejecutarse tal cual desde psycopg2.
@@ -0,0 +1,11 @@
+-- Índices para la paginación por llave (fertilizantes/paginacion.py).
+-- Cada página lee un tramo acotado del índice en lugar de usar OFFSET.
+
+-- vista_fletes: ORDER BY fecha_de_salida DESC NULLS LAST, folio_del_flete DESC
+CREATE INDEX IF NOT EXISTS idx_mv_fletes_enriq_keyset
+  ON mv_fletes_enriquecidos (fecha_de_salida DESC NULLS LAST, folio_del_flete DESC);
+
+-- vista_derechohabientes (vw_derechohabientes_con_contexto se apoya en derechohabientes):
+-- ORDER BY fecha_entrega DESC NULLS LAST, acuse_estatal DESC
+CREATE INDEX IF NOT EXISTS idx_derechohabientes_keyset
+  ON derechohabientes (fecha_entrega DESC NULLS LAST, acuse_estatal DESC);
@@ -0,0 +1,10 @@
+-- Versión de la carga de datos.
+-- actualizar_todo.py registra aquí cada REFRESH MATERIALIZED VIEW;
+-- el sitio web usa MAX(actualizado_en) para invalidar sus cachés.
+CREATE TABLE IF NOT EXISTS version_datos (
+    objeto         TEXT PRIMARY KEY,
+    actualizado_en TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+-- Versión vigente
+SELECT MAX(actualizado_en) FROM version_datos;
@@ -1,10 +1,13 @@
 import os
 import fitz
-import pytesseract
 from PIL import Image, ImageEnhance, ImageFilter
 import io
-import numpy as np
 import pandas as pd
+import sys
+
+# Motor de OCR persistente compartido con la app (fertilizantes/motor_ocr.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fertilizantes import motor_ocr
 
 RUTA_EXPEDIENTES = "/Users/Arturo/AGRICULTURA/EXPEDIENTES"
 GRUPOS = ["PERSONAL SEGALMEX", "PROPUESTAS DE ALTAS"]
@@ -31,8 +34,7 @@ def aplicar_ocr(pixmap):
     img = Image.open(io.BytesIO(img_data)).convert("L")
     img = img.filter(ImageFilter.MedianFilter())
     img = ImageEnhance.Contrast(img).enhance(2.0)
-    img_np = np.array(img)
-    texto = pytesseract.image_to_string(img_np, lang='spa', config='--psm 6')
+    texto = motor_ocr.reconocer(img, lang='spa', config='--psm 6')
     return texto.lower()
 
 # Extracción de texto del PDF
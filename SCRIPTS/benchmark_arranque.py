@@ -0,0 +1,101 @@
+# Mide el arranque en frío del sitio (tiempo de importación):
+#   - worker: django.setup() + importar dashboard.urls (carga fertilizantes.views y todo lo que importa)
+#   - comando: python manage.py check
+# y lista los módulos que más tardan en importarse (python -X importtime).
+#
+# Uso (desde la raíz del proyecto):
+#   python SCRIPTS/benchmark_arranque.py [--repeticiones 5] [--comparar <commit>]
+#
+# Con --comparar se mide también el árbol de ese commit (git worktree temporal)
+# para ver el antes / después.
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CODIGO_WORKER = "import django; django.setup(); import dashboard.urls"
+
+
+def _entorno(raiz):
+    env = dict(os.environ)
+    env["DJANGO_SETTINGS_MODULE"] = "dashboard.settings"
+    env["PYTHONPATH"] = raiz
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def _correr(args, raiz):
+    inicio = time.perf_counter()
+    r = subprocess.run([sys.executable] + args, cwd=raiz, env=_entorno(raiz), capture_output=True, text=True)
+    ms = (time.perf_counter() - inicio) * 1000
+    return ms, r
+
+
+def medir(args, raiz, repeticiones):
+    """Mediana en ms de `repeticiones` ejecuciones (None y el error si falla)."""
+    tiempos = []
+    for _ in range(repeticiones):
+        ms, r = _correr(args, raiz)
+        if r.returncode != 0:
+            return None, (r.stderr or r.stdout).strip().splitlines()[-1:]
+        tiempos.append(ms)
+    return statistics.median(tiempos), None
+
+
+def modulos_lentos(raiz, n=15):
+    """Los n módulos importados directamente con mayor tiempo acumulado (µs)."""
+    _, r = _correr(["-X", "importtime", "-c", CODIGO_WORKER], raiz)
+    filas = []
+    for linea in r.stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _propio, acumulado, modulo = linea[len("import time:"):].split("|", 2)
+        # Sólo módulos de primer nivel (sin sangría) para no contar dos veces
+        if len(modulo) - len(modulo.lstrip()) > 1:
+            continue
+        filas.append((int(acumulado), modulo.strip()))
+    return sorted(filas, reverse=True)[:n]
+
+
+def reporte(nombre, raiz, repeticiones):
+    print(f"\n=== {nombre} ({raiz}) ===")
+    for etiqueta, args in (("worker (setup + urls)", ["-c", CODIGO_WORKER]),
+                           ("manage.py check", ["manage.py", "check"])):
+        ms, error = medir(args, raiz, repeticiones)
+        if ms is None:
+            print(f"  {etiqueta:<24} ❌ falló: {error}")
+        else:
+            print(f"  {etiqueta:<24} {ms:8.0f} ms (mediana de {repeticiones})")
+    print("  Módulos más lentos (acumulado):")
+    for acumulado, modulo in modulos_lentos(raiz):
+        print(f"    {acumulado / 1000:8.1f} ms  {modulo}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque (importación) del sitio")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--comparar", help="commit / rama a medir como 'antes'")
+    args = parser.parse_args()
+
+    if args.comparar:
+        destino = tempfile.mkdtemp(prefix="arranque_")
+        shutil.rmtree(destino)
+        subprocess.run(["git", "worktree", "add", "--detach", destino, args.comparar], cwd=RAIZ,
+                       check=True, capture_output=True)
+        try:
+            reporte(f"antes ({args.comparar})", destino, args.repeticiones)
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", destino], cwd=RAIZ, capture_output=True)
+
+    reporte("actual", RAIZ, args.repeticiones)
+
+
+if __name__ == "__main__":
+    main()
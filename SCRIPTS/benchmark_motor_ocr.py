@@ -0,0 +1,90 @@
+# Compara los motores de OCR (fertilizantes/motor_ocr.py) sobre las mismas imágenes:
+# pytesseract (un proceso tesseract por imagen) vs motor persistente (tesserocr).
+#
+# Uso:
+#   python SCRIPTS/benchmark_motor_ocr.py imagen1.png documento.pdf ... [--repeticiones 3] [--lang spa+eng] [--psm 6]
+#
+# Los PDFs se rasterizan una sola vez (fuera de la medición) a 300 dpi.
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fertilizantes import motor_ocr
+from fertilizantes.ocr import OCR_DPI
+
+try:
+    from pdf2image import convert_from_path
+    HAS_PDF = True
+except Exception:
+    HAS_PDF = False
+
+
+def cargar_imagenes(rutas):
+    imagenes = []
+    for ruta in rutas:
+        if ruta.lower().endswith(".pdf"):
+            if not HAS_PDF:
+                print(f"⚠️ Sin pdf2image, se omite {ruta}")
+                continue
+            paginas = convert_from_path(ruta, dpi=OCR_DPI)
+            imagenes += [(f"{os.path.basename(ruta)} p{i}", img.convert("L")) for i, img in enumerate(paginas, 1)]
+        else:
+            imagenes.append((os.path.basename(ruta), Image.open(ruta).convert("L")))
+    return imagenes
+
+
+def medir(motor, imagenes, lang, config, repeticiones):
+    """Devuelve (ms de la primera imagen, lista de ms del resto, textos de la última vuelta)."""
+    tiempos, textos, primera_ms = [], {}, None
+    for vuelta in range(repeticiones):
+        for nombre, img in imagenes:
+            inicio = time.perf_counter()
+            textos[nombre] = motor.reconocer(img, lang, config).strip()
+            ms = (time.perf_counter() - inicio) * 1000
+            if primera_ms is None:
+                primera_ms = ms  # incluye la carga de modelos en el motor persistente
+            else:
+                tiempos.append(ms)
+    return primera_ms, tiempos, textos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de motores de OCR")
+    parser.add_argument("archivos", nargs="+")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--lang", default="spa+eng")
+    parser.add_argument("--psm", default="6")
+    args = parser.parse_args()
+
+    config = f"--oem 3 --psm {args.psm}"
+    imagenes = cargar_imagenes(args.archivos)
+    if not imagenes:
+        print("❌ No hay imágenes para medir.")
+        return
+
+    motores = ["pytesseract"] + (["persistente"] if motor_ocr.HAS_TESSEROCR else [])
+    if not motor_ocr.HAS_TESSEROCR:
+        print("⚠️ tesserocr no está instalado: sólo se mide pytesseract.")
+
+    print(f"🔎 {len(imagenes)} imagen(es) × {args.repeticiones} repetición(es), lang={args.lang}, {config}\n")
+    resultados = {}
+    for nombre in motores:
+        primera, tiempos, textos = medir(motor_ocr.obtener_motor(nombre), imagenes, args.lang, config, args.repeticiones)
+        resultados[nombre] = textos
+        total = primera + sum(tiempos)
+        resto = f"mediana {statistics.median(tiempos):8.1f} ms" if tiempos else ""
+        print(f"{nombre:<12} primera {primera:8.1f} ms   {resto}   total {total / 1000:7.2f} s")
+
+    if len(resultados) == 2:
+        iguales = sum(resultados["pytesseract"][n] == resultados["persistente"][n] for n, _ in imagenes)
+        print(f"\nTextos idénticos entre motores: {iguales} de {len(imagenes)}")
+
+
+if __name__ == "__main__":
+    main()
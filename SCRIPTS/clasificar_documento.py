@@ -2,11 +2,14 @@
 
 import os
 import fitz  # PyMuPDF
-import pytesseract
 from PIL import Image, ImageEnhance, ImageFilter
 import io
-import numpy as np
 import pandas as pd
+import sys
+
+# Motor de OCR persistente compartido con la app (fertilizantes/motor_ocr.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fertilizantes import motor_ocr
 
 # Configuración base
 RUTA_EXPEDIENTES = "/Users/Arturo/AGRICULTURA/EXPEDIENTES"
@@ -45,8 +48,7 @@ def aplicar_ocr_con_mejoras(pixmap):
     img = img.filter(ImageFilter.MedianFilter())
     enhancer = ImageEnhance.Contrast(img)
     img = enhancer.enhance(2.0)
-    img_np = np.array(img)
-    texto = pytesseract.image_to_string(img_np, lang='spa', config='--psm 6')
+    texto = motor_ocr.reconocer(img, lang='spa', config='--psm 6')
     return texto
 
 # Extraer texto de PDF, aplicar OCR si no hay texto
@@ -5,6 +5,12 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Las vistas async de fertilizantes (consultas en paralelo, ver
+fertilizantes/concurrente.py) sólo corren concurrentes servidas por ASGI,
+p.ej.:  uvicorn dashboard.asgi:application --workers 2
+El aviso de datos nuevos (SSE, fertilizantes/eventos.py) también funciona
+con runserver (WSGI), pero ahí cada pestaña abierta ocupa un hilo.
 """
 
 import os
@@ -38,11 +38,15 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    # Año activo de la sesión (2025 / 2026) para el router de BD
+    'fertilizantes.routers.AnioActivoMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Consultas / tiempo SQL por vista y bitácora de SQL lento (/diagnostico/sql/)
+    'fertilizantes.instrumentacion.MedicionSQLMiddleware',
 ]
 
 ROOT_URLCONF = 'dashboard.urls'
@@ -74,6 +78,33 @@ DATABASES = {
         'PASSWORD': 'Art4125r0',
         'HOST': 'localhost',
         'PORT': '5432',
+        # Conexiones persistentes: se reutilizan entre peticiones del mismo hilo
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    # Operación 2026 (fertilizantes/routers.py: conexion_para_anio / RouterAnio)
+    'fertilizantes_2026': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': 'fertilizantes_2026',
+        'USER': 'postgres',
+        'PASSWORD': 'Art4125r0',
+        'HOST': 'localhost',
+        'PORT': '5432',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+
+DATABASE_ROUTERS = ['fertilizantes.routers.RouterAnio']
+
+
+# Caché en memoria del proceso: catálogos de filtros y resultados ligados a la
+# versión de datos (fertilizantes/version_datos.py), que cambia en cada carga.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fertilizantes',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
     }
 }
 
@@ -0,0 +1,61 @@
+"""
+Totales calculados por PostgreSQL en la misma consulta que trae las filas.
+
+Las vistas de detalle muestran un pie con sumas / máximos / conteos. En
+lugar de recorrer las filas en Python con varios sum(...) y max(...), cada
+total se pide como agregado de ventana sobre el mismo resultado:
+
+    SELECT t.*, COALESCE(SUM(x) OVER (), 0) AS _total_x, ...
+    FROM tabla t WHERE ... ORDER BY ...
+
+El valor llega repetido en cada fila; se toma de la primera y las columnas
+extra se quitan antes de armar las filas. Un solo viaje a la BD, y el pie
+no depende de cuántas filas se procesen en Python.
+"""
+
+PREFIJO_TOTAL = "_total_"
+
+
+def _select_totales(totales) -> str:
+    return ", ".join(
+        f"COALESCE({expr} OVER (), 0) AS {PREFIJO_TOTAL}{nombre}"
+        for nombre, expr in totales.items()
+    )
+
+
+def consultar_tuplas_con_totales(conn, tabla, totales, where="", params=None, orden="", columnas="*"):
+    """
+    Como consultar_con_totales pero sin armar dicts: devuelve
+    (nombres de columna, filas como tuplas, {nombre: valor}).
+    `totales` puede venir vacío.
+    """
+    n = len(totales)
+    extra = f", {_select_totales(totales)}" if n else ""
+    sql = f"SELECT {columnas}{extra} FROM {tabla} {where} {orden}"
+    with conn.cursor() as cur:
+        cur.execute(sql, list(params or []))
+        cols = [d[0] for d in cur.description]
+        crudas = cur.fetchall()
+
+    if not n:
+        return cols, [tuple(f) for f in crudas], {}
+    cols = cols[:-n]
+    if not crudas:
+        return cols, [], {nombre: 0 for nombre in totales}
+    return cols, [tuple(f[:-n]) for f in crudas], dict(zip(totales, crudas[0][-n:]))
+
+
+def consultar_con_totales(conn, tabla, totales, where="", params=None, orden="", columnas="*"):
+    """
+    Ejecuta SELECT {columnas} FROM {tabla} {where} {orden} y en la misma
+    consulta los agregados de `totales`.
+
+    - totales: {nombre: expresión agregada}, p.ej.
+      {"filas": "COUNT(*)", "ton": "SUM(toneladas_iniciales)"}.
+    - conn: conexión de Django o psycopg2 (del pool).
+
+    Devuelve (filas como dicts, {nombre: valor}); sin filas los totales
+    valen 0.
+    """
+    cols, filas, resumen = consultar_tuplas_con_totales(conn, tabla, totales, where, params, orden, columnas)
+    return [dict(zip(cols, f)) for f in filas], resumen
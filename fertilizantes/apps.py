@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class FertilizantesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fertilizantes'
+
+    def ready(self):
+        # Medición de SQL en cada conexión de Django (ver instrumentacion.py)
+        from django.db.backends.signals import connection_created
+        from .instrumentacion import instalar_en_conexion_django
+        connection_created.connect(instalar_en_conexion_django, dispatch_uid="fertilizantes_medicion_sql")
+
+        # Cachés calientes en cuanto hay una carga nueva (ver precalentar.py)
+        from .precalentar import precalentar_en_segundo_plano
+        from .version_datos import al_cambiar_version
+        al_cambiar_version(precalentar_en_segundo_plano)
@@ -0,0 +1,70 @@
+"""
+Búsqueda aproximada de derechohabientes por nombre parcial o CURP con errores.
+
+Consulta mv_busqueda_derechohabientes (QUERIES/busqueda_derechohabientes.sql),
+que se refresca en cada carga y tiene el nombre completo y las CURP en
+mayúsculas y sin acentos con índices GIN de trigramas (pg_trgm). El texto
+buscado se normaliza con la misma función (f_normalizar) y se filtra con
+el operador de similitud por palabra (%>), que usa esos índices: el
+resultado (los N mejores por similitud) sale en milisegundos sin recorrer
+la tabla completa como haría un ILIKE '%...%'.
+
+- Texto con dígitos (p.ej. "PEHJ800101" o una CURP mal escrita): se busca
+  en curp_solicitud y curp_renapo.
+- Cualquier otro texto: en el nombre completo ("jose perez" encuentra a
+  "JOSÉ PÉREZ HERNÁNDEZ").
+"""
+
+MIN_CARACTERES = 3
+LIMITE_DEFECTO = 20
+LIMITE_MAX = 100
+
+_COLUMNAS = """
+    acuse_estatal, curp_solicitud, curp_renapo, nombre_completo,
+    unidad_operativa, estado, municipio_predio_capturada, fecha_entrega
+"""
+
+
+def es_curp(texto: str) -> bool:
+    """Heurística: las CURP llevan dígitos (fecha de nacimiento); los nombres no."""
+    return any(c.isdigit() for c in texto)
+
+
+def buscar_derechohabientes(conn, texto, limite=LIMITE_DEFECTO, estado=None):
+    """
+    Los `limite` derechohabientes más parecidos a `texto`, de mayor a menor
+    similitud, como lista de dicts (con "score" entre 0 y 1).
+    Texto de menos de MIN_CARACTERES → lista vacía.
+    """
+    texto = " ".join((texto or "").split())
+    if len(texto) < MIN_CARACTERES:
+        return []
+    limite = max(1, min(int(limite), LIMITE_MAX))
+
+    if es_curp(texto):
+        texto = texto.replace(" ", "")
+        score = ("GREATEST(word_similarity(f_normalizar(%s), curp_solicitud_busqueda), "
+                 "word_similarity(f_normalizar(%s), curp_renapo_busqueda))")
+        where = ("(curp_solicitud_busqueda %%> f_normalizar(%s) "
+                 "OR curp_renapo_busqueda %%> f_normalizar(%s))")
+        params = [texto, texto, texto, texto]
+    else:
+        score = "word_similarity(f_normalizar(%s), nombre_busqueda)"
+        where = "nombre_busqueda %%> f_normalizar(%s)"
+        params = [texto, texto]
+
+    if estado:
+        where += " AND estado = %s"
+        params.append(estado)
+
+    sql = f"""
+        SELECT {_COLUMNAS}, {score} AS score
+        FROM mv_busqueda_derechohabientes
+        WHERE {where}
+        ORDER BY score DESC, nombre_completo
+        LIMIT %s
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql, params + [limite])
+        cols = [d[0] for d in cur.description]
+        return [dict(zip(cols, f)) for f in cur.fetchall()]
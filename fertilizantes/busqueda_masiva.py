@@ -0,0 +1,98 @@
+"""
+Búsqueda masiva de derechohabientes por acuse o CURP.
+
+Con miles de llaves, `acuse_estatal__in=[...]` en GET rebasa el largo de
+la URL y arma un IN enorme que el planeador resuelve mal contra
+vw_derechohabientes_con_contexto. Aquí las llaves llegan por POST (archivo
+o texto), se cargan con COPY a una tabla temporal y se cruzan con un JOIN:
+
+    SELECT k.llave, base.* FROM _llaves_busqueda k
+    LEFT JOIN (consulta filtrada) base ON base.<campo> = k.llave
+    ORDER BY k.orden
+
+La tabla temporal se crea en la transacción de la conexión del pool que
+hace el COPY ... TO STDOUT de la descarga (exportacion.ExportacionCopy) y
+desaparece con ella. Las llaves salen en el orden en que llegaron; las
+que no existen salen con el resto de columnas vacías.
+"""
+
+import io
+
+# Campos por los que se puede buscar
+CAMPOS_LLAVE = {
+    "acuse_estatal": "Acuse estatal",
+    "curp_solicitud": "CURP solicitud",
+    "curp_renapo": "CURP RENAPO",
+}
+
+# Límite de llaves por petición
+MAX_LLAVES = 500000
+
+TABLA_LLAVES = "_llaves_busqueda"
+
+
+def leer_llaves(campo, archivo=None, texto=""):
+    """
+    Llaves únicas (en orden de llegada) de un archivo .txt/.csv (primera
+    columna de cada renglón) y/o de texto pegado, una por renglón. Se
+    ignoran vacíos y un posible encabezado con el nombre del campo. Las
+    CURP se pasan a mayúsculas.
+    """
+    renglones = []
+    if archivo is not None:
+        crudo = archivo.read()
+        try:
+            contenido = crudo.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            contenido = crudo.decode("latin-1")
+        renglones += contenido.splitlines()
+    if texto:
+        renglones += texto.splitlines()
+
+    llaves = {}
+    for renglon in renglones:
+        # Primera columna si viene como CSV (coma, punto y coma o tabulador)
+        for sep in (",", ";", "\t"):
+            renglon = renglon.split(sep, 1)[0]
+        llave = renglon.strip().strip('"').strip()
+        if not llave or llave.lower() in (campo, CAMPOS_LLAVE[campo].lower()):
+            continue
+        if campo.startswith("curp"):
+            llave = llave.upper()
+        llaves[llave] = None
+    return list(llaves)
+
+
+def preparar_llaves(llaves):
+    """
+    Devuelve la función que, con un cursor de la conexión de la descarga,
+    crea la tabla temporal, le carga las llaves con COPY y la analiza (las
+    tablas temporales no pasan por autovacuum: sin ANALYZE el planeador no
+    sabe cuántas filas tiene).
+    """
+    def preparar(cur):
+        cur.execute(
+            f"CREATE TEMP TABLE {TABLA_LLAVES} (orden integer, llave text) ON COMMIT DROP"
+        )
+        buf = io.StringIO()
+        for i, llave in enumerate(llaves):
+            # Formato texto de COPY: se escapan la diagonal y los separadores
+            llave = llave.replace("\\", "\\\\").replace("\t", " ").replace("\n", " ").replace("\r", " ")
+            buf.write(f"{i}\t{llave}\n")
+        buf.seek(0)
+        cur.copy_expert(f"COPY {TABLA_LLAVES} (orden, llave) FROM STDIN", buf)
+        cur.execute(f"ANALYZE {TABLA_LLAVES}")
+    return preparar
+
+
+def sql_busqueda(sub_sql, campo, columnas):
+    """
+    SELECT de la descarga: la llave buscada y `columnas` [(columna, alias)]
+    de la subconsulta filtrada `sub_sql` (que debe incluir `campo`).
+    """
+    lista = ", ".join(f"base.{col} AS {alias}" for col, alias in columnas)
+    return (
+        f'SELECT k.llave AS "Llave buscada", {lista} '
+        f"FROM {TABLA_LLAVES} k LEFT JOIN ({sub_sql}) AS base ON base.{campo} = k.llave "
+        f"ORDER BY k.orden"
+    )
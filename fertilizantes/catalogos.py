@@ -0,0 +1,86 @@
+"""
+Catálogos de opciones para los filtros (unidad_operativa, estado,
+zona_operativa, ...).
+
+Los valores distintos de cada columna sólo cambian cuando se recargan
+los datos, así que se calculan una vez por carga y se guardan en la
+caché de Django con una llave que incluye la versión de datos
+(ver version_datos.py). Cuando actualizar_todo.py refresca las vistas
+materializadas la versión cambia y los catálogos se recalculan solos.
+
+Todas las columnas pedidas se obtienen en una sola ida y vuelta a la BD.
+"""
+
+import hashlib
+import json
+
+from django.core.cache import cache
+
+from .version_datos import clave_cache
+
+# Respaldo: las llaves ya caducan al cambiar la versión de datos
+CATALOGO_TTL = 24 * 60 * 60
+
+
+def _where_de_filtros(filtros):
+    cond, params = [], []
+    for col, valor in sorted(filtros.items()):
+        if valor:
+            cond.append(f"{col} = %s")
+            params.append(valor)
+    return (f"WHERE {' AND '.join(cond)}" if cond else ""), params
+
+
+def _huella(columnas, filtros) -> str:
+    crudo = json.dumps([list(columnas), sorted((k, v) for k, v in filtros.items() if v)])
+    return hashlib.md5(crudo.encode("utf-8")).hexdigest()
+
+
+def consultar_opciones(conn, tabla, columnas, filtros=None):
+    """
+    Ejecuta (sin caché) un solo SELECT con un ARRAY(SELECT DISTINCT ...)
+    por columna y devuelve {columna: [valores no vacíos ordenados]}.
+    """
+    where, params = _where_de_filtros(filtros or {})
+    partes = [
+        f"ARRAY(SELECT DISTINCT {col} FROM {tabla} {where} ORDER BY 1)"
+        for col in columnas
+    ]
+    with conn.cursor() as cur:
+        cur.execute("SELECT " + ", ".join(partes), params * len(columnas))
+        fila = cur.fetchone()
+    return {
+        col: [v for v in (valores or []) if v not in (None, "")]
+        for col, valores in zip(columnas, fila)
+    }
+
+
+def opciones_filtro(conn, anio, tabla, columnas, filtros=None):
+    """
+    Catálogo en caché de las columnas indicadas de `tabla`.
+
+    - conn: conexión (Django o psycopg2) de la BD del año `anio`.
+    - filtros: {columna: valor} opcional para combos dependientes
+      (p.ej. estados de una unidad operativa).
+
+    Devuelve {columna: [valores]}. Si la consulta falla devuelve listas
+    vacías (y no se guarda en caché) para no romper la página.
+    """
+    filtros = filtros or {}
+    llave = clave_cache(anio, "catalogo", tabla, _huella(columnas, filtros))
+    datos = cache.get(llave) if llave else None
+    if datos is not None:
+        return datos
+
+    try:
+        datos = consultar_opciones(conn, tabla, columnas, filtros)
+    except Exception as e:
+        print(f"Error en catálogo de filtros ({tabla}): {e}")
+        # Conexiones psycopg2 sin autocommit: liberar la transacción abortada
+        try: conn.rollback()
+        except Exception: pass
+        return {col: [] for col in columnas}
+
+    if llave:
+        cache.set(llave, datos, CATALOGO_TTL)
+    return datos
@@ -0,0 +1,103 @@
+"""
+Consultas independientes en paralelo para las vistas async (ASGI).
+
+Una página como vista_fletes_transito_por_CEDA necesita la consulta
+principal y, si el catálogo no está en caché, un DISTINCT por columna de
+filtro. Ninguna depende de otra, así que en lugar de ejecutarlas una tras
+otra sobre el mismo cursor se lanzan juntas con asyncio.gather: cada una
+en un hilo del executor con su propia conexión del pool (conexion.py), y
+la página tarda lo que la consulta más lenta, no la suma.
+
+Un catálogo no toma más de CATALOGO_CONEXIONES conexiones del pool: sus
+columnas se reparten en ese número de grupos y cada grupo es un solo
+SELECT (catalogos.consultar_opciones).
+
+psycopg2 no es async; sync_to_async(thread_sensitive=False) la usa desde
+hilos sin bloquear el event loop. Las conexiones siempre salen del pool
+(también para 2025) para no dejar conexiones de Django abiertas en los
+hilos del executor.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from .agregados import consultar_con_totales
+from .catalogos import CATALOGO_TTL, _huella, consultar_opciones
+from .conexion import get_pooled_conn_for_year
+from .version_datos import clave_cache
+
+# Conexiones del pool que puede ocupar a la vez un mismo catálogo
+CATALOGO_CONEXIONES = 3
+
+
+def _consultar(anio, sql, params):
+    conn = get_pooled_conn_for_year(anio)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql, params or [])
+            cols = [d[0] for d in cur.description]
+            return [dict(zip(cols, f)) for f in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def _consultar_con_totales(anio, *args, **kwargs):
+    conn = get_pooled_conn_for_year(anio)
+    try:
+        return consultar_con_totales(conn, *args, **kwargs)
+    finally:
+        conn.close()
+
+
+def _opciones_columnas(anio, tabla, columnas, filtros):
+    conn = get_pooled_conn_for_year(anio)
+    try:
+        return consultar_opciones(conn, tabla, columnas, filtros)
+    finally:
+        conn.close()
+
+
+async def consultar_async(anio, sql, params=None):
+    """Ejecuta `sql` en una conexión del pool y devuelve lista de dicts."""
+    return await sync_to_async(_consultar, thread_sensitive=False)(anio, sql, params)
+
+
+async def consultar_con_totales_async(anio, tabla, totales, where="", params=None, orden="", columnas="*"):
+    """agregados.consultar_con_totales en una conexión del pool: (filas, totales)."""
+    return await sync_to_async(_consultar_con_totales, thread_sensitive=False)(
+        anio, tabla, totales, where, params, orden, columnas,
+    )
+
+
+async def opciones_filtro_async(anio, tabla, columnas, filtros=None):
+    """
+    Versión async de catalogos.opciones_filtro (misma llave de caché): si
+    el catálogo no está en caché, las columnas se consultan en paralelo en
+    a lo más CATALOGO_CONEXIONES conexiones.
+    """
+    filtros = filtros or {}
+    anio = str(anio)
+    # clave_cache puede leer la versión con la conexión de Django: hilo de la petición
+    llave = await sync_to_async(clave_cache)(anio, "catalogo", tabla, _huella(columnas, filtros))
+    datos = await cache.aget(llave) if llave else None
+    if datos is not None:
+        return datos
+
+    grupos = [columnas[i::CATALOGO_CONEXIONES] for i in range(CATALOGO_CONEXIONES)]
+    try:
+        partes = await asyncio.gather(*(
+            sync_to_async(_opciones_columnas, thread_sensitive=False)(anio, tabla, grupo, filtros)
+            for grupo in grupos if grupo
+        ))
+    except Exception as e:
+        print(f"Error en catálogo de filtros ({tabla}): {e}")
+        return {col: [] for col in columnas}
+
+    datos = {}
+    for parte in partes:
+        datos.update(parte)
+    if llave:
+        await cache.aset(llave, datos, CATALOGO_TTL)
+    return datos
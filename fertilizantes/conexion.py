@@ -1,6 +1,3 @@
-from sqlalchemy import create_engine
-import psycopg2
-
 """
 Capa de conexión para el sistema de Fertilizantes.
 
@@ -9,10 +6,25 @@ Capa de conexión para el sistema de Fertilizantes.
 
 Por compatibilidad:
 - DB_NAME, engine, psycopg_conn siguen apuntando a la BD 2025
-  (como hasta ahora).
+  (como hasta ahora), pero se crean hasta que alguien los usa
+  (get_engine() / get_psycopg_conn()): importar este módulo no abre
+  conexiones ni carga SQLAlchemy, lo que acelera el arranque de cada
+  worker y de manage.py check / migrate.
 - Para 2026 usaremos helpers: get_engine_for_year(2026), get_psycopg_conn_for_year(2026).
+- Las vistas síncronas usan las conexiones persistentes de Django por año
+  (routers.conexion_para_anio). get_pooled_conn_for_year(anio) queda para
+  los hilos de sync_to_async y las descargas con COPY: conexiones tibias
+  de un pool por año, seguro entre hilos; .close() devuelve la conexión
+  al pool en lugar de cerrarla.
 """
 
+import threading
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+from .instrumentacion import CursorMedido
+
 # Configuración base (usuario/host/puerto compartidos)
 DB_USER = "postgres"
 DB_PASSWORD = "Art4125r0"
@@ -23,6 +35,17 @@ DB_PORT = "5432"
 DB_NAME_2025 = "fertilizantes"       # BD actual del sistema (histórica 2025)
 DB_NAME_2026 = "fertilizantes_2026"  # BD nueva para operación 2026
 
+# Tamaño del pool por año (conexiones abiertas como mínimo / como máximo)
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 10
+# Segundos que una petición espera una conexión libre antes de fallar
+POOL_TIMEOUT = 30
+
+
+def _db_name_for_year(anio) -> str:
+    """2026 → DB_NAME_2026; cualquier otro año, por ahora, cae en 2025."""
+    return DB_NAME_2026 if int(anio) == 2026 else DB_NAME_2025
+
 
 def _make_sqlalchemy_url(db_name: str) -> str:
     """Construye la URL de SQLAlchemy para una BD dada."""
@@ -36,12 +59,8 @@ def get_engine_for_year(anio: int):
     - 2026 → BD_NAME_2026
     Cualquier otro año, por ahora, cae en 2025.
     """
-    if anio == 2026:
-        db_name = DB_NAME_2026
-    else:
-        db_name = DB_NAME_2025
-
-    return create_engine(_make_sqlalchemy_url(db_name))
+    from sqlalchemy import create_engine  # SQLAlchemy sólo se carga si se usa
+    return create_engine(_make_sqlalchemy_url(_db_name_for_year(anio)))
 
 
 def get_psycopg_conn_for_year(anio: int):
@@ -50,20 +69,132 @@ def get_psycopg_conn_for_year(anio: int):
     No se mantiene abierta de forma global; la idea es usarla
     con context managers o cerrarla explícitamente después de usarla.
     """
-    if anio == 2026:
-        db_name = DB_NAME_2026
-    else:
-        db_name = DB_NAME_2025
-
     return psycopg2.connect(
-        dbname=db_name,
+        dbname=_db_name_for_year(anio),
         user=DB_USER,
         password=DB_PASSWORD,
         host=DB_HOST,
         port=DB_PORT,
+        cursor_factory=CursorMedido,
     )
 
 
+# ===========================
+# Pool de conexiones por año
+# ===========================
+
+class _PoolAcotado:
+    """
+    ThreadedConnectionPool + semáforo: si el pool está agotado la petición
+    espera (hasta POOL_TIMEOUT) en lugar de abrir más conexiones de las
+    que permite max_connections.
+    """
+
+    def __init__(self, db_name: str):
+        self._pool = pool.ThreadedConnectionPool(
+            POOL_MIN_CONN,
+            POOL_MAX_CONN,
+            dbname=db_name,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT,
+            cursor_factory=CursorMedido,
+        )
+        self._libres = threading.BoundedSemaphore(POOL_MAX_CONN)
+
+    def getconn(self):
+        if not self._libres.acquire(timeout=POOL_TIMEOUT):
+            raise pool.PoolError("No hay conexiones libres en el pool")
+        try:
+            conn = self._pool.getconn()
+            # Descartar conexiones que el servidor cerró mientras estaban ociosas
+            if conn.closed:
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+            return conn
+        except Exception:
+            self._libres.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            estado = conn.get_transaction_status() if not conn.closed else None
+            if estado in (extensions.TRANSACTION_STATUS_INTRANS,
+                          extensions.TRANSACTION_STATUS_INERROR):
+                conn.rollback()
+            # ACTIVE: quedó un comando a medias (p.ej. un COPY cancelado)
+            descartar = conn.closed or estado in (extensions.TRANSACTION_STATUS_UNKNOWN,
+                                                  extensions.TRANSACTION_STATUS_ACTIVE)
+            self._pool.putconn(conn, close=bool(descartar))
+        except Exception:
+            self._pool.putconn(conn, close=True)
+        finally:
+            self._libres.release()
+
+
+class ConexionPool:
+    """
+    Envoltura de una conexión psycopg2 prestada por el pool.
+    Se usa igual que la conexión original (cursor(), commit(), ...);
+    close() la regresa al pool para que la siguiente petición la reutilice.
+    """
+
+    def __init__(self, pool_anio: _PoolAcotado, conn):
+        self._pool_anio = pool_anio
+        self._conn = conn
+
+    def __getattr__(self, nombre):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("La conexión ya fue devuelta al pool")
+        return getattr(self._conn, nombre)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool_anio.putconn(self._conn)
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Misma semántica transaccional que `with conn:` de psycopg2,
+        # pero además regresa la conexión al pool.
+        try:
+            if self._conn is not None and not self._conn.closed:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool_for_year(anio) -> _PoolAcotado:
+    """Devuelve (creándolo la primera vez) el pool de la BD del año indicado."""
+    db_name = _db_name_for_year(anio)
+    pool_anio = _pools.get(db_name)
+    if pool_anio is None:
+        with _pools_lock:
+            pool_anio = _pools.get(db_name)
+            if pool_anio is None:
+                pool_anio = _pools[db_name] = _PoolAcotado(db_name)
+    return pool_anio
+
+
+def get_pooled_conn_for_year(anio) -> ConexionPool:
+    """
+    Presta una conexión del pool del año indicado.
+    Siempre debe cerrarse (conn.close() o `with`) para devolverla al pool.
+    """
+    pool_anio = get_pool_for_year(anio)
+    return ConexionPool(pool_anio, pool_anio.getconn())
+
+
 # ===========================
 # Compatibilidad con el código actual (2025)
 # ===========================
@@ -71,14 +202,35 @@ def get_psycopg_conn_for_year(anio: int):
 # Por compatibilidad, dejamos estas variables apuntando a la BD 2025
 DB_NAME = DB_NAME_2025
 
-# Crear conexión SQLAlchemy para pandas/to_sql (BD 2025)
-engine = create_engine(_make_sqlalchemy_url(DB_NAME_2025))
-
-# Crear conexión psycopg2 para COPY (BD 2025)
-psycopg_conn = psycopg2.connect(
-    dbname=DB_NAME_2025,
-    user=DB_USER,
-    password=DB_PASSWORD,
-    host=DB_HOST,
-    port=DB_PORT,
-)
\ No newline at end of file
+_engine = None
+_psycopg_conn = None
+_compat_lock = threading.Lock()
+
+
+def get_engine():
+    """Engine de SQLAlchemy para pandas/to_sql (BD 2025), creado en el primer uso."""
+    global _engine
+    if _engine is None:
+        with _compat_lock:
+            if _engine is None:
+                _engine = get_engine_for_year(2025)
+    return _engine
+
+
+def get_psycopg_conn():
+    """Conexión psycopg2 compartida (BD 2025), abierta en el primer uso y reabierta si se cerró."""
+    global _psycopg_conn
+    if _psycopg_conn is None or _psycopg_conn.closed:
+        with _compat_lock:
+            if _psycopg_conn is None or _psycopg_conn.closed:
+                _psycopg_conn = get_psycopg_conn_for_year(2025)
+    return _psycopg_conn
+
+
+def __getattr__(nombre):
+    # `conexion.engine` / `conexion.psycopg_conn` siguen funcionando, pero perezosos
+    if nombre == "engine":
+        return get_engine()
+    if nombre == "psycopg_conn":
+        return get_psycopg_conn()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
@@ -0,0 +1,110 @@
+"""
+Conteo de filas para las vistas paginadas.
+
+Un COUNT(*) exacto sobre el padrón nacional suele tardar más que traer la
+página misma, así que el total se resuelve con la estrategia más barata
+que sirva:
+
+- "estimado": sin filtros, se usa la estimación del planeador de
+  PostgreSQL (EXPLAIN), que no lee la tabla.
+- "exacto":   con filtros, el COUNT(*) exacto se guarda en caché por
+  combinación de filtros hasta la siguiente carga de datos.
+- "tope":     si aún no hay conteo exacto en caché, se cuenta como máximo
+  hasta CONTEO_TOPE filas ("más de N"); si el resultado cabe, ya es exacto.
+  El "más de N" también se guarda en caché (misma llave y versión), así
+  que las demás páginas del mismo filtro no repiten el conteo.
+
+El usuario puede pedir el exacto explícitamente (modo="exacto").
+"""
+
+import hashlib
+import json
+
+from django.core.cache import cache
+
+from .version_datos import clave_cache
+
+CONTEO_TOPE = 10000
+CONTEO_TTL = 24 * 60 * 60
+
+
+class Conteo:
+    """Resultado de un conteo: valor y tipo ("exacto", "estimado" o "tope")."""
+
+    def __init__(self, valor, tipo):
+        self.valor = int(valor or 0)
+        self.tipo = tipo
+
+    @property
+    def exacto(self):
+        return self.tipo == "exacto"
+
+    def __repr__(self):
+        return f"Conteo({self.valor}, {self.tipo!r})"
+
+
+def _ejecutar_uno(conn, sql, params):
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchone()[0]
+
+
+def conteo_estimado(conn, origen, where="", params=None) -> int:
+    """Filas estimadas por el planeador (EXPLAIN, sin ejecutar la consulta)."""
+    plan = _ejecutar_uno(conn, f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {origen} {where}", list(params or []))
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def conteo_exacto(conn, origen, where="", params=None) -> int:
+    return _ejecutar_uno(conn, f"SELECT COUNT(*) FROM {origen} {where}", list(params or []))
+
+
+def conteo_con_tope(conn, origen, where="", params=None, tope=CONTEO_TOPE) -> int:
+    """Cuenta a lo más tope + 1 filas; un resultado > tope significa "más de tope"."""
+    sql = f"SELECT COUNT(*) FROM (SELECT 1 FROM {origen} {where} LIMIT {int(tope) + 1}) AS t"
+    return _ejecutar_uno(conn, sql, list(params or []))
+
+
+def _llave(anio, origen, where, params):
+    crudo = json.dumps([origen, where, list(params or [])], default=str)
+    return clave_cache(anio, "conteo", hashlib.md5(crudo.encode("utf-8")).hexdigest())
+
+
+def contar(conn, anio, origen, where="", params=None, con_filtros=None, modo="auto", tope=CONTEO_TOPE) -> Conteo:
+    """
+    Devuelve un Conteo para `origen` (tabla o "(subconsulta) AS base").
+
+    - con_filtros: si no se indica, se deduce de `where`. Para subconsultas
+      del ORM (filtros dentro de `origen`) debe indicarse explícitamente.
+    - modo: "auto" (estimado / exacto en caché / tope) o "exacto".
+    """
+    if con_filtros is None:
+        con_filtros = bool(where)
+
+    if not con_filtros and modo != "exacto":
+        try:
+            return Conteo(conteo_estimado(conn, origen, where, params), "estimado")
+        except Exception as e:
+            print(f"Error estimando conteo de {origen}: {e}")
+
+    llave = _llave(anio, origen, where, params)
+    guardado = cache.get(llave) if llave else None
+    if guardado is not None:
+        valor, tipo = guardado
+        # Un "más de N" en caché no sirve cuando se pide el exacto
+        if tipo == "exacto" or modo != "exacto":
+            return Conteo(valor, tipo)
+
+    tipo = "exacto"
+    if modo != "exacto":
+        valor = conteo_con_tope(conn, origen, where, params, tope)
+        if valor > tope:
+            valor, tipo = tope, "tope"
+    else:
+        valor = conteo_exacto(conn, origen, where, params)
+
+    if llave:
+        cache.set(llave, (valor, tipo), CONTEO_TTL)
+    return Conteo(valor, tipo)
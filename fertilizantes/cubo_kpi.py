@@ -0,0 +1,190 @@
+"""
+Cubo de KPIs de avance nacional (api_kpi_avance_nacional).
+
+En lugar de recalcular avance_operativo_ceda_{anio} × red_distribucion ×
+metas_{anio} en cada carga del tablero, se arma una sola vez por carga de
+datos un cubo con GROUPING SETS sobre (unidad, estado, ceda): cada
+combinación de filtros (nacional, por unidad, por estado, por CEDA y sus
+cruces) queda como una entrada del diccionario en memoria y el endpoint
+sólo hace una búsqueda. La tabla de resumen estatal
+(api_tabla_resumen_por_estado) sale de las celdas (unidad, estado).
+
+Para cada celda se guardan las dos variantes de meta:
+- "operativa": metas por CEDA (a.meta_*), sumadas sobre las filas del grupo.
+- "oficial":   metas por estado (metas_{anio}), cada estado contado una
+  vez; el avance sólo incluye estados que tienen meta oficial.
+
+El cubo se identifica con la versión de datos (version_datos.py): cuando
+actualizar_todo.py refresca las vistas, la siguiente petición lo vuelve
+a construir.
+"""
+
+import threading
+import time
+
+from .routers import conexion_para_anio
+from .version_datos import obtener_version_datos
+
+ABASTO_SQL = (
+    "a.dap_flete + a.urea_flete + a.dap_transfer + a.urea_transfer"
+    " + a.dap_remanente + a.urea_remanente"
+    " - a.dap_transf_out - a.urea_transf_out - a.dap_rem_out - a.urea_rem_out"
+)
+
+# (meta, abasto, entregado, dh_apoyados, ha_apoyadas, meta_dh, meta_ha) sin datos
+_CEROS = (0.0, 0.0, 0.0, 0, 0.0, 0, 0.0)
+
+# Segundos que se reutiliza el cubo si la versión de datos es desconocida
+CUBO_TTL_SIN_VERSION = 60
+
+_cubos = {}
+_cubos_lock = threading.Lock()
+
+
+def _tablas(anio):
+    if anio == "2026":
+        return "avance_operativo_ceda_2026", "red_distribucion_2026", "metas_2026"
+    return f"avance_operativo_ceda_{anio}", "red_distribucion", f"metas_{anio}"
+
+
+def _sql_cubo(anio):
+    tbl_avance, tbl_red, tbl_metas = _tablas(anio)
+    con_meta = "FILTER (WHERE m.estado IS NOT NULL)"
+    return f"""
+        SELECT GROUPING(rd.coordinacion_estatal, rd.estado, rd.id_ceda_agricultura) AS nivel,
+               rd.coordinacion_estatal, rd.estado, rd.id_ceda_agricultura::text,
+               -- meta operativa (por CEDA)
+               SUM(a.meta_total_ton), SUM(a.meta_derechohabientes), SUM(a.meta_superficie_ha),
+               -- avance de todas las filas
+               SUM({ABASTO_SQL}), SUM(a.dap_dh + a.urea_dh), SUM(a.dh_apoyados), SUM(a.ha_apoyadas),
+               -- avance sólo de estados con meta oficial
+               SUM({ABASTO_SQL}) {con_meta}, SUM(a.dap_dh + a.urea_dh) {con_meta},
+               SUM(a.dh_apoyados) {con_meta}, SUM(a.ha_apoyadas) {con_meta},
+               ARRAY_AGG(DISTINCT m.estado) {con_meta}
+        FROM   {tbl_avance} a
+        JOIN   {tbl_red} rd ON rd.id_ceda_agricultura = a.id_ceda_agricultura
+        LEFT JOIN (SELECT estado FROM {tbl_metas} GROUP BY estado) m ON m.estado = rd.estado
+        GROUP BY GROUPING SETS (
+            (),
+            (rd.coordinacion_estatal),
+            (rd.estado),
+            (rd.id_ceda_agricultura),
+            (rd.coordinacion_estatal, rd.estado),
+            (rd.coordinacion_estatal, rd.id_ceda_agricultura),
+            (rd.estado, rd.id_ceda_agricultura),
+            (rd.coordinacion_estatal, rd.estado, rd.id_ceda_agricultura)
+        )
+    """
+
+
+def _sql_metas(anio):
+    return (
+        "SELECT estado, SUM(total_ton), SUM(derechohabientes), SUM(superficie_ha)"
+        f" FROM {_tablas(anio)[2]} GROUP BY estado"
+    )
+
+
+def _num(v, tipo=float):
+    return tipo(v or 0)
+
+
+def construir_cubo(anio) -> dict:
+    """
+    Consulta la BD y devuelve {(unidad, estado, ceda): {"operativa": (...),
+    "oficial": (...)}}, donde None en la llave significa "sin filtro" en esa
+    dimensión y cada tupla es (meta, abasto, entregado, dh_apoyados,
+    ha_apoyadas, meta_dh, meta_ha).
+    """
+    anio = str(anio)
+    with conexion_para_anio(anio).cursor() as cur:
+        cur.execute(_sql_metas(anio))
+        metas = {e: (_num(t), _num(d, int), _num(h)) for e, t, d, h in cur.fetchall()}
+        cur.execute(_sql_cubo(anio))
+        filas = cur.fetchall()
+
+    cubo = {}
+    for (nivel, unidad, estado, ceda,
+         meta, meta_dh, meta_ha, abasto, entregado, dh, ha,
+         abasto_of, entregado_of, dh_of, ha_of, estados_meta) in filas:
+        # GROUPING(): bit 2 = unidad, 1 = estado, 0 = ceda (1 → dimensión agregada)
+        llave = (
+            None if nivel & 4 else unidad,
+            None if nivel & 2 else estado,
+            None if nivel & 1 else ceda,
+        )
+        # Un valor NULL real en una dimensión agrupada no es filtrable
+        if any(v is None for v, bit in zip(llave, (4, 2, 1)) if not nivel & bit):
+            continue
+        metas_of = [metas[e] for e in (estados_meta or []) if e in metas]
+        cubo[llave] = {
+            "operativa": (_num(meta), _num(abasto), _num(entregado), _num(dh, int), _num(ha),
+                          _num(meta_dh, int), _num(meta_ha)),
+            # None: ningún estado del grupo tiene meta oficial
+            "oficial": (sum(m[0] for m in metas_of), _num(abasto_of), _num(entregado_of),
+                        _num(dh_of, int), _num(ha_of),
+                        sum(m[1] for m in metas_of), sum(m[2] for m in metas_of)) if metas_of else None,
+        }
+    return cubo
+
+
+def obtener_cubo(anio) -> dict:
+    """
+    Cubo vigente del año; se reconstruye si cambió la versión de datos. Con
+    versión desconocida ("0") se reutiliza a lo más CUBO_TTL_SIN_VERSION
+    segundos, para no quedarse con KPIs viejos indefinidamente.
+    """
+    anio = str(anio)
+    version = obtener_version_datos(anio)
+
+    def vigente(actual):
+        if not actual or actual[0] != version:
+            return False
+        return version != "0" or time.monotonic() - actual[2] < CUBO_TTL_SIN_VERSION
+
+    actual = _cubos.get(anio)
+    if vigente(actual):
+        return actual[1]
+
+    with _cubos_lock:
+        # Otro hilo pudo construirlo mientras se esperaba el candado
+        actual = _cubos.get(anio)
+        if vigente(actual):
+            return actual[1]
+        cubo = construir_cubo(anio)
+        _cubos[anio] = (version, cubo, time.monotonic())
+        return cubo
+
+
+def consultar_kpi(anio, unidad=None, estado=None, ceda=None, tipo_meta="operativa"):
+    """
+    Devuelve (meta, abasto, entregado, dh_apoyados, ha_apoyadas, meta_dh,
+    meta_ha) para la combinación de filtros. La meta oficial es por estado,
+    así que con filtro de CEDA siempre se usa la operativa.
+    """
+    if tipo_meta != "oficial" or ceda:
+        tipo_meta = "operativa"
+    celda = obtener_cubo(anio).get((unidad or None, estado or None, ceda or None))
+    if celda is None or celda[tipo_meta] is None:
+        return _CEROS
+    return celda[tipo_meta]
+
+
+def resumen_por_estado(anio, unidad=None, estado=None, tipo_meta="operativa"):
+    """
+    Filas de la tabla de resumen estatal: una por estado (dentro de la
+    unidad, si se indica), tomadas de las celdas (unidad, estado) del cubo.
+    Con meta oficial se omiten los estados sin meta oficial.
+    """
+    if tipo_meta != "oficial":
+        tipo_meta = "operativa"
+    filas = []
+    for (u, e, c), celda in obtener_cubo(anio).items():
+        if c is not None or e is None or u != (unidad or None):
+            continue
+        if estado and e != estado:
+            continue
+        valores = celda[tipo_meta]
+        if valores is not None:
+            filas.append((e,) + valores)
+    filas.sort(key=lambda f: f[0])
+    return filas
@@ -0,0 +1,84 @@
+"""
+Aviso de datos nuevos por Server-Sent Events (/api/eventos/version/).
+
+Los tableros abren un EventSource en lugar de que el operador recargue la
+página para ver si ya terminó la carga de las 5 a.m. (y con cada recarga
+se vuelvan a pedir los KPIs). El flujo manda un evento "version" con la
+versión de datos vigente del año activo (version_datos.py) al conectarse
+y cada vez que cambia; entre eventos sólo manda un comentario de latido.
+El navegador vuelve a pedir los KPIs únicamente cuando llega una versión
+distinta de la que ya pintó.
+
+La versión se lee de la memoria del proceso (VERSION_TTL): con cualquier
+número de pestañas abiertas el proceso consulta la BD a lo más una vez
+por VERSION_TTL. Cada conexión dura EVENTOS_DURACION segundos y el
+navegador se reconecta solo; en la reconexión manda Last-Event-ID (la
+última versión que recibió) y si no hay nada nuevo no se repite el evento.
+
+Con ASGI (uvicorn dashboard.asgi:application) la vista usa flujo_version:
+cada conexión abierta es una corrutina dormida, no un hilo ocupado. Con
+WSGI (manage.py runserver, como lo arranca fertilizantes_dashboard_app.command)
+Django consumiría completo un generador async antes de mandar un solo
+byte, así que ahí se usa flujo_version_wsgi: un generador normal que
+duerme en el hilo de la petición. Como ese hilo queda ocupado mientras la
+pestaña está abierta, cada conexión WSGI dura sólo EVENTOS_DURACION_WSGI
+segundos; el navegador se reconecta igual.
+"""
+
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+
+from .version_datos import obtener_version_datos
+
+# Segundos entre revisiones de la versión (y latidos)
+EVENTOS_INTERVALO = 10
+# Segundos que dura cada conexión antes de que el navegador se reconecte
+EVENTOS_DURACION = 300
+# Lo mismo con WSGI, donde cada conexión ocupa un hilo del servidor
+EVENTOS_DURACION_WSGI = 60
+# Espera que se le indica al navegador antes de reconectarse (ms)
+EVENTOS_REINTENTO_MS = 5000
+
+
+def _evento_version(anio, version) -> str:
+    datos = json.dumps({"anio": anio, "version": version})
+    return f"id: {version}\nevent: version\ndata: {datos}\n\n"
+
+
+def _mensaje(anio, version, ultima) -> str:
+    """Evento si la versión es distinta de la que ya tiene el cliente, si no latido."""
+    return _evento_version(anio, version) if version != ultima else ": latido\n\n"
+
+
+async def flujo_version(anio, ultima=None):
+    """
+    Generador async del flujo text/event-stream (ASGI). `ultima` es la
+    versión que el cliente ya tiene (Last-Event-ID), si la hay.
+    """
+    anio = str(anio)
+    yield f"retry: {EVENTOS_REINTENTO_MS}\n\n"
+    fin = time.monotonic() + EVENTOS_DURACION
+    while True:
+        version = await sync_to_async(obtener_version_datos)(anio)
+        yield _mensaje(anio, version, ultima)
+        ultima = version
+        if time.monotonic() >= fin:
+            return
+        await asyncio.sleep(EVENTOS_INTERVALO)
+
+
+def flujo_version_wsgi(anio, ultima=None):
+    """Mismo flujo que flujo_version como generador normal, para WSGI."""
+    anio = str(anio)
+    yield f"retry: {EVENTOS_REINTENTO_MS}\n\n"
+    fin = time.monotonic() + EVENTOS_DURACION_WSGI
+    while True:
+        version = obtener_version_datos(anio)
+        yield _mensaje(anio, version, ultima)
+        ultima = version
+        if time.monotonic() >= fin:
+            return
+        time.sleep(EVENTOS_INTERVALO)
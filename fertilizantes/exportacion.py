@@ -0,0 +1,381 @@
+"""
+Exportaciones grandes en streaming.
+
+Dos motores, ambos con conexión del pool (conexion.py) que se devuelve en
+cuanto termina la descarga o el cliente se desconecta (Django cierra el
+iterador de la StreamingHttpResponse):
+
+- ExportacionCopy: PostgreSQL genera el CSV con
+  COPY (SELECT ...) TO STDOUT WITH CSV HEADER y los bytes pasan directo
+  al cliente; Python no toca fila por fila. Es el que usan las descargas CSV.
+- FilasServidor: cursor con nombre (server-side) que entrega lotes de
+  TAM_LOTE filas, para formatos que sí necesitan las filas en Python
+  (Parquet / Arrow: un record batch por lote, requiere pyarrow).
+"""
+
+import decimal
+import importlib.util
+import queue
+import threading
+import uuid
+
+from django.http import StreamingHttpResponse
+
+from .conexion import get_pooled_conn_for_year
+
+# pyarrow pesa: sólo se comprueba que exista y se importa en la primera descarga
+HAS_ARROW = importlib.util.find_spec("pyarrow") is not None
+pa = pq = None
+
+
+def _cargar_arrow():
+    global pa, pq
+    if pq is None:
+        import pyarrow
+        import pyarrow.parquet
+        pa, pq = pyarrow, pyarrow.parquet
+
+TAM_LOTE = 5000
+
+# BOM para que Excel abra el CSV como UTF-8
+BOM = "\ufeff"
+
+# COPY: tamaño de cada bloque enviado al cliente y bloques en espera como máximo
+TAM_BLOQUE_COPY = 256 * 1024
+BLOQUES_EN_COLA = 16
+
+
+def comillas_ident(nombre: str) -> str:
+    """Identificador SQL entre comillas dobles (para alias con espacios/acentos)."""
+    return '"' + nombre.replace('"', '""') + '"'
+
+
+class FilasServidor:
+    """
+    Cursor con nombre sobre una conexión del pool.
+
+    La consulta se ejecuta al construir el objeto (los errores de SQL salen
+    antes de empezar a responder); iterar entrega lotes de filas y al
+    terminar, o al llamar close(), se libera el cursor y la conexión.
+    """
+
+    def __init__(self, anio, sql, params=None, tam_lote=TAM_LOTE):
+        self._tam_lote = tam_lote
+        self._conn = get_pooled_conn_for_year(anio)
+        self._cur = None
+        try:
+            self._cur = self._conn.cursor(name=f"exportar_{uuid.uuid4().hex}")
+            self._cur.itersize = tam_lote
+            self._cur.execute(sql, params or [])
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def description(self):
+        """Descripción de columnas (en cursores con nombre, tras el primer fetch)."""
+        return self._cur.description
+
+    def lotes(self):
+        try:
+            while True:
+                lote = self._cur.fetchmany(self._tam_lote)
+                if not lote:
+                    break
+                yield lote
+        finally:
+            self.close()
+
+    def close(self):
+        if self._conn is None:
+            return
+        try:
+            if self._cur is not None and not self._cur.closed:
+                self._cur.close()
+        except Exception:
+            pass
+        finally:
+            self._conn.close()
+            self._conn = None
+
+
+# ===========================
+# COPY ... TO STDOUT
+# ===========================
+
+_FIN = object()
+
+
+class _Cancelada(Exception):
+    pass
+
+
+class _EscritorCola:
+    """
+    Archivo falso para copy_expert: junta los bytes en bloques y los pasa a
+    una cola acotada (si el cliente es lento, COPY espera en vez de llenar
+    la memoria). El primer bloque (encabezado) se envía de inmediato.
+    """
+
+    def __init__(self, cola, cancelada):
+        self._cola = cola
+        self._cancelada = cancelada
+        self._buf = bytearray()
+        self._primero = True
+
+    def write(self, datos):
+        self._buf += datos.encode("utf-8") if isinstance(datos, str) else datos
+        if self._primero or len(self._buf) >= TAM_BLOQUE_COPY:
+            self._primero = False
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            self.poner(bytes(self._buf))
+            self._buf.clear()
+
+    def poner(self, item):
+        while True:
+            if self._cancelada.is_set():
+                raise _Cancelada()
+            try:
+                self._cola.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+
+class ExportacionCopy:
+    """
+    Ejecuta COPY ({select}) TO STDOUT WITH CSV HEADER en un hilo y expone
+    los bytes como iterador de bloques.
+
+    El constructor espera el primer bloque (el encabezado): si la consulta
+    falla, la excepción sale aquí y la vista puede responder un error en
+    lugar de un archivo truncado.
+
+    `preparar(cur)`, si se da, corre antes en la misma conexión y
+    transacción (p.ej. cargar una tabla temporal, ver busqueda_masiva.py).
+    """
+
+    def __init__(self, anio, select_sql, params=None, preparar=None):
+        self._conn = get_pooled_conn_for_year(anio)
+        self._cola = queue.Queue(maxsize=BLOQUES_EN_COLA)
+        self._cancelada = threading.Event()
+        try:
+            with self._conn.cursor() as cur:
+                if preparar is not None:
+                    preparar(cur)
+                # COPY no acepta parámetros: se incrustan ya escapados por psycopg2
+                select = cur.mogrify(select_sql, params or []).decode("utf-8")
+            self._sql = f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER, ENCODING 'UTF8')"
+        except Exception:
+            self.close()
+            raise
+
+        self._hilo = threading.Thread(target=self._copiar, daemon=True)
+        self._hilo.start()
+        self._primero = self._cola.get()
+        if isinstance(self._primero, Exception):
+            self.close()
+            raise self._primero
+
+    def _copiar(self):
+        escritor = _EscritorCola(self._cola, self._cancelada)
+        try:
+            with self._conn.cursor() as cur:
+                cur.copy_expert(self._sql, escritor)
+            escritor.flush()
+            escritor.poner(_FIN)
+        except _Cancelada:
+            pass
+        except Exception as e:
+            if not self._cancelada.is_set():
+                try: escritor.poner(e)
+                except _Cancelada: pass
+
+    def bloques(self):
+        try:
+            item = self._primero
+            while item is not _FIN:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                item = self._cola.get()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._conn is None:
+            return
+        hilo = getattr(self, "_hilo", None)
+        if hilo is not None and hilo.is_alive():
+            # Cliente desconectado: cancelar el COPY en el servidor
+            self._cancelada.set()
+            try: self._conn.cancel()
+            except Exception: pass
+            hilo.join(timeout=10)
+        self._conn.close()
+        self._conn = None
+
+
+def respuesta_copy_csv(anio, select_sql, params, nombre_archivo, preparar=None):
+    """
+    Descarga CSV generada por PostgreSQL (COPY ... CSV HEADER) con el BOM de
+    Excel al inicio. Los nombres de columna del SELECT son el encabezado.
+    """
+    exportacion = ExportacionCopy(anio, select_sql, params, preparar)
+
+    def contenido():
+        try:
+            yield BOM.encode("utf-8")
+            yield from exportacion.bloques()
+        finally:
+            exportacion.close()
+
+    resp = StreamingHttpResponse(contenido(), content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = f'attachment; filename="{nombre_archivo}"'
+    return resp
+
+
+# ===========================
+# Parquet / Arrow
+# ===========================
+
+# Filas por record batch (= grupo de filas en Parquet)
+TAM_LOTE_ARROW = 50000
+
+# OID de PostgreSQL → (tipo Arrow, conversión del valor Python)
+_TIPOS_ARROW = {
+    16: ("bool", None),
+    20: ("int64", None), 21: ("int32", None), 23: ("int32", None),
+    700: ("float64", float), 701: ("float64", float),
+    # numeric: decimal (como en el CSV), nunca float; ver _tipo_arrow
+    1700: ("decimal", None),
+    1082: ("date32", None),
+    1114: ("timestamp", None), 1184: ("timestamptz", None),
+}
+
+# numeric sin precisión declarada (p.ej. toneladas, SUM()): decimal128(38, ESCALA_NUMERIC),
+# redondeado a ESCALA_NUMERIC decimales (mitad al par)
+ESCALA_NUMERIC = 6
+_CUANTO = decimal.Decimal(1).scaleb(-ESCALA_NUMERIC)
+_CONTEXTO_38 = decimal.Context(prec=38)
+
+FORMATOS_ARROW = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+
+
+def _a_escala(valor):
+    """Decimal redondeado a ESCALA_NUMERIC decimales; NaN o más de 38 dígitos → None."""
+    if not valor.is_finite():
+        return None
+    try:
+        return valor.quantize(_CUANTO, rounding=decimal.ROUND_HALF_EVEN, context=_CONTEXTO_38)
+    except decimal.InvalidOperation:
+        return None
+
+
+def _tipo_arrow(columna):
+    """(tipo Arrow, conversión) para una columna de cursor.description."""
+    nombre, conv = _TIPOS_ARROW.get(columna.type_code, ("string", None))
+    if nombre == "decimal":
+        precision, escala = columna.precision, columna.scale
+        # numeric(p, s) declarado: decimal128 exacto
+        if precision and escala is not None and 0 < precision <= 38:
+            return pa.decimal128(precision, escala), None
+        # Sin precisión declarada: escala fija
+        if not precision:
+            return pa.decimal128(38, ESCALA_NUMERIC), _a_escala
+        # Más de 38 dígitos declarados: texto, para no perder dígitos
+        return pa.string(), str
+    if nombre == "timestamp":
+        return pa.timestamp("us"), conv
+    if nombre == "timestamptz":
+        return pa.timestamp("us", tz="UTC"), conv
+    if nombre == "string":
+        return pa.string(), str
+    return getattr(pa, nombre)(), conv
+
+
+class _SumideroBytes:
+    """Archivo de sólo escritura: acumula bytes hasta que se vacían al cliente."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._posicion = 0
+        self.closed = False
+
+    def write(self, datos):
+        self._buf += datos
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def vaciar(self) -> bytes:
+        datos = bytes(self._buf)
+        self._buf.clear()
+        return datos
+
+
+def respuesta_arrow_streaming(anio, sql, params, columnas, nombre_base, formato="parquet"):
+    """
+    Descarga Parquet (formato="parquet") o Arrow IPC stream (formato="arrow")
+    construida lote a lote desde un cursor en servidor: cada lote de
+    TAM_LOTE_ARROW filas es un record batch que se escribe y se envía.
+    Requiere pyarrow (HAS_ARROW).
+    """
+    _cargar_arrow()
+    tipo_mime, extension = FORMATOS_ARROW[formato]
+    filas = FilasServidor(anio, sql, params, tam_lote=TAM_LOTE_ARROW)
+
+    def contenido():
+        sumidero = _SumideroBytes()
+        escritor = None
+        try:
+            for lote in filas.lotes():
+                if escritor is None:
+                    tipos = [_tipo_arrow(d) for d in filas.description]
+                    esquema = pa.schema([(c, t) for c, (t, _) in zip(columnas, tipos)])
+                    if formato == "parquet":
+                        escritor = pq.ParquetWriter(sumidero, esquema, compression="snappy")
+                    else:
+                        escritor = pa.ipc.new_stream(sumidero, esquema)
+                arreglos = []
+                for i, (tipo, conv) in enumerate(tipos):
+                    valores = [fila[i] for fila in lote]
+                    if conv is not None:
+                        valores = [conv(v) if v is not None else None for v in valores]
+                    arreglos.append(pa.array(valores, type=tipo))
+                escritor.write_batch(pa.RecordBatch.from_arrays(arreglos, schema=esquema))
+                yield sumidero.vaciar()
+            if escritor is None:
+                # Sin filas: archivo válido con columnas de texto vacías
+                esquema = pa.schema([(c, pa.string()) for c in columnas])
+                escritor = (pq.ParquetWriter(sumidero, esquema) if formato == "parquet"
+                            else pa.ipc.new_stream(sumidero, esquema))
+            escritor.close()
+            escritor = None
+            yield sumidero.vaciar()
+        finally:
+            filas.close()
+
+    resp = StreamingHttpResponse(contenido(), content_type=tipo_mime)
+    resp["Content-Disposition"] = f'attachment; filename="{nombre_base}.{extension}"'
+    return resp
@@ -0,0 +1,270 @@
+"""
+Medición de SQL por petición y bitácora de consultas lentas.
+
+- MedicionSQLMiddleware abre una Medicion por petición (contextvar, así que
+  también la ven los hilos de sync_to_async) y al terminar la acumula en
+  las estadísticas de la vista: número de consultas, tiempo SQL total y
+  máximo, filas leídas y tiempo Python (vista + plantilla, lo que no es SQL).
+  Las respuestas a usuarios staff llevan además un encabezado Server-Timing
+  (a los demás no se les expone cuánto tarda el SQL). Las peticiones que
+  no resuelven a una vista (404) se acumulan todas bajo SIN_VISTA.
+- Conexión de Django: se agrega un execute_wrapper a cada conexión nueva
+  (señal connection_created, ver apps.py).
+- psycopg2 directo (get_psycopg_conn_for_year y el pool de conexion.py):
+  las conexiones se crean con cursor_factory=CursorMedido.
+
+Las consultas que tardan más de SQL_LENTO_MS quedan, con sus parámetros,
+en la bitácora (las últimas BITACORA_MAX de este proceso), visible para
+staff en /diagnostico/sql/.
+"""
+
+import collections
+import contextvars
+import datetime
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from psycopg2 import extensions
+
+# Umbral de consulta lenta (milisegundos)
+SQL_LENTO_MS = 500
+BITACORA_MAX = 200
+# Llave de las peticiones sin vista resuelta (una por ruta haría crecer _por_vista sin límite)
+SIN_VISTA = "(sin vista)"
+
+_medicion_actual = contextvars.ContextVar("medicion_sql", default=None)
+
+_lock = threading.Lock()
+_por_vista = {}
+_bitacora_lenta = collections.deque(maxlen=BITACORA_MAX)
+
+
+class Medicion:
+    """Contadores de una petición (los pueden tocar varios hilos a la vez)."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.sql_ms = 0.0
+        self.sql_max_ms = 0.0
+        self.filas = 0
+        self.vista = None
+        self._lock = threading.Lock()
+
+    def registrar(self, sql, params, ms, filas):
+        with self._lock:
+            self.consultas += 1
+            self.sql_ms += ms
+            self.sql_max_ms = max(self.sql_max_ms, ms)
+            if filas and filas > 0:
+                self.filas += filas
+        if ms >= SQL_LENTO_MS:
+            _registrar_lenta(self.vista, sql, params, ms)
+
+    def sumar_filas(self, n):
+        with self._lock:
+            self.filas += n
+
+
+def _texto_sql(sql):
+    if isinstance(sql, bytes):
+        return sql.decode("utf-8", "replace")
+    return str(sql)
+
+
+def _registrar_lenta(vista, sql, params, ms):
+    entrada = {
+        "momento": datetime.datetime.now(),
+        "vista": vista or "(fuera de petición)",
+        "ms": round(ms, 1),
+        "sql": " ".join(_texto_sql(sql).split()),
+        "params": repr(params)[:2000],
+    }
+    with _lock:
+        _bitacora_lenta.appendleft(entrada)
+    print(f"SQL lento ({entrada['ms']} ms) en {entrada['vista']}: {entrada['sql'][:300]}")
+
+
+def _registrar(sql, params, inicio, filas):
+    ms = (time.perf_counter() - inicio) * 1000
+    medicion = _medicion_actual.get()
+    if medicion is not None:
+        medicion.registrar(sql, params, ms, filas)
+    elif ms >= SQL_LENTO_MS:
+        _registrar_lenta(None, sql, params, ms)
+
+
+# ===========================
+# Enganches de las conexiones
+# ===========================
+
+def envoltura_django(execute, sql, params, many, context):
+    """execute_wrapper para las conexiones de Django."""
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        cursor = context.get("cursor")
+        filas = getattr(cursor, "rowcount", 0) if not many else 0
+        _registrar(sql, params, inicio, filas)
+
+
+def instalar_en_conexion_django(sender, connection, **kwargs):
+    """Receptor de connection_created: agrega el execute_wrapper una sola vez."""
+    if envoltura_django not in connection.execute_wrappers:
+        connection.execute_wrappers.append(envoltura_django)
+
+
+class CursorMedido(extensions.cursor):
+    """
+    Cursor psycopg2 que mide execute/executemany/copy_expert. Las filas se
+    cuentan al leerlas (fetch*), que también sirve para cursores con nombre.
+    """
+
+    def execute(self, sql, params=None):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            _registrar(sql, params, inicio, 0)
+
+    def executemany(self, sql, params_seq):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, params_seq)
+        finally:
+            _registrar(sql, "(executemany)", inicio, 0)
+
+    def copy_expert(self, sql, archivo, size=8192):
+        inicio = time.perf_counter()
+        try:
+            return super().copy_expert(sql, archivo, size)
+        finally:
+            _registrar(sql, None, inicio, self.rowcount)
+
+    def _contar(self, n):
+        medicion = _medicion_actual.get()
+        if medicion is not None and n:
+            medicion.sumar_filas(n)
+
+    def fetchone(self):
+        fila = super().fetchone()
+        self._contar(1 if fila is not None else 0)
+        return fila
+
+    def fetchmany(self, size=None):
+        filas = super().fetchmany(self.arraysize if size is None else size)
+        self._contar(len(filas))
+        return filas
+
+    def fetchall(self):
+        filas = super().fetchall()
+        self._contar(len(filas))
+        return filas
+
+
+# ===========================
+# Middleware
+# ===========================
+
+def _acumular(medicion, total_ms, respuesta, es_staff):
+    python_ms = max(total_ms - medicion.sql_ms, 0.0)
+    with _lock:
+        e = _por_vista.setdefault(medicion.vista, {
+            "vista": medicion.vista, "peticiones": 0, "consultas": 0, "filas": 0,
+            "sql_ms": 0.0, "sql_max_ms": 0.0, "python_ms": 0.0, "total_max_ms": 0.0,
+        })
+        e["peticiones"] += 1
+        e["consultas"] += medicion.consultas
+        e["filas"] += medicion.filas
+        e["sql_ms"] += medicion.sql_ms
+        e["sql_max_ms"] = max(e["sql_max_ms"], medicion.sql_max_ms)
+        e["python_ms"] += python_ms
+        e["total_max_ms"] = max(e["total_max_ms"], total_ms)
+    if es_staff:
+        respuesta["Server-Timing"] = (
+            f"sql;dur={medicion.sql_ms:.1f};desc=\"{medicion.consultas} consultas\", "
+            f"python;dur={python_ms:.1f}"
+        )
+
+
+def _nombre_vista(request):
+    match = getattr(request, "resolver_match", None)
+    return (match.view_name if match else None) or SIN_VISTA
+
+
+class MedicionSQLMiddleware:
+    """Mide cada petición (vistas síncronas y async)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._es_async = iscoroutinefunction(get_response)
+        if self._es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self._es_async:
+            return self.__acall__(request)
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        medicion.vista = medicion.vista or _nombre_vista(request)
+        usuario = getattr(request, "user", None)
+        _acumular(medicion, (time.perf_counter() - inicio) * 1000, respuesta,
+                  bool(getattr(usuario, "is_staff", False)))
+        return respuesta
+
+    async def __acall__(self, request):
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        medicion.vista = medicion.vista or _nombre_vista(request)
+        total_ms = (time.perf_counter() - inicio) * 1000
+        usuario = await request.auser() if hasattr(request, "auser") else None
+        _acumular(medicion, total_ms, respuesta, bool(getattr(usuario, "is_staff", False)))
+        return respuesta
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Nombre de la vista antes de ejecutarla, para la bitácora de lentas
+        medicion = _medicion_actual.get()
+        if medicion is not None:
+            medicion.vista = _nombre_vista(request)
+        return None
+
+
+# ===========================
+# Consulta de las estadísticas
+# ===========================
+
+def estadisticas_por_vista():
+    """Lista de dicts por vista, ordenada por tiempo SQL total descendente."""
+    with _lock:
+        filas = [dict(e) for e in _por_vista.values()]
+    for e in filas:
+        n = e["peticiones"] or 1
+        e["sql_prom_ms"] = e["sql_ms"] / n
+        e["python_prom_ms"] = e["python_ms"] / n
+        e["consultas_prom"] = e["consultas"] / n
+    return sorted(filas, key=lambda e: e["sql_ms"], reverse=True)
+
+
+def consultas_lentas():
+    with _lock:
+        return list(_bitacora_lenta)
+
+
+def reiniciar():
+    with _lock:
+        _por_vista.clear()
+        _bitacora_lenta.clear()
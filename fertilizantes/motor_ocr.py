@@ -0,0 +1,133 @@
+"""
+Motores de OCR intercambiables.
+
+pytesseract lanza un proceso `tesseract` por imagen y éste vuelve a cargar
+los modelos de idioma (spa+eng) cada vez. Con tesserocr (binding de la API
+de Tesseract) el motor se inicializa una vez y se reutiliza en todas las
+páginas y peticiones que atiende el mismo proceso/hilo.
+
+- MotorPytesseract: el camino de siempre (subproceso por imagen).
+- MotorPersistente: un PyTessBaseAPI por (idioma, oem) y por hilo; psm y
+  variables (-c tessedit_char_whitelist=...) se aplican en cada llamada.
+- obtener_motor(): el persistente si tesserocr está instalado, si no
+  pytesseract. MOTOR_OCR fuerza uno ("pytesseract" / "persistente").
+
+Este módulo no depende de Django: lo usan los procesos del pool de OCR
+(ocr.py) y los scripts de SCRIPTS/ (benchmark_motor_ocr.py).
+"""
+
+import shlex
+import threading
+
+try:
+    import pytesseract
+    HAS_PYTESSERACT = True
+except Exception:
+    HAS_PYTESSERACT = False
+
+try:
+    import tesserocr
+    HAS_TESSEROCR = True
+except Exception:
+    HAS_TESSEROCR = False
+
+# "auto" | "pytesseract" | "persistente"
+MOTOR_OCR = "auto"
+
+
+def parsear_config(config: str):
+    """
+    Config estilo línea de comandos de tesseract → (oem, psm, variables).
+    Ej: '--oem 3 --psm 6 -c tessedit_char_whitelist="0123"'
+        → (3, 6, {"tessedit_char_whitelist": "0123"}).
+    """
+    oem, psm, variables = 3, 3, {}
+    partes = shlex.split(config or "")
+    i = 0
+    while i < len(partes):
+        p = partes[i]
+        siguiente = partes[i + 1] if i + 1 < len(partes) else ""
+        if p == "--oem":
+            oem, i = int(siguiente), i + 1
+        elif p == "--psm":
+            psm, i = int(siguiente), i + 1
+        elif p == "-c" and "=" in siguiente:
+            nombre, valor = siguiente.split("=", 1)
+            variables[nombre] = valor
+            i += 1
+        i += 1
+    return oem, psm, variables
+
+
+class MotorPytesseract:
+    """Un subproceso tesseract por imagen (comportamiento original)."""
+
+    nombre = "pytesseract"
+
+    def reconocer(self, img, lang="spa+eng", config="--psm 6") -> str:
+        return pytesseract.image_to_string(img, lang=lang, config=config)
+
+
+class MotorPersistente:
+    """
+    API de Tesseract viva entre llamadas. PyTessBaseAPI no es seguro entre
+    hilos, así que cada hilo tiene las suyas (en el pool de OCR cada proceso
+    usa un solo hilo: una instancia por proceso e idioma).
+    """
+
+    nombre = "persistente"
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _api(self, lang, oem):
+        apis = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+        api = apis.get((lang, oem))
+        if api is None:
+            api = apis[(lang, oem)] = tesserocr.PyTessBaseAPI(lang=lang, oem=tesserocr.OEM(oem))
+        return api
+
+    def reconocer(self, img, lang="spa+eng", config="--psm 6") -> str:
+        oem, psm, variables = parsear_config(config)
+        api = self._api(lang, oem)
+        api.SetPageSegMode(tesserocr.PSM(psm))
+        for nombre, valor in variables.items():
+            api.SetVariable(nombre, valor)
+        try:
+            api.SetImage(img)
+            return api.GetUTF8Text()
+        finally:
+            # Las variables no deben pasar a la siguiente llamada
+            for nombre in variables:
+                api.SetVariable(nombre, "")
+            api.Clear()
+
+    def cerrar(self):
+        for api in getattr(self._local, "apis", {}).values():
+            api.End()
+        self._local.apis = {}
+
+
+_motores = {}
+_lock = threading.Lock()
+
+
+def obtener_motor(nombre=None):
+    """Motor (uno por proceso) según `nombre` o MOTOR_OCR."""
+    nombre = nombre or MOTOR_OCR
+    if nombre == "auto":
+        nombre = "persistente" if HAS_TESSEROCR else "pytesseract"
+    if nombre == "persistente" and not HAS_TESSEROCR:
+        raise RuntimeError("tesserocr no está instalado.")
+    with _lock:
+        motor = _motores.get(nombre)
+        if motor is None:
+            motor = _motores[nombre] = MotorPersistente() if nombre == "persistente" else MotorPytesseract()
+        return motor
+
+
+def reconocer(img, lang="spa+eng", config="--psm 6", motor=None) -> str:
+    """Texto de una imagen PIL con el motor indicado (o el de obtener_motor())."""
+    return obtener_motor(motor).reconocer(img, lang, config)
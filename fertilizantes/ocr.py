@@ -0,0 +1,391 @@
+"""
+OCR en segundo plano con un pool de procesos.
+
+ocr_extract ya no hace el OCR dentro de la petición: guarda el archivo,
+crea un trabajo y regresa de inmediato con su id. Cada página es una tarea
+del pool (rasterizar con pdf2image + Tesseract), así que un PDF de varias
+páginas usa todos los núcleos y el hilo de Django queda libre. El navegador
+consulta ocr_estado con ?desde=N y va mostrando las páginas que ya están.
+
+- El pool usa "spawn": los procesos no heredan las conexiones a la BD ni
+  los hilos del servidor (fork con hilos vivos puede dejarlos trabados).
+  Por eso las funciones de las tareas viven aquí y no en views.py.
+- Cada proceso del pool conserva su motor de Tesseract entre tareas
+  (motor_ocr.py), en lugar de un subproceso tesseract por página.
+- Los PDFs se pasan a los procesos por su hash (el archivo queda en la
+  caché en disco), no los bytes en cada tarea.
+- Los trabajos viven en memoria de este proceso (como la caché LocMem):
+  con varios procesos de servidor la consulta de estado debe llegar al
+  mismo que recibió el archivo.
+- Si muere un proceso del pool (memoria con una página a 300 dpi, un
+  fallo de Tesseract) el pool queda roto para siempre: se descarta y el
+  siguiente envío crea otro. Las páginas que no se pudieron enviar quedan
+  como error, así el trabajo siempre termina.
+
+Caché en disco (OCR_CACHE_DIR), por hash SHA-256 del contenido:
+
+- textos/:   resultado por (hash, página, lang, config de Tesseract). Volver
+  a subir lo mismo con la misma configuración no llega al pool.
+- imagenes/: la página del PDF ya rasterizada (en gris, PNG). Si sólo
+  cambia psm / whitelist se salta pdf2image y se corre sólo Tesseract.
+- pdf/:      el PDF subido (las tareas lo leen de aquí).
+
+El tamaño se limita a OCR_CACHE_MAX_MB sacando lo usado hace más tiempo
+(LRU por mtime: cada lectura toca el archivo). Los archivos de un hash con
+trabajos sin terminar no se borran: sus tareas todavía leen el PDF y las
+páginas rasterizadas.
+"""
+
+import concurrent.futures
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from . import motor_ocr
+
+try:
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    HAS_PDF = True
+except Exception:
+    HAS_PDF = False
+
+# Procesos de OCR (se deja un núcleo para el servidor web)
+OCR_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+OCR_DPI = 300
+# Tiempo que se conservan los trabajos terminados (segundos)
+TRABAJO_TTL = 60 * 60
+
+# Caché en disco de resultados e imágenes rasterizadas
+OCR_CACHE_DIR = Path(tempfile.gettempdir()) / "fertilizantes_ocr_cache"
+OCR_CACHE_MAX_MB = 512
+
+_lock = threading.Lock()
+_pool = None
+_trabajos = {}
+
+
+# ===========================
+# Caché en disco
+# ===========================
+
+def huella(datos: bytes) -> str:
+    return hashlib.sha256(datos).hexdigest()
+
+
+def _ruta_texto(sha, pagina, lang, config):
+    # El motor entra en la llave: pytesseract y tesserocr pueden diferir en detalles
+    motor = motor_ocr.obtener_motor().nombre
+    cfg = hashlib.md5(f"{motor}|{lang}|{config}".encode("utf-8")).hexdigest()[:16]
+    return OCR_CACHE_DIR / "textos" / f"{sha}_{pagina}_{cfg}.txt"
+
+
+def _ruta_imagen(sha, pagina):
+    return OCR_CACHE_DIR / "imagenes" / f"{sha}_{pagina}.png"
+
+
+def _ruta_pdf(sha):
+    return OCR_CACHE_DIR / "pdf" / f"{sha}.pdf"
+
+
+def _tocar(ruta):
+    """Marca el archivo como recién usado (LRU); False si ya no existe."""
+    try:
+        os.utime(ruta)
+        return True
+    except OSError:
+        return False
+
+
+def _escribir(ruta, escribir):
+    """Escritura atómica: otro proceso nunca ve un archivo a medias."""
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=ruta.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            escribir(f)
+        os.replace(temporal, ruta)
+    except Exception:
+        try: os.remove(temporal)
+        except OSError: pass
+        raise
+
+
+def leer_texto(sha, pagina, lang, config):
+    """Texto en caché o None."""
+    ruta = _ruta_texto(sha, pagina, lang, config)
+    if not _tocar(ruta):
+        return None
+    try:
+        return ruta.read_text(encoding="utf-8")
+    except OSError:
+        return None
+
+
+def _guardar_texto(sha, pagina, lang, config, texto):
+    try:
+        _escribir(_ruta_texto(sha, pagina, lang, config), lambda f: f.write(texto.encode("utf-8")))
+    except OSError as e:
+        print(f"No se pudo guardar OCR en caché: {e}")
+
+
+def _hashes_en_uso():
+    """Hashes de los trabajos de este proceso que todavía tienen páginas pendientes."""
+    with _lock:
+        return {t.sha for t in _trabajos.values() if not t.terminado}
+
+
+def podar_cache(max_mb=None):
+    """Borra los archivos usados hace más tiempo hasta quedar bajo el límite."""
+    limite = (max_mb or OCR_CACHE_MAX_MB) * 1024 * 1024
+    en_uso = _hashes_en_uso()
+    archivos = []
+    for ruta in OCR_CACHE_DIR.glob("*/*"):
+        if ruta.suffix == ".tmp":  # escritura en curso
+            continue
+        # Todos los nombres empiezan con el hash (64 hex)
+        if ruta.name[:64] in en_uso:
+            continue
+        try:
+            st = ruta.stat()
+        except OSError:
+            continue
+        archivos.append((st.st_mtime, st.st_size, ruta))
+    total = sum(a[1] for a in archivos)
+    for _mtime, tam, ruta in sorted(archivos):
+        if total <= limite:
+            break
+        try:
+            ruta.unlink()
+            total -= tam
+        except OSError:
+            pass
+
+
+# ===========================
+# Tareas (corren en el pool)
+# ===========================
+
+def _procesar_imagen_pil(img: Image.Image, lang: str = "spa+eng", config: str = "--psm 6") -> str:
+    """
+    Preprocesamiento optimizado para capturas de pantalla y documentos.
+    """
+    # 1. Convertir a Escala de Grises
+    img = ImageOps.grayscale(img)
+
+    # 2. Re-escalado: aumentar el tamaño 2x ayuda a Tesseract a ver los espacios entre palabras
+    width, height = img.size
+    if width < 2000: # Solo escalamos si no es gigante
+        img = img.resize((width * 2, height * 2), Image.Resampling.LANCZOS)
+
+    # 3. Mejora de Contraste (Sin binarización agresiva ni desenfoque)
+    img = ImageOps.autocontrast(img)
+
+    # 4. Ejecutar OCR (motor persistente del proceso si hay tesserocr, ver motor_ocr.py)
+    texto = motor_ocr.reconocer(img, lang=lang, config=config)
+    return texto.strip()
+
+
+def _ocr_imagen(sha: str, datos: bytes, lang: str, config: str) -> str:
+    texto = _procesar_imagen_pil(Image.open(io.BytesIO(datos)), lang, config)
+    _guardar_texto(sha, 1, lang, config, texto)
+    return texto
+
+
+def _imagen_pagina(sha: str, pagina: int) -> Image.Image:
+    """Página rasterizada: de la caché, o con pdf2image (sólo esa página) y se guarda."""
+    ruta = _ruta_imagen(sha, pagina)
+    if _tocar(ruta):
+        try:
+            with Image.open(ruta) as img:
+                return img.copy()
+        except OSError:
+            pass
+    imagenes = convert_from_path(str(_ruta_pdf(sha)), dpi=OCR_DPI, first_page=pagina, last_page=pagina)
+    # Se guarda ya en gris (primer paso de _procesar_imagen_pil): pesa menos
+    img = ImageOps.grayscale(imagenes[0])
+    try:
+        _escribir(ruta, lambda f: img.save(f, format="PNG"))
+    except OSError as e:
+        print(f"No se pudo guardar la página en caché: {e}")
+    return img
+
+
+def _ocr_pagina_pdf(sha: str, pagina: int, lang: str, config: str) -> str:
+    texto = _procesar_imagen_pil(_imagen_pagina(sha, pagina), lang, config)
+    _guardar_texto(sha, pagina, lang, config, texto)
+    return texto
+
+
+# ===========================
+# Pool y trabajos
+# ===========================
+
+def _obtener_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _descartar_pool(pool):
+    """Quita `pool` (roto) para que _obtener_pool cree uno nuevo."""
+    global _pool
+    with _lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _enviar(funcion, args):
+    """pool.submit; con el pool roto se descarta y se reintenta una vez con uno nuevo."""
+    pool = _obtener_pool()
+    try:
+        return pool.submit(funcion, *args)
+    except BrokenProcessPool:
+        _descartar_pool(pool)
+        return _obtener_pool().submit(funcion, *args)
+
+
+class TrabajoOCR:
+    """Estado de un trabajo: un texto por página (None mientras no termina)."""
+
+    def __init__(self, usuario_id, sha, paginas):
+        self.id = uuid.uuid4().hex
+        self.usuario_id = usuario_id
+        self.sha = sha
+        self.textos = [None] * paginas
+        self.errores = []
+        self.pendientes = paginas
+        self.creado = time.time()
+        self._lock = threading.Lock()
+
+    def _pagina_lista(self, indice, futuro):
+        error = None
+        try:
+            texto = futuro.result()
+        except Exception as e:
+            texto, error = "", f"Página {indice + 1}: {e}"
+            print(f"Error OCR trabajo {self.id}: {error}")
+        with self._lock:
+            if error:
+                self.errores.append(error)
+            self.textos[indice] = texto
+            self.pendientes -= 1
+            terminado = self.pendientes == 0
+        if terminado:
+            _podar_en_segundo_plano()
+
+    @property
+    def terminado(self):
+        return self.pendientes == 0
+
+    def estado(self, desde=0):
+        """Resumen para el navegador con las páginas listas a partir de `desde`."""
+        with self._lock:
+            textos = list(self.textos)
+            errores = list(self.errores)
+        return {
+            "job_id": self.id,
+            "total": len(textos),
+            "listas": sum(t is not None for t in textos),
+            "terminado": self.terminado,
+            "paginas": [
+                {"pagina": i + 1, "texto": t}
+                for i, t in enumerate(textos) if i >= desde and t is not None
+            ],
+            "errores": errores,
+        }
+
+
+def _limpiar_viejos():
+    limite = time.time() - TRABAJO_TTL
+    with _lock:
+        for job_id in [j for j, t in _trabajos.items() if t.terminado and t.creado < limite]:
+            del _trabajos[job_id]
+
+
+_podando = threading.Lock()
+
+
+def _podar_en_segundo_plano():
+    # Una poda a la vez; si ya hay una en curso no hace falta otra
+    if not _podando.acquire(blocking=False):
+        return
+
+    def podar():
+        try:
+            podar_cache()
+        except Exception as e:
+            print(f"Error podando la caché de OCR: {e}")
+        finally:
+            _podando.release()
+
+    threading.Thread(target=podar, daemon=True).start()
+
+
+def _registrar(trabajo, sha, lang, config, tareas):
+    """
+    Registra el trabajo y manda al pool sólo las páginas que no están en
+    la caché de textos; las que sí están quedan listas de inmediato y las
+    que no se pudieron enviar, como error.
+    """
+    _limpiar_viejos()
+    with _lock:
+        _trabajos[trabajo.id] = trabajo
+    for indice, (funcion, args) in enumerate(tareas):
+        texto = leer_texto(sha, indice + 1, lang, config)
+        if texto is not None:
+            futuro = concurrent.futures.Future()
+            futuro.set_result(texto)
+        else:
+            try:
+                futuro = _enviar(funcion, args)
+            except Exception as e:
+                futuro = concurrent.futures.Future()
+                futuro.set_exception(e)
+        futuro.add_done_callback(lambda f, i=indice: trabajo._pagina_lista(i, f))
+    return trabajo
+
+
+def enviar_imagen(usuario_id, datos: bytes, lang: str, config: str) -> TrabajoOCR:
+    """Encola el OCR de una imagen (un trabajo de una página)."""
+    sha = huella(datos)
+    trabajo = TrabajoOCR(usuario_id, sha, 1)
+    return _registrar(trabajo, sha, lang, config, [(_ocr_imagen, (sha, datos, lang, config))])
+
+
+def enviar_pdf(usuario_id, datos: bytes, lang: str, config: str) -> TrabajoOCR:
+    """Encola un PDF: una tarea por página, en paralelo en el pool."""
+    sha = huella(datos)
+    ruta = _ruta_pdf(sha)
+    if not _tocar(ruta):
+        _escribir(ruta, lambda f: f.write(datos))
+    paginas = int(pdfinfo_from_path(str(ruta))["Pages"])
+    if paginas < 1:
+        raise ValueError("El PDF no tiene páginas.")
+    trabajo = TrabajoOCR(usuario_id, sha, paginas)
+    return _registrar(trabajo, sha, lang, config, [
+        (_ocr_pagina_pdf, (sha, n, lang, config)) for n in range(1, paginas + 1)
+    ])
+
+
+def obtener_trabajo(job_id, usuario_id):
+    """El trabajo `job_id` si existe y es de `usuario_id`, si no None."""
+    with _lock:
+        trabajo = _trabajos.get(job_id)
+    if trabajo is None or trabajo.usuario_id != usuario_id:
+        return None
+    return trabajo
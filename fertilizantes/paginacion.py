@@ -0,0 +1,146 @@
+"""
+Paginación por llave (keyset / seek) para las consultas grandes.
+
+En lugar de LIMIT/OFFSET (que lee y descarta todas las filas anteriores),
+cada página se pide "a partir de" la última fila vista usando una
+comparación de tuplas sobre un índice:
+
+    ORDER BY k1 DESC NULLS LAST, k2 DESC
+    WHERE (k1, k2) < (%s, %s)
+
+así la página N cuesta lo mismo que la página 1. Las filas con k1 NULL
+van al final y se recorren como un segmento aparte (sólo por k2).
+
+El cursor que viaja al navegador es opaco (base64 de un JSON con la
+llave, la dirección y el número de página que se muestra).
+"""
+
+import base64
+import json
+import math
+
+TAM_PAGINA = 100
+
+
+def codificar_cursor(llave, direccion, pagina) -> str:
+    crudo = json.dumps({"k": list(llave), "d": direccion, "p": pagina}, default=str)
+    return base64.urlsafe_b64encode(crudo.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(token):
+    """Devuelve el dict del cursor o None si viene vacío o corrupto."""
+    if not token:
+        return None
+    try:
+        crudo = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        estado = json.loads(crudo.decode("utf-8"))
+        if len(estado["k"]) != 2 or estado["d"] not in ("sig", "ant"):
+            return None
+        estado["p"] = max(int(estado.get("p", 1)), 1)
+        return estado
+    except Exception:
+        return None
+
+
+class PaginaKeyset:
+    """
+    Página de resultados con la interfaz que usan las plantillas:
+    object_list, has_next/has_previous, next_cursor/previous_cursor,
+    number, start_index/end_index y, si se asigna, count/tipo_conteo/num_pages.
+    """
+
+    def __init__(self, filas, tamano, numero, has_next, has_previous, llave_de):
+        self.object_list = filas
+        self.number = numero
+        self.start_index = (numero - 1) * tamano + 1 if filas else 0
+        self.end_index = (numero - 1) * tamano + len(filas)
+        self.has_next = has_next and bool(filas)
+        self.has_previous = has_previous and bool(filas)
+        self.next_cursor = codificar_cursor(llave_de(filas[-1]), "sig", numero + 1) if self.has_next else ""
+        self.previous_cursor = codificar_cursor(llave_de(filas[0]), "ant", numero - 1) if self.has_previous else ""
+        self._tamano = tamano
+        self.count = None
+        self.tipo_conteo = None
+        self.num_pages = None
+
+    def asignar_conteo(self, conteo):
+        """
+        Recibe un conteos.Conteo. Con "tope" no se conoce el total, así que
+        num_pages queda en None y la plantilla muestra "más de N".
+        """
+        self.count = conteo.valor
+        self.tipo_conteo = conteo.tipo
+        if conteo.tipo != "tope":
+            self.num_pages = max(math.ceil(conteo.valor / self._tamano), self.number, 1)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginar_keyset(conn, origen, columnas, k1, k2, where="", params=None, cursor=None, tamano=TAM_PAGINA):
+    """
+    Trae una página de `origen` (tabla o "(subconsulta) AS base") ordenada
+    por (k1 DESC NULLS LAST, k2 DESC).
+
+    - where/params: condición base ("WHERE ..." o "") y sus parámetros; si
+      `origen` es una subconsulta, sus parámetros van primero en `params`.
+    - cursor: token recibido del navegador (None → primera página).
+
+    Requiere un índice (k1 DESC NULLS LAST, k2 DESC) para que cada página
+    sea una lectura acotada del índice.
+    """
+    params = list(params or [])
+    estado = decodificar_cursor(cursor)
+    select = list(columnas) + [k for k in (k1, k2) if k not in columnas]
+
+    desc = f"ORDER BY {k1} DESC NULLS LAST, {k2} DESC"
+    asc = f"ORDER BY {k1} ASC NULLS FIRST, {k2} ASC"
+    nulos_desc = f"ORDER BY {k2} DESC"
+    nulos_asc = f"ORDER BY {k2} ASC"
+    limite = tamano + 1
+
+    def consultar(condicion, extra, orden, n):
+        filtro = f"{where} AND {condicion}" if where else f"WHERE {condicion}"
+        sql = f"SELECT {', '.join(select)} FROM {origen} {filtro} {orden} LIMIT {int(n)}"
+        with conn.cursor() as cur:
+            cur.execute(sql, params + list(extra))
+            return list(cur.fetchall())
+
+    if estado is None or estado["d"] == "sig":
+        llave = estado["k"] if estado else None
+        if llave is None:
+            filas = consultar(f"{k1} IS NOT NULL", [], desc, limite)
+            completar_nulos = True
+        elif llave[0] is not None:
+            filas = consultar(f"({k1}, {k2}) < (%s, %s)", llave, desc, limite)
+            completar_nulos = True
+        else:
+            filas = consultar(f"{k1} IS NULL AND {k2} < %s", [llave[1]], nulos_desc, limite)
+            completar_nulos = False
+        if completar_nulos and len(filas) < limite:
+            filas += consultar(f"{k1} IS NULL", [], nulos_desc, limite - len(filas))
+        has_next = len(filas) > tamano
+        filas = filas[:tamano]
+        has_previous = estado is not None
+        numero = estado["p"] if estado else 1
+    else:
+        llave = estado["k"]
+        if llave[0] is None:
+            filas = consultar(f"{k1} IS NULL AND {k2} > %s", [llave[1]], nulos_asc, limite)
+            if len(filas) < limite:
+                filas += consultar(f"{k1} IS NOT NULL", [], asc, limite - len(filas))
+        else:
+            filas = consultar(f"({k1}, {k2}) > (%s, %s)", llave, asc, limite)
+        has_previous = len(filas) > tamano
+        filas = filas[:tamano][::-1]
+        has_next = True
+        numero = estado["p"] if has_previous else 1
+
+    dicts = [dict(zip(select, f)) for f in filas]
+    return PaginaKeyset(
+        dicts, tamano, numero, has_next, has_previous,
+        llave_de=lambda d: (d[k1], d[k2]),
+    )
@@ -0,0 +1,214 @@
+"""
+Ejecución en segundo plano de los scripts de carga (actualizar_todo.py,
+Integrar_informe_2025.py) desde la página de actualización.
+
+actualizar_bases ya no espera el subprocess dentro de la petición (minutos
+de importación, REFRESH y exportaciones: un worker ocupado y el proxy
+cortando la conexión). lanzar() arranca el script y regresa de inmediato
+con el id de la ejecución; la página consulta estado(id, desde) cada pocos
+segundos y va mostrando la bitácora y el paso en curso.
+
+Todo vive en disco (PIPELINE_DIR), no en memoria, para que la consulta de
+estado funcione en cualquier worker:
+
+- <id>.json: script, usuario, inicio, pid y, al terminar, código y fin.
+- <id>.log:  salida del script (python -u, línea por línea). Las líneas
+  "##PASO n/N nombre" que imprime actualizar_todo.py dan el avance.
+- pipeline.lock: candado (flock) que hereda el subproceso; queda tomado
+  mientras el script corre, aunque se caiga el worker que lo lanzó, y se
+  libera solo cuando el proceso termina. Un segundo lanzamiento mientras
+  tanto recibe PipelineOcupado. actualizar_todo.py además toma un candado
+  de la BD, por si lo corre cron al mismo tiempo.
+
+Al terminar bien actualizar_todo.py, el worker que lo lanzó descarta la
+versión de datos memorizada y precalienta ambos años (precalentar.py);
+los demás workers lo hacen al ver la versión nueva.
+"""
+
+import fcntl
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.db import connections
+
+# Rutas de la máquina de carga
+PYTHON_PIPELINE = "/Users/Arturo/AGRICULTURA/FERTILIZANTES/ENTORNO/env/bin/python"
+RUTA_SCRIPTS = "/Users/Arturo/AGRICULTURA/FERTILIZANTES/SCRIPTS/"
+
+# Botón de la página → script
+SCRIPTS_PIPELINE = {
+    "actualizar_todo": "actualizar_todo.py",
+    "integrar_informe": "Integrar_informe_2025.py",
+}
+
+PIPELINE_DIR = Path(tempfile.gettempdir()) / "fertilizantes_pipeline"
+# Ejecuciones que se conservan en disco (las más recientes)
+PIPELINE_HISTORIAL = 20
+# Máximo de bytes de bitácora por consulta de estado
+BITACORA_MAX_BYTES = 256 * 1024
+# Código de salida de actualizar_todo.py si ya había otra carga en curso
+CODIGO_OCUPADO = 3
+
+_RE_PASO = re.compile(r"^##PASO (\d+)/(\d+) (.*)$")
+_RE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class PipelineOcupado(Exception):
+    """Ya hay una ejecución en curso."""
+
+
+def _ruta(run_id, ext):
+    return PIPELINE_DIR / f"{run_id}.{ext}"
+
+
+def _leer_meta(run_id):
+    if not _RE_ID.match(run_id or ""):
+        return None
+    try:
+        return json.loads(_ruta(run_id, "json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _escribir_meta(meta):
+    # Escritura atómica: quien consulta nunca ve un JSON a medias
+    ruta = _ruta(meta["id"], "json")
+    tmp = ruta.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(meta), encoding="utf-8")
+    os.replace(tmp, ruta)
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def _podar():
+    metas = sorted(PIPELINE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for ruta in metas[PIPELINE_HISTORIAL:]:
+        for ext in ("json", "log"):
+            _ruta(ruta.stem, ext).unlink(missing_ok=True)
+
+
+def lanzar(clave, usuario_id=None):
+    """
+    Arranca el script de `clave` (SCRIPTS_PIPELINE) en segundo plano y
+    devuelve el id de la ejecución. PipelineOcupado si ya hay una en curso.
+    """
+    script = SCRIPTS_PIPELINE[clave]
+    PIPELINE_DIR.mkdir(parents=True, exist_ok=True)
+
+    candado = os.open(PIPELINE_DIR / "pipeline.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(candado, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise PipelineOcupado("Ya hay una actualización en curso.")
+
+        run_id = uuid.uuid4().hex
+        with open(_ruta(run_id, "log"), "wb") as log:
+            # El subproceso hereda el descriptor con el candado tomado
+            proc = subprocess.Popen(
+                [PYTHON_PIPELINE, "-u", os.path.join(RUTA_SCRIPTS, script)],
+                stdout=log, stderr=subprocess.STDOUT, cwd=RUTA_SCRIPTS,
+                pass_fds=(candado,), start_new_session=True,
+            )
+    finally:
+        os.close(candado)
+
+    meta = {"id": run_id, "clave": clave, "script": script, "usuario_id": usuario_id,
+            "pid": proc.pid, "inicio": time.time(), "fin": None, "codigo": None}
+    _escribir_meta(meta)
+    threading.Thread(target=_esperar, args=(proc, meta), daemon=True,
+                     name=f"pipeline-{run_id[:8]}").start()
+    _podar()
+    return run_id
+
+
+def _esperar(proc, meta):
+    """Hilo que espera el fin del script, registra el resultado y precalienta."""
+    meta["codigo"] = proc.wait()
+    meta["fin"] = time.time()
+    _escribir_meta(meta)
+
+    if meta["clave"] == "actualizar_todo" and meta["codigo"] == 0:
+        from . import precalentar
+        from .version_datos import olvidar_version
+        try:
+            olvidar_version()
+            for anio in precalentar.ANIOS:
+                precalentar.precalentar(anio)
+        finally:
+            connections.close_all()
+
+
+def ultima_ejecucion():
+    """Id de la ejecución más reciente (o None)."""
+    if not PIPELINE_DIR.is_dir():
+        return None
+    metas = sorted(PIPELINE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return metas[0].stem if metas else None
+
+
+def estado(run_id, desde=0):
+    """
+    Estado de la ejecución y las líneas de bitácora a partir del byte
+    `desde` (sólo líneas completas). None si no existe.
+    """
+    meta = _leer_meta(run_id)
+    if meta is None:
+        return None
+
+    if meta["codigo"] == 0:
+        situacion = "terminado"
+    elif meta["codigo"] == CODIGO_OCUPADO and meta["clave"] == "actualizar_todo":
+        situacion = "ocupado"
+    elif meta["codigo"] is not None:
+        situacion = "error"
+    else:
+        # Sin código y sin proceso: se cayó el worker que esperaba al script
+        situacion = "en_curso" if _vivo(meta["pid"]) else "interrumpido"
+
+    lineas, paso = [], None
+    try:
+        with open(_ruta(run_id, "log"), "rb") as f:
+            f.seek(max(desde, 0))
+            bloque = f.read(BITACORA_MAX_BYTES)
+    except OSError:
+        bloque = b""
+    # Terminado de verdad cuando ya no queda bitácora por leer
+    terminado = situacion != "en_curso" and len(bloque) < BITACORA_MAX_BYTES
+    if not terminado:
+        # La última línea puede estar a medio escribir (o cortada por el límite)
+        corte = bloque.rfind(b"\n") + 1
+        if corte or len(bloque) < BITACORA_MAX_BYTES:
+            bloque = bloque[:corte]
+    for linea in bloque.decode("utf-8", errors="replace").splitlines():
+        m = _RE_PASO.match(linea)
+        if m:
+            paso = {"n": int(m.group(1)), "total": int(m.group(2)), "nombre": m.group(3)}
+        else:
+            lineas.append(linea)
+
+    fin = meta["fin"] or time.time()
+    return {
+        "id": run_id,
+        "script": meta["script"],
+        "estado": situacion,
+        "terminado": terminado,
+        "codigo": meta["codigo"],
+        "segundos": round(fin - meta["inicio"]),
+        "paso": paso,
+        "lineas": lineas,
+        "desde": max(desde, 0) + len(bloque),
+    }
@@ -0,0 +1,108 @@
+"""
+Precalentamiento después de cada carga de datos.
+
+Tras actualizar_todo.py las cachés del sitio quedan inalcanzables (la
+versión de datos cambió, ver version_datos.py): el primero que abre el
+tablero nacional, el resumen estatal o las vistas de tránsito paga las
+consultas pesadas. precalentar(anio) hace ese trabajo de antemano:
+
+1. Cubo de KPIs (tablero nacional, resumen estatal y sus filtros).
+2. Catálogos de filtros de las vistas que no son VistaTabla (CATALOGOS).
+3. Cada VistaTabla: combos y, si no requiere filtro, la primera página
+   (la consulta sin filtros), ver vistas_tabla.precalentar_vista.
+
+shared_buffers (pg_prewarm de las vistas recién refrescadas) no se toca
+aquí: lo hace actualizar_todo.py una sola vez por carga, no cada worker
+cada vez que ve una versión nueva.
+
+La caché es la de este proceso (LocMem), así que el precalentamiento corre
+dentro de cada worker: apps.py lo registra con al_cambiar_version y se
+lanza en un hilo en cuanto el worker ve una versión nueva (al arrancar o
+tras una carga, dentro de VERSION_TTL). actualizar_bases lo ejecuta
+completo, para ambos años, antes de responder.
+
+La BD 2026 no tiene tabla version_datos: su versión es la huella de
+escrituras de pg_stat_user_tables (ver version_datos.py, sin contar los
+comentarios que se guardan desde el sitio), así que también se
+precalienta al cambiar sus datos. Si la versión de un año es "0"
+(desconocida) no se guarda nada en caché y no se precalienta.
+"""
+
+import threading
+import time
+
+from django.db import connections
+
+from .catalogos import opciones_filtro
+from .cubo_kpi import obtener_cubo
+from .routers import ALIAS_POR_ANIO, conexion_para_anio
+from .tablas import tabla_para_anio
+from .version_datos import obtener_version_datos
+
+ANIOS = tuple(ALIAS_POR_ANIO)
+
+# (tabla 2025, columnas) tal como las piden las vistas sin VistaTabla
+CATALOGOS = [
+    ("red_distribucion", ["coordinacion_estatal", "estado"]),
+    ("fletes_en_transito_resumen", ["unidad_operativa", "estado", "zona_operativa"]),
+    ("fletes_ton_conteo_detalle_td", ["unidad_operativa", "estado", "estado_procedencia"]),
+    ("inventario_ceda_diario_2025_campo_sigap", ["unidad_operativa"]),
+    ("vista_comentarios_ceda", ["unidad_operativa"]),
+]
+
+_candados = {anio: threading.Lock() for anio in ANIOS}
+
+
+def precalentar_cache(anio):
+    """Cubo de KPIs, catálogos y primera página de las VistaTabla del año."""
+    if obtener_version_datos(anio) == "0":
+        # Sin versión nada se guarda en caché: consultar sería trabajo perdido
+        print(f"Sin versión de datos para {anio}: no se precalienta la caché")
+        return
+    from . import views  # noqa: F401  (registra las VistaTabla)
+    from .vistas_tabla import VISTAS, precalentar_vista
+
+    obtener_cubo(anio)
+    conn = conexion_para_anio(anio)
+    for tabla, columnas in CATALOGOS:
+        opciones_filtro(conn, anio, tabla_para_anio(anio, tabla), columnas)
+    for nombre in VISTAS:
+        try:
+            precalentar_vista(nombre, anio)
+        except Exception as e:
+            print(f"Error precalentando {nombre} ({anio}): {e}")
+
+
+def precalentar(anio, esperar=True):
+    """
+    Precalienta las cachés del año. Si ya hay un precalentamiento del
+    mismo año en curso: con esperar=False no hace nada, con esperar=True
+    espera a que termine y repite (lo ya calculado sale de caché).
+    """
+    anio = str(anio)
+    candado = _candados.get(anio)
+    if candado is None or not candado.acquire(blocking=esperar):
+        return
+    inicio = time.perf_counter()
+    try:
+        try:
+            precalentar_cache(anio)
+        except Exception as e:
+            print(f"Error en precalentar_cache ({anio}): {e}")
+        print(f"🔥 Precalentamiento {anio} listo en {time.perf_counter() - inicio:.1f} s")
+    finally:
+        candado.release()
+
+
+def _en_hilo(anio):
+    try:
+        precalentar(anio, esperar=False)
+    finally:
+        # Las conexiones de Django son por hilo: cerrarlas al terminar
+        connections.close_all()
+
+
+def precalentar_en_segundo_plano(anio, version=None):
+    """Receptor de version_datos.al_cambiar_version: precalienta en un hilo aparte."""
+    threading.Thread(target=_en_hilo, args=(str(anio),), daemon=True,
+                     name=f"precalentar-{anio}").start()
@@ -0,0 +1,63 @@
+"""
+Respuestas JSON compactas para las APIs con muchas filas.
+
+- JsonRapidoResponse: serializa con orjson si está instalado (Decimal,
+  fechas y datetimes sin pasar por el JSONEncoder de Django); si no, con
+  json estándar y separadores compactos.
+- a_columnar: convierte filas en un arreglo por columna y codifica con
+  diccionario las columnas de texto muy repetidas (estado, estatus, ...).
+"""
+
+import datetime
+import json
+from decimal import Decimal
+
+from django.http import HttpResponse
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except Exception:
+    HAS_ORJSON = False
+
+
+def _por_defecto(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime.date, datetime.datetime, datetime.time)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def dumps_rapido(datos) -> bytes:
+    if HAS_ORJSON:
+        return orjson.dumps(datos, default=_por_defecto, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(datos, default=_por_defecto, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class JsonRapidoResponse(HttpResponse):
+    def __init__(self, datos, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps_rapido(datos), **kwargs)
+
+
+def a_columnar(columnas, filas, proporcion_diccionario=4):
+    """
+    Devuelve (datos, diccionarios):
+    - datos: una lista por columna, en el orden de `columnas`.
+    - diccionarios: {columna: [valores distintos]} para las columnas de
+      texto con pocos valores distintos (<= filas / proporcion_diccionario);
+      en esas columnas `datos` trae el índice dentro del diccionario.
+    """
+    datos, diccionarios = [], {}
+    for i, col in enumerate(columnas):
+        valores = [f[i] for f in filas]
+        no_nulos = [v for v in valores if v is not None]
+        if no_nulos and all(isinstance(v, str) for v in no_nulos):
+            distintos = list(dict.fromkeys(no_nulos))
+            if len(distintos) * proporcion_diccionario <= len(valores):
+                codigo = {v: n for n, v in enumerate(distintos)}
+                diccionarios[col] = distintos
+                valores = [codigo[v] if v is not None else None for v in valores]
+        datos.append(valores)
+    return datos, diccionarios
@@ -0,0 +1,100 @@
+"""
+Bases de datos por año (configuración multi-BD de Django).
+
+- settings.DATABASES tiene un alias por año: 'default' (BD histórica 2025,
+  "fertilizantes") y 'fertilizantes_2026'. Ambos con CONN_MAX_AGE, así que
+  cada hilo de petición reutiliza su conexión abierta (ya instrumentada,
+  ver apps.py) en lugar de conectarse y desconectarse en cada vista.
+- conexion_para_anio(anio) devuelve la conexión de Django del año; las
+  vistas con SQL directo la usan junto con tablas.tabla_para_anio(). No se
+  cierra: Django la recicla al terminar la petición según CONN_MAX_AGE.
+- AnioActivoMiddleware deja el año de la sesión en un contextvar y
+  RouterAnio manda a esa BD los modelos que existen igual en ambos años
+  (MODELOS_POR_ANIO). Los demás modelos (p.ej. la vista de derechohabientes,
+  que en 2026 tiene otro nombre) se quedan en 'default'.
+- Las migraciones sólo corren en 'default': la BD 2026 la arma la carga.
+
+Los hilos de sync_to_async(thread_sensitive=False) y las descargas con
+COPY siguen usando el pool de conexion.py: las conexiones de Django son
+por hilo y en esos hilos nadie las cerraría.
+"""
+
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ALIAS_POR_ANIO = {
+    "2025": DEFAULT_DB_ALIAS,
+    "2026": "fertilizantes_2026",
+}
+
+# Modelos (model_name) cuya tabla se llama igual en las dos BD
+MODELOS_POR_ANIO = {"comentarioceda"}
+
+_anio_activo = contextvars.ContextVar("anio_activo", default="2025")
+
+
+def alias_para_anio(anio) -> str:
+    """Alias de DATABASES del año; cualquier año desconocido cae en 'default'."""
+    return ALIAS_POR_ANIO.get(str(anio), DEFAULT_DB_ALIAS)
+
+
+def conexion_para_anio(anio):
+    """Conexión de Django (persistente, del hilo actual) a la BD del año."""
+    return connections[alias_para_anio(anio)]
+
+
+def anio_activo() -> str:
+    """Año de la petición en curso (el que fijó AnioActivoMiddleware)."""
+    return _anio_activo.get()
+
+
+class RouterAnio:
+    """Manda los modelos de MODELOS_POR_ANIO a la BD del año activo."""
+
+    def _alias(self, model):
+        if model._meta.app_label == "fertilizantes" and model._meta.model_name in MODELOS_POR_ANIO:
+            return alias_para_anio(_anio_activo.get())
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._alias(model)
+
+    def db_for_write(self, model, **hints):
+        return self._alias(model)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La BD 2026 no se migra: sus tablas las crea el proceso de carga
+        if db != DEFAULT_DB_ALIAS:
+            return False
+        return None
+
+
+class AnioActivoMiddleware:
+    """Fija el año activo de la sesión para el router (vistas síncronas y async)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._es_async = iscoroutinefunction(get_response)
+        if self._es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self._es_async:
+            return self.__acall__(request)
+        token = _anio_activo.set(str(request.session.get("anio_activo", "2025")))
+        try:
+            return self.get_response(request)
+        finally:
+            _anio_activo.reset(token)
+
+    async def __acall__(self, request):
+        token = _anio_activo.set(str(await request.session.aget("anio_activo", "2025")))
+        try:
+            return await self.get_response(request)
+        finally:
+            _anio_activo.reset(token)
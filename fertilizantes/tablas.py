@@ -0,0 +1,45 @@
+"""
+Nombres de tabla por año.
+
+Las vistas siempre piden la tabla por su nombre de 2025; para 2026 se
+traduce con TABLE_MAPPING_2026 (o agregando _2026 si no está en el mapa).
+"""
+
+TABLE_MAPPING_2026 = {
+    # Fletes
+    "fletes_en_transito_resumen_estado": "fletes_en_transito_resumen_estado_2026",
+    "fletes_en_transito_resumen": "fletes_en_transito_resumen_2026",
+    "fletes_en_transito_detalle": "fletes_en_transito_detalle_2026",
+    "fletes_ton_conteo_detalle_td": "fletes_ton_conteo_detalle_2026_td",
+    "fletes_toneladas_recibidas_atipicas_2025": "fletes_toneladas_recibidas_atipicas_2026",
+    "fletes_fechas_incoherentes_2025": "fletes_fechas_incoherentes_2026",
+    "mv_fletes_enriquecidos": "mv_fletes_enriquecidos_2026",
+    
+    # Inventarios y Remanentes
+    "inventario_acumulado_x_ceda_diario_2025": "inventario_acumulado_x_ceda_diario_2026",
+    "inventarios_negativos_x_ceda_diario_2025": "inventarios_negativos_x_ceda_diario_2026",
+    "inventarios_negativos_2025": "inventarios_negativos_2026",
+    "resumen_remanente_estado_2025": "resumen_remanente_estado_2026",
+    "cedas_con_remanentes_2025": "cedas_con_remanentes_2026",
+    "cedas_con_remanentes_negativos_2025": "cedas_con_remanentes_negativos_2026",
+    "inventario_ceda_diario_2025_campo_sigap": "inventario_ceda_diario_2026_campo_sigap",
+    "estadisticas_inventarios_campo": "estadisticas_inventarios_campo_2026",
+    
+    # Operación y Pedidos
+    "pedidos_detalle_por_fecha_2025": "pedidos_detalle_por_fecha_2026",
+    "entregas_diarias_2025": "entregas_diarias_2026",
+    "vista_comentarios_ceda": "vista_comentarios_ceda_2026",
+    
+    # Tablas Base
+    "vw_derechohabientes_con_contexto": "vw_derechohabientes_con_contexto_2026",
+    "red_distribucion": "red_distribucion_2026",
+    "avance_operativo_ceda_2025": "avance_operativo_ceda_2026",
+    "metas_2025": "metas_2026"
+}
+
+
+def tabla_para_anio(anio, base_table_name):
+    """Nombre de la tabla para el año (en 2026 busca en el mapa, si no está agrega _2026)."""
+    if str(anio) == "2026":
+        return TABLE_MAPPING_2026.get(base_table_name, f"{base_table_name}_2026")
+    return base_table_name
@@ -1,3 +1,757 @@
-from django.test import TestCase
+"""
+Pruebas de las piezas que no necesitan PostgreSQL: la SQL que arman y lo
+que hacen con las filas se revisa contra una conexión falsa.
+"""
 
-# Create your tests here.
+import concurrent.futures
+import datetime
+import io
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+
+from . import catalogos, conteos, exportacion, ocr, pipeline, routers, version_datos, vistas_tabla
+from .busqueda_dh import LIMITE_MAX, buscar_derechohabientes, es_curp
+from .busqueda_masiva import leer_llaves, preparar_llaves, sql_busqueda
+from .motor_ocr import parsear_config
+from .paginacion import PaginaKeyset, codificar_cursor, decodificar_cursor, paginar_keyset
+from .vistas_tabla import Filtro
+
+
+class CursorFalso:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = [(c,) for c in conn.columnas]
+        self._filas = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.ejecutadas.append((" ".join(sql.split()), list(params or [])))
+        self._filas = self.conn.respuestas.pop(0) if self.conn.respuestas else []
+
+    def copy_expert(self, sql, archivo, size=8192):
+        self.conn.ejecutadas.append((" ".join(sql.split()), None))
+        self.conn.copiado = archivo.read()
+
+    def fetchone(self):
+        return self._filas[0] if self._filas else None
+
+    def fetchall(self):
+        return list(self._filas)
+
+
+class ConexionFalsa:
+    """Devuelve, en orden, una lista de filas por cada execute y guarda la SQL ejecutada."""
+
+    def __init__(self, *respuestas, columnas=()):
+        self.respuestas = list(respuestas)
+        self.columnas = list(columnas)
+        self.ejecutadas = []
+        self.copiado = None
+
+    def cursor(self):
+        return CursorFalso(self)
+
+
+# ===========================
+# paginacion.py
+# ===========================
+
+class CursorKeysetTests(SimpleTestCase):
+
+    def test_ida_y_vuelta(self):
+        token = codificar_cursor(("2025-03-01", 42), "sig", 3)
+        self.assertEqual(decodificar_cursor(token), {"k": ["2025-03-01", 42], "d": "sig", "p": 3})
+
+    def test_token_sin_relleno_y_seguro_en_url(self):
+        token = codificar_cursor(("a" * 7, None), "ant", 2)
+        self.assertNotIn("=", token)
+        self.assertNotIn("+", token)
+        self.assertNotIn("/", token)
+        self.assertEqual(decodificar_cursor(token)["k"], ["a" * 7, None])
+
+    def test_fechas_viajan_como_texto(self):
+        token = codificar_cursor((datetime.date(2025, 1, 31), 1), "sig", 2)
+        self.assertEqual(decodificar_cursor(token)["k"], ["2025-01-31", 1])
+
+    def test_cursor_vacio_o_corrupto(self):
+        for token in (None, "", "no-es-base64!!", codificar_cursor((1,), "sig", 2),
+                      codificar_cursor((1, 2), "otro", 2)):
+            self.assertIsNone(decodificar_cursor(token), token)
+
+    def test_pagina_minima_uno(self):
+        self.assertEqual(decodificar_cursor(codificar_cursor((1, 2), "ant", 0))["p"], 1)
+
+
+class PaginarKeysetTests(SimpleTestCase):
+
+    def _paginar(self, conn, cursor=None, tamano=2, where=""):
+        return paginar_keyset(conn, "tabla", ["id", "fecha"], "fecha", "id",
+                              where=where, params=["x"] if where else None,
+                              cursor=cursor, tamano=tamano)
+
+    def test_primera_pagina(self):
+        conn = ConexionFalsa([(3, "d3"), (2, "d2"), (1, "d1")])
+        pagina = self._paginar(conn)
+        sql, params = conn.ejecutadas[0]
+        self.assertIn("WHERE fecha IS NOT NULL", sql)
+        self.assertIn("ORDER BY fecha DESC NULLS LAST, id DESC LIMIT 3", sql)
+        self.assertEqual(params, [])
+        # Hay fila de más: no se consultan los NULL y hay página siguiente
+        self.assertEqual(len(conn.ejecutadas), 1)
+        self.assertEqual([f["id"] for f in pagina], [3, 2])
+        self.assertTrue(pagina.has_next)
+        self.assertFalse(pagina.has_previous)
+        self.assertEqual(decodificar_cursor(pagina.next_cursor), {"k": ["d2", 2], "d": "sig", "p": 2})
+
+    def test_siguiente_pagina_con_where(self):
+        conn = ConexionFalsa([(1, "d1")], [(0, None)])
+        cursor = codificar_cursor(("d2", 2), "sig", 2)
+        pagina = self._paginar(conn, cursor=cursor, where="WHERE estado = %s")
+        sql, params = conn.ejecutadas[0]
+        self.assertIn("WHERE estado = %s AND (fecha, id) < (%s, %s)", sql)
+        self.assertEqual(params, ["x", "d2", 2])
+        # Faltaron filas: se completa con el segmento de fecha NULL
+        self.assertIn("fecha IS NULL", conn.ejecutadas[1][0])
+        self.assertIn("LIMIT 2", conn.ejecutadas[1][0])
+        self.assertEqual(pagina.number, 2)
+        self.assertEqual(pagina.start_index, 3)
+        self.assertFalse(pagina.has_next)
+        self.assertTrue(pagina.has_previous)
+
+    def test_pagina_anterior_regresa_en_orden(self):
+        conn = ConexionFalsa([(3, "d3"), (4, "d4"), (5, "d5")])
+        pagina = self._paginar(conn, cursor=codificar_cursor(("d2", 2), "ant", 2))
+        sql, params = conn.ejecutadas[0]
+        self.assertIn("(fecha, id) > (%s, %s)", sql)
+        self.assertIn("ORDER BY fecha ASC NULLS FIRST, id ASC", sql)
+        self.assertEqual([f["id"] for f in pagina], [4, 3])
+        self.assertTrue(pagina.has_previous)
+        self.assertTrue(pagina.has_next)
+
+    def test_conteo_con_tope_no_da_paginas(self):
+        pagina = PaginaKeyset([{"k": 1}], 100, 1, False, False, llave_de=lambda d: (d["k"], d["k"]))
+        pagina.asignar_conteo(conteos.Conteo(10000, "tope"))
+        self.assertIsNone(pagina.num_pages)
+        pagina.asignar_conteo(conteos.Conteo(250, "exacto"))
+        self.assertEqual(pagina.num_pages, 3)
+
+
+# ===========================
+# conteos.py
+# ===========================
+
+class ContarTests(SimpleTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        # Versión de datos fija: la llave de caché no consulta la BD
+        parche = mock.patch("fertilizantes.conteos.clave_cache",
+                            side_effect=lambda anio, *partes: ":".join([anio, *partes]))
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_sin_filtros_usa_estimado(self):
+        conn = ConexionFalsa([('[{"Plan": {"Plan Rows": 123456}}]',)])
+        conteo = conteos.contar(conn, "2025", "tabla")
+        self.assertEqual((conteo.valor, conteo.tipo), (123456, "estimado"))
+        self.assertTrue(conn.ejecutadas[0][0].startswith("EXPLAIN (FORMAT JSON)"))
+
+    def test_estimado_fallido_cae_en_tope(self):
+        conn = ConexionFalsa([], [(7,)])  # EXPLAIN sin filas → error
+        conteo = conteos.contar(conn, "2025", "tabla")
+        self.assertEqual((conteo.valor, conteo.tipo), (7, "exacto"))
+
+    def test_con_filtros_cuenta_con_tope(self):
+        conn = ConexionFalsa([(10001,)])
+        conteo = conteos.contar(conn, "2025", "tabla", "WHERE estado = %s", ["X"], tope=10000)
+        sql, params = conn.ejecutadas[0]
+        self.assertIn("LIMIT 10001", sql)
+        self.assertEqual(params, ["X"])
+        self.assertEqual((conteo.valor, conteo.tipo), (10000, "tope"))
+
+    def test_tope_que_cabe_es_exacto_y_se_guarda(self):
+        conn = ConexionFalsa([(42,)])
+        self.assertEqual(conteos.contar(conn, "2025", "tabla", "WHERE estado = %s", ["X"]).tipo, "exacto")
+        # Segunda vez sale de caché, sin consultar
+        conteo = conteos.contar(conn, "2025", "tabla", "WHERE estado = %s", ["X"])
+        self.assertEqual((conteo.valor, conteo.tipo), (42, "exacto"))
+        self.assertEqual(len(conn.ejecutadas), 1)
+
+    def test_tope_se_guarda_y_no_se_repite(self):
+        conn = ConexionFalsa([(10001,)], [(123456,)])
+        for _ in range(2):
+            conteo = conteos.contar(conn, "2025", "tabla", "WHERE estado = %s", ["X"], tope=10000)
+            self.assertEqual((conteo.valor, conteo.tipo), (10000, "tope"))
+        self.assertEqual(len(conn.ejecutadas), 1)
+        # Pedir el exacto sí cuenta, y reemplaza al tope en caché
+        conteo = conteos.contar(conn, "2025", "tabla", "WHERE estado = %s", ["X"], modo="exacto")
+        self.assertEqual((conteo.valor, conteo.tipo), (123456, "exacto"))
+        conteo = conteos.contar(conn, "2025", "tabla", "WHERE estado = %s", ["X"])
+        self.assertEqual((conteo.valor, conteo.tipo), (123456, "exacto"))
+        self.assertEqual(len(conn.ejecutadas), 2)
+
+    def test_modo_exacto(self):
+        conn = ConexionFalsa([(987654,)])
+        conteo = conteos.contar(conn, "2025", "tabla", modo="exacto")
+        self.assertEqual(conn.ejecutadas[0][0], "SELECT COUNT(*) FROM tabla")
+        self.assertEqual((conteo.valor, conteo.tipo), (987654, "exacto"))
+
+    def test_con_filtros_explicito(self):
+        # Subconsulta del ORM: los filtros van dentro de `origen`
+        conn = ConexionFalsa([(5,)])
+        conteo = conteos.contar(conn, "2025", "(SELECT 1) AS base", con_filtros=True)
+        self.assertIn("LIMIT", conn.ejecutadas[0][0])
+        self.assertEqual(conteo.tipo, "exacto")
+
+    def test_sin_version_no_se_guarda(self):
+        conn = ConexionFalsa([(42,)], [(42,)])
+        with mock.patch("fertilizantes.conteos.clave_cache", return_value=None):
+            conteos.contar(conn, "2026", "tabla", "WHERE estado = %s", ["X"])
+            conteos.contar(conn, "2026", "tabla", "WHERE estado = %s", ["X"])
+        self.assertEqual(len(conn.ejecutadas), 2)
+
+
+# ===========================
+# motor_ocr.py
+# ===========================
+
+class ParsearConfigTests(SimpleTestCase):
+
+    def test_valores_por_omision(self):
+        self.assertEqual(parsear_config(""), (3, 3, {}))
+        self.assertEqual(parsear_config(None), (3, 3, {}))
+
+    def test_oem_psm_y_variables(self):
+        self.assertEqual(
+            parsear_config('--oem 1 --psm 6 -c tessedit_char_whitelist="0123"'),
+            (1, 6, {"tessedit_char_whitelist": "0123"}),
+        )
+
+    def test_valor_con_espacios_e_igual(self):
+        _, _, variables = parsear_config("-c 'tessedit_char_whitelist=A B=C' -c preserve_interword_spaces=1")
+        self.assertEqual(variables, {"tessedit_char_whitelist": "A B=C", "preserve_interword_spaces": "1"})
+
+    def test_ignora_opciones_desconocidas(self):
+        self.assertEqual(parsear_config("--dpi 300 --psm 11 -c sin_igual"), (3, 11, {}))
+
+
+# ===========================
+# busqueda_masiva.py
+# ===========================
+
+class LeerLlavesTests(SimpleTestCase):
+
+    def test_archivo_csv_con_encabezado_y_bom(self):
+        archivo = io.BytesIO("\ufeffcurp_solicitud,nombre\npehj800101hdfrrn01,JUAN\n\n\"ABCD900202MDFRRN02\";x\n".encode("utf-8"))
+        self.assertEqual(leer_llaves("curp_solicitud", archivo),
+                         ["PEHJ800101HDFRRN01", "ABCD900202MDFRRN02"])
+
+    def test_archivo_latin1(self):
+        archivo = io.BytesIO("Acuse estatal\nACUSE-Ñ1\n".encode("latin-1"))
+        self.assertEqual(leer_llaves("acuse_estatal", archivo), ["ACUSE-Ñ1"])
+
+    def test_texto_pegado_sin_duplicados_en_orden(self):
+        texto = "b-2\n  a-1 \r\nb-2\n\ta-3\t\n"
+        # El acuse no se pasa a mayúsculas; el tabulador corta la primera columna
+        self.assertEqual(leer_llaves("acuse_estatal", texto=texto), ["b-2", "a-1"])
+
+    def test_archivo_y_texto_juntos(self):
+        archivo = io.BytesIO(b"A1\nA2\n")
+        self.assertEqual(leer_llaves("acuse_estatal", archivo, "A2\nA3"), ["A1", "A2", "A3"])
+
+
+class PrepararLlavesTests(SimpleTestCase):
+
+    def test_copy_escapa_diagonal_y_separadores(self):
+        conn = ConexionFalsa()
+        with conn.cursor() as cur:
+            preparar_llaves(["A\\B", "C\tD", "E\r\nF", "G"])(cur)
+        self.assertEqual(conn.copiado, "0\tA\\\\B\n1\tC D\n2\tE  F\n3\tG\n")
+        sqls = [sql for sql, _ in conn.ejecutadas]
+        self.assertTrue(sqls[0].startswith("CREATE TEMP TABLE _llaves_busqueda"))
+        self.assertEqual(sqls[1], "COPY _llaves_busqueda (orden, llave) FROM STDIN")
+        self.assertEqual(sqls[2], "ANALYZE _llaves_busqueda")
+
+    def test_sql_busqueda_conserva_orden_de_llegada(self):
+        sql = sql_busqueda("SELECT * FROM v WHERE x = %s", "curp_renapo", [("acuse_estatal", '"Acuse"')])
+        self.assertIn('base.acuse_estatal AS "Acuse"', sql)
+        self.assertIn("ON base.curp_renapo = k.llave", sql)
+        self.assertTrue(sql.endswith("ORDER BY k.orden"))
+
+
+# ===========================
+# busqueda_dh.py
+# ===========================
+
+class BusquedaDerechohabientesTests(SimpleTestCase):
+
+    def test_es_curp(self):
+        self.assertTrue(es_curp("PEHJ800101"))
+        self.assertTrue(es_curp("perez 80"))
+        self.assertFalse(es_curp("José Pérez"))
+
+    def _buscar(self, texto, **kwargs):
+        conn = ConexionFalsa([("A1", 0.9)], columnas=["acuse_estatal", "score"])
+        filas = buscar_derechohabientes(conn, texto, **kwargs)
+        sql, params = conn.ejecutadas[0]
+        # Un parámetro por cada %s (el operador %> va escapado como %%>)
+        self.assertEqual(sql.count("%s"), len(params))
+        return filas, sql, params
+
+    def test_curp_busca_en_ambas_columnas_sin_espacios(self):
+        filas, sql, params = self._buscar(" pehj 8001 ", limite=5)
+        self.assertIn("curp_renapo_busqueda %%> f_normalizar(%s)", sql)
+        self.assertEqual(params, ["pehj8001"] * 4 + [5])
+        self.assertEqual(filas, [{"acuse_estatal": "A1", "score": 0.9}])
+
+    def test_nombre_con_estado_y_limite_acotado(self):
+        _, sql, params = self._buscar("jose   perez", limite=1000, estado="Chiapas")
+        self.assertIn("nombre_busqueda %%> f_normalizar(%s) AND estado = %s", sql)
+        self.assertEqual(params, ["jose perez", "jose perez", "Chiapas", LIMITE_MAX])
+
+    def test_texto_corto_no_consulta(self):
+        conn = ConexionFalsa()
+        self.assertEqual(buscar_derechohabientes(conn, " ab "), [])
+        self.assertEqual(conn.ejecutadas, [])
+
+
+# ===========================
+# pipeline.py
+# ===========================
+
+class EstadoPipelineTests(SimpleTestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        parche = mock.patch.object(pipeline, "PIPELINE_DIR", Path(directorio.name))
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def _ejecucion(self, log, clave="actualizar_todo", codigo=None):
+        run_id = uuid.uuid4().hex
+        pipeline._escribir_meta({
+            "id": run_id, "clave": clave, "script": pipeline.SCRIPTS_PIPELINE[clave],
+            "usuario_id": 1, "pid": os.getpid(), "inicio": time.time() - 5,
+            "fin": None if codigo is None else time.time(), "codigo": codigo,
+        })
+        pipeline._ruta(run_id, "log").write_bytes(log)
+        return run_id
+
+    def test_en_curso_pasos_y_linea_a_medias(self):
+        run_id = self._ejecucion(b"inicio\n##PASO 2/5 Refrescar vistas\nlisto\nescribien")
+        e = pipeline.estado(run_id)
+        self.assertEqual(e["estado"], "en_curso")
+        self.assertFalse(e["terminado"])
+        self.assertEqual(e["paso"], {"n": 2, "total": 5, "nombre": "Refrescar vistas"})
+        self.assertEqual(e["lineas"], ["inicio", "listo"])
+        # La línea incompleta se entrega en la siguiente consulta
+        with open(pipeline._ruta(run_id, "log"), "ab") as f:
+            f.write(b"do\n")
+        siguiente = pipeline.estado(run_id, e["desde"])
+        self.assertEqual(siguiente["lineas"], ["escribiendo"])
+        self.assertIsNone(siguiente["paso"])
+
+    def test_terminado_entrega_el_resto(self):
+        run_id = self._ejecucion(b"##PASO 5/5 Fin\nsin salto", codigo=0)
+        e = pipeline.estado(run_id)
+        self.assertEqual((e["estado"], e["terminado"]), ("terminado", True))
+        self.assertEqual(e["lineas"], ["sin salto"])
+        self.assertEqual(e["desde"], len(b"##PASO 5/5 Fin\nsin salto"))
+
+    def test_no_terminado_hasta_leer_toda_la_bitacora(self):
+        run_id = self._ejecucion(b"uno\ndos\ntres\n", codigo=1)
+        with mock.patch.object(pipeline, "BITACORA_MAX_BYTES", 6):
+            e = pipeline.estado(run_id)
+            self.assertEqual((e["estado"], e["terminado"], e["lineas"]), ("error", False, ["uno"]))
+            e = pipeline.estado(run_id, e["desde"])
+            self.assertEqual((e["terminado"], e["lineas"]), (False, ["dos"]))
+            e = pipeline.estado(run_id, e["desde"])
+            self.assertEqual((e["terminado"], e["lineas"]), (True, ["tres"]))
+
+    def test_ocupado_solo_para_actualizar_todo(self):
+        ocupado = self._ejecucion(b"", codigo=pipeline.CODIGO_OCUPADO)
+        otro = self._ejecucion(b"", clave="integrar_informe", codigo=pipeline.CODIGO_OCUPADO)
+        self.assertEqual(pipeline.estado(ocupado)["estado"], "ocupado")
+        self.assertEqual(pipeline.estado(otro)["estado"], "error")
+
+    def test_interrumpido_sin_proceso(self):
+        run_id = self._ejecucion(b"a\n")
+        with mock.patch.object(pipeline, "_vivo", return_value=False):
+            e = pipeline.estado(run_id)
+        self.assertEqual((e["estado"], e["terminado"]), ("interrumpido", True))
+
+    def test_id_invalido_o_inexistente(self):
+        self.assertIsNone(pipeline.estado("../../etc/passwd"))
+        self.assertIsNone(pipeline.estado(uuid.uuid4().hex))
+
+
+# ===========================
+# ocr.py
+# ===========================
+
+class PoolFalso:
+    def __init__(self, roto=False):
+        self.roto = roto
+        self.cerrado = False
+
+    def submit(self, funcion, *args):
+        if self.roto:
+            raise BrokenProcessPool("murió un proceso")
+        futuro = concurrent.futures.Future()
+        futuro.set_result(funcion(*args))
+        return futuro
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.cerrado = True
+
+
+class TrabajoOCRTests(SimpleTestCase):
+
+    def setUp(self):
+        for nombre, valor in (("leer_texto", lambda sha, pagina, lang, config: "caché" if pagina == 1 else None),
+                              ("_podar_en_segundo_plano", lambda: None),
+                              ("_trabajos", {})):
+            parche = mock.patch.object(ocr, nombre, valor)
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def _enviar(self, *pools, paginas=2):
+        nuevos = mock.patch.object(ocr.concurrent.futures, "ProcessPoolExecutor", side_effect=list(pools[1:]))
+        with mock.patch.object(ocr, "_pool", pools[0]), nuevos:
+            trabajo = ocr.TrabajoOCR(1, "a" * 64, paginas)
+            ocr._registrar(trabajo, "a" * 64, "spa", "", [(str.upper, (f"p{n}",)) for n in range(1, paginas + 1)])
+            return trabajo, ocr._pool
+
+    def test_paginas_en_cache_y_enviadas(self):
+        trabajo, _ = self._enviar(PoolFalso(), paginas=3)
+        self.assertTrue(trabajo.terminado)
+        self.assertEqual(trabajo.textos, ["caché", "P2", "P3"])
+        self.assertEqual(ocr._hashes_en_uso(), set())
+
+    def test_pool_roto_se_reemplaza(self):
+        roto, nuevo = PoolFalso(roto=True), PoolFalso()
+        trabajo, actual = self._enviar(roto, nuevo)
+        self.assertIs(actual, nuevo)
+        self.assertTrue(roto.cerrado)
+        self.assertEqual((trabajo.textos, trabajo.errores), (["caché", "P2"], []))
+
+    def test_pagina_sin_enviar_termina_con_error(self):
+        trabajo, _ = self._enviar(PoolFalso(roto=True), PoolFalso(roto=True))
+        self.assertTrue(trabajo.terminado)
+        self.assertEqual(trabajo.textos, ["caché", ""])
+        self.assertEqual(len(trabajo.errores), 1)
+        self.assertTrue(trabajo.errores[0].startswith("Página 2:"))
+
+    def test_trabajo_pendiente_protege_su_hash(self):
+        trabajo = ocr.TrabajoOCR(1, "b" * 64, 1)
+        ocr._trabajos[trabajo.id] = trabajo
+        self.assertEqual(ocr._hashes_en_uso(), {"b" * 64})
+        futuro = concurrent.futures.Future()
+        futuro.set_result("listo")
+        trabajo._pagina_lista(0, futuro)
+        self.assertEqual(ocr._hashes_en_uso(), set())
+
+
+# ===========================
+# version_datos.py (ETag / Last-Modified)
+# ===========================
+
+class ValidadoresTests(SimpleTestCase):
+
+    def setUp(self):
+        self.versiones = {"2025": "20250301053000000000", "2026": "h1234"}
+        parche = mock.patch.object(version_datos, "obtener_version_datos",
+                                   side_effect=lambda anio: self.versiones[anio])
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def _peticion(self, anio_sesion="2026", csrf="t1"):
+        request = RequestFactory().get("/")
+        request.session = {"anio_activo": anio_sesion}
+        request.user = mock.Mock(pk=7)
+        request.COOKIES["csrftoken"] = csrf
+        return request
+
+    def test_anio_fijo_sigue_la_version_de_ese_anio(self):
+        request = self._peticion("2026")
+        etag = version_datos._etag_datos(request, "2025")
+        self.versiones["2026"] = "h9999"
+        self.assertEqual(version_datos._etag_datos(request, "2025"), etag)
+        self.versiones["2025"] = "20250302053000000000"
+        self.assertNotEqual(version_datos._etag_datos(request, "2025"), etag)
+
+    def test_sin_anio_usa_el_de_la_sesion(self):
+        request = self._peticion("2026")
+        etag = version_datos._etag_datos(request)
+        self.versiones["2025"] = "20250302053000000000"
+        self.assertEqual(version_datos._etag_datos(request), etag)
+        self.versiones["2026"] = "h9999"
+        self.assertNotEqual(version_datos._etag_datos(request), etag)
+
+    def test_anio_de_acepta_funcion(self):
+        self.assertEqual(version_datos._anio_de(self._peticion("2026"), lambda r: 2025), "2025")
+
+    def test_anio_de_sesion_entra_en_el_etag(self):
+        self.assertNotEqual(version_datos._etag_datos(self._peticion("2025"), "2025"),
+                            version_datos._etag_datos(self._peticion("2026"), "2025"))
+
+    def test_cookie_csrf_entra_en_el_etag(self):
+        self.assertNotEqual(version_datos._etag_datos(self._peticion(csrf="t1")),
+                            version_datos._etag_datos(self._peticion(csrf="t2")))
+
+    def test_version_desconocida_sin_validadores(self):
+        self.versiones["2025"] = "0"
+        self.assertIsNone(version_datos._etag_datos(self._peticion(), "2025"))
+        self.assertEqual(version_datos._validadores(self._peticion(), "2025"), (None, None))
+
+    def test_last_modified_solo_con_version_fechada(self):
+        request = self._peticion()
+        self.assertEqual(version_datos._ultima_carga(request, "2025"),
+                         datetime.datetime(2025, 3, 1, 5, 30, tzinfo=datetime.timezone.utc))
+        self.assertIsNone(version_datos._ultima_carga(request, "2026"))
+        etag, ultima = version_datos._validadores(request, "2025")
+        self.assertTrue(etag.startswith('"'))
+        self.assertEqual(ultima, 1740807000)
+
+
+# ===========================
+# vistas_tabla.py
+# ===========================
+
+class VistaTablaTests(SimpleTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        parche = mock.patch.object(vistas_tabla, "clave_cache",
+                                   side_effect=lambda anio, *partes: ":".join([anio, *partes]))
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.espec = vistas_tabla.VistaTabla(
+            "tabla", "plantilla.html",
+            ["estado", "toneladas", "campo_2025", "SUM(x) AS total"],
+            filtros=["estado", Filtro("desde", columna="fecha", operador=">=")],
+            condicion="activo",
+        )
+
+    def test_where_solo_con_filtros_presentes(self):
+        self.assertEqual(self.espec.where({"estado": "", "desde": None}), ("WHERE activo", []))
+        self.assertEqual(self.espec.where({"estado": "Chiapas", "desde": "2025-01-01"}),
+                         ("WHERE activo AND estado = %s AND fecha >= %s", ["Chiapas", "2025-01-01"]))
+        sin_condicion = vistas_tabla.VistaTabla("t", "p.html", ["a"], filtros=["a"])
+        self.assertEqual(sin_condicion.where({}), ("", []))
+
+    def test_select_columnas_faltantes_como_null(self):
+        conn = ConexionFalsa(columnas=["estado", "toneladas", "otra"])
+        select = vistas_tabla._select(self.espec, conn, "2026", "tabla_2026")
+        self.assertEqual(select, "estado, toneladas, NULL AS campo_2025, SUM(x) AS total")
+        self.assertEqual(conn.ejecutadas, [("SELECT * FROM tabla_2026 LIMIT 0", [])])
+        # Las columnas de la tabla quedan en caché
+        vistas_tabla._select(self.espec, conn, "2026", "tabla_2026")
+        self.assertEqual(len(conn.ejecutadas), 1)
+
+    def test_alias(self):
+        self.assertEqual(vistas_tabla._alias("SUM(x) AS total"), "total")
+        self.assertEqual(vistas_tabla._alias("t.estado"), "estado")
+
+    def test_solo_el_resultado_sin_filtros_va_a_cache(self):
+        resultado = (["estado"], [("Chiapas",)], {})
+        with mock.patch.object(vistas_tabla, "_consultar", return_value=resultado) as consultar:
+            for _ in range(2):
+                vistas_tabla._resultado(self.espec, "v", None, "2025", "tabla", {"estado": None})
+            self.assertEqual(consultar.call_count, 1)
+            for _ in range(2):
+                vistas_tabla._resultado(self.espec, "v", None, "2025", "tabla", {"estado": "Chiapas"})
+            self.assertEqual(consultar.call_count, 3)
+
+    def test_resultado_enorme_no_va_a_cache(self):
+        resultado = (["estado"], [("x",)] * (vistas_tabla.RESULTADO_MAX_FILAS + 1), {})
+        with mock.patch.object(vistas_tabla, "_consultar", return_value=resultado) as consultar:
+            vistas_tabla._resultado(self.espec, "v", None, "2025", "tabla", {})
+            vistas_tabla._resultado(self.espec, "v", None, "2025", "tabla", {})
+        self.assertEqual(consultar.call_count, 2)
+
+
+# ===========================
+# exportacion.py (tipos Arrow)
+# ===========================
+
+class TipoArrowTests(SimpleTestCase):
+
+    def _tipo(self, type_code, precision=None, scale=None):
+        pa = mock.Mock()
+        pa.decimal128.side_effect = lambda p, s: ("decimal128", p, s)
+        pa.string.return_value = "string"
+        columna = mock.Mock(type_code=type_code, precision=precision, scale=scale)
+        with mock.patch.object(exportacion, "pa", pa):
+            return exportacion._tipo_arrow(columna)
+
+    def test_numeric_declarado_es_decimal_exacto(self):
+        self.assertEqual(self._tipo(1700, 12, 3), (("decimal128", 12, 3), None))
+
+    def test_numeric_sin_precision_con_escala_fija(self):
+        tipo, conv = self._tipo(1700)
+        self.assertEqual(tipo, ("decimal128", 38, exportacion.ESCALA_NUMERIC))
+        self.assertEqual(conv(Decimal("12.3456785")), Decimal("12.345678"))
+        self.assertEqual(conv(Decimal("12.3456795")), Decimal("12.345680"))
+        self.assertIsNone(conv(Decimal("NaN")))
+        self.assertIsNone(conv(Decimal("1e40")))
+
+    def test_numeric_de_mas_de_38_digitos_es_texto(self):
+        self.assertEqual(self._tipo(1700, 50, 2), ("string", str))
+
+
+# ===========================
+# version_datos.py (versión) y catalogos.py
+# ===========================
+
+class VersionDatosTests(SimpleTestCase):
+
+    def _consultar(self, conn):
+        with mock.patch.object(version_datos, "conexion_para_anio", return_value=conn):
+            return version_datos._consultar_version("2025")
+
+    def test_version_de_la_tabla_en_utc(self):
+        cdmx = datetime.timezone(datetime.timedelta(hours=-6))
+        conn = ConexionFalsa([(True,)], [(datetime.datetime(2025, 3, 1, 5, 30, 0, 12, tzinfo=cdmx),)])
+        self.assertEqual(self._consultar(conn), "20250301113000000012")
+
+    def test_sin_tabla_usa_huella_sin_tablas_del_sitio(self):
+        conn = ConexionFalsa([(False,)], [("abc123",)])
+        self.assertEqual(self._consultar(conn), "habc123")
+        sql, params = conn.ejecutadas[1]
+        self.assertIn("pg_stat_user_tables", sql)
+        self.assertEqual(params, [version_datos.TABLAS_FUERA_DE_HUELLA])
+        self.assertIn("comentarios_ceda", version_datos.TABLAS_FUERA_DE_HUELLA)
+
+    def test_tabla_vacia_usa_huella(self):
+        conn = ConexionFalsa([(True,)], [(None,)], [("abc123",)])
+        self.assertEqual(self._consultar(conn), "habc123")
+
+    def test_error_es_version_desconocida(self):
+        with mock.patch.object(version_datos, "conexion_para_anio", side_effect=RuntimeError("sin BD")):
+            self.assertEqual(version_datos._consultar_version("2026"), "0")
+
+    def test_clave_cache_sin_version(self):
+        with mock.patch.object(version_datos, "obtener_version_datos", side_effect=["habc", "0"]):
+            self.assertEqual(version_datos.clave_cache(2026, "catalogo", "t"), "fert:2026:habc:catalogo:t")
+            self.assertIsNone(version_datos.clave_cache(2026, "catalogo", "t"))
+
+
+class CatalogosTests(SimpleTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.version = "v1"
+        parche = mock.patch.object(catalogos, "clave_cache",
+                                   side_effect=lambda anio, *p: self.version and ":".join([anio, self.version, *p]))
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def _opciones(self, conn, filtros=None):
+        return catalogos.opciones_filtro(conn, "2025", "red", ["estado", "zona"], filtros)
+
+    def test_una_consulta_por_version(self):
+        conn = ConexionFalsa([(["B", "A", None, ""], ["Z1"])], [(["C"], [])])
+        self.assertEqual(self._opciones(conn), {"estado": ["B", "A"], "zona": ["Z1"]})
+        self.assertEqual(self._opciones(conn), {"estado": ["B", "A"], "zona": ["Z1"]})
+        self.assertEqual(len(conn.ejecutadas), 1)
+        self.version = "v2"
+        self.assertEqual(self._opciones(conn), {"estado": ["C"], "zona": []})
+
+    def test_filtros_en_where_y_en_la_llave(self):
+        conn = ConexionFalsa([(["A"], ["Z1"])], [(["B"], ["Z2"])])
+        self._opciones(conn, {"unidad_operativa": "UO1", "estado": ""})
+        sql, params = conn.ejecutadas[0]
+        self.assertEqual(sql.count("WHERE unidad_operativa = %s"), 2)
+        self.assertEqual(params, ["UO1", "UO1"])
+        self.assertEqual(self._opciones(conn, {"unidad_operativa": "UO2"}), {"estado": ["B"], "zona": ["Z2"]})
+
+    def test_sin_version_no_se_guarda(self):
+        self.version = None
+        conn = ConexionFalsa([(["A"], [])], [(["A"], [])])
+        self._opciones(conn)
+        self._opciones(conn)
+        self.assertEqual(len(conn.ejecutadas), 2)
+
+    def test_error_devuelve_listas_vacias_sin_guardar(self):
+        conn = ConexionFalsa([], [(["A"], ["Z"])])  # primera consulta sin fila → error
+        conn.rollback = mock.Mock()
+        self.assertEqual(self._opciones(conn), {"estado": [], "zona": []})
+        conn.rollback.assert_called_once()
+        self.assertEqual(self._opciones(conn), {"estado": ["A"], "zona": ["Z"]})
+
+
+# ===========================
+# routers.py
+# ===========================
+
+class RouterAnioTests(SimpleTestCase):
+
+    def _modelo(self, model_name, app_label="fertilizantes"):
+        return mock.Mock(_meta=mock.Mock(app_label=app_label, model_name=model_name))
+
+    def _en_anio(self, anio, funcion, *args):
+        token = routers._anio_activo.set(anio)
+        try:
+            return funcion(*args)
+        finally:
+            routers._anio_activo.reset(token)
+
+    def test_alias_para_anio(self):
+        self.assertEqual(routers.alias_para_anio(2026), "fertilizantes_2026")
+        self.assertEqual(routers.alias_para_anio("2025"), "default")
+        self.assertEqual(routers.alias_para_anio("1999"), "default")
+
+    def test_modelos_por_anio_siguen_al_anio_activo(self):
+        router = routers.RouterAnio()
+        comentario = self._modelo("comentarioceda")
+        self.assertEqual(router.db_for_read(comentario), "default")
+        self.assertEqual(self._en_anio("2026", router.db_for_read, comentario), "fertilizantes_2026")
+        self.assertEqual(self._en_anio("2026", router.db_for_write, comentario), "fertilizantes_2026")
+
+    def test_otros_modelos_no_se_enrutan(self):
+        router = routers.RouterAnio()
+        self.assertIsNone(self._en_anio("2026", router.db_for_read, self._modelo("derechohabiente")))
+        self.assertIsNone(self._en_anio("2026", router.db_for_write, self._modelo("comentarioceda", "auth")))
+
+    def test_migraciones_solo_en_default(self):
+        router = routers.RouterAnio()
+        self.assertIsNone(router.allow_migrate("default", "fertilizantes"))
+        self.assertFalse(router.allow_migrate("fertilizantes_2026", "fertilizantes"))
+
+    def test_middleware_fija_y_restaura_el_anio(self):
+        vistos = []
+        middleware = routers.AnioActivoMiddleware(lambda request: vistos.append(routers.anio_activo()))
+        request = RequestFactory().get("/")
+        request.session = {"anio_activo": 2026}
+        middleware(request)
+        request.session = {}
+        middleware(request)
+        self.assertEqual(vistos, ["2026", "2025"])
+        self.assertEqual(routers.anio_activo(), "2025")
+
+    def test_middleware_restaura_el_anio_si_la_vista_falla(self):
+        def vista(request):
+            raise ValueError("falla")
+        request = RequestFactory().get("/")
+        request.session = {"anio_activo": "2026"}
+        with self.assertRaises(ValueError):
+            routers.AnioActivoMiddleware(vista)(request)
+        self.assertEqual(routers.anio_activo(), "2025")
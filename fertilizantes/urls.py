@@ -8,6 +8,7 @@ urlpatterns = [
     path('inicio/', views.inicio, name='inicio'),
     path('seleccionar-anio/', views.seleccionar_anio, name='seleccionar_anio'),
     path('actualizacion/', views.actualizar_bases, name='actualizacion'),
+    path('actualizacion/estado/<str:run_id>/', views.pipeline_estado, name='pipeline_estado'),
     path('reportes/', views.reportes, name='reportes'),
     path('reportes/fletes_transito/', views.reporte_fletes_transito, name='fletes_transito'),
     path('reportes/inventarios_negativos/', views.reporte_inventarios_negativos, name='inventarios_negativos'),
@@ -46,7 +47,10 @@ urlpatterns = [
         views.vista_derechohabientes,        # ⇦ función que pegamos en Paso 3
         name='vista_derechohabientes'
     ),
+    path("derechohabientes/busqueda-masiva/", views.derechohabientes_busqueda_masiva, name="derechohabientes_busqueda_masiva"),
+    path("api/derechohabientes/buscar/", views.api_buscar_derechohabientes, name="api_buscar_derechohabientes"),
     path("api/filtros_kpi/", views.api_filtros_kpi, name="api_filtros_kpi"),
+    path("api/eventos/version/", views.api_eventos_version, name="api_eventos_version"),
     path('visualizacion/resumen-estatal/', views.resumen_estatal, name='resumen_estatal'),
     path('api/kpi/resumen-por-estado/', views.api_tabla_resumen_por_estado, name='api_resumen_por_estado'),
     path("comentarios_ceda/", comentarios_por_ceda, name="comentarios_por_ceda"),
@@ -60,6 +64,10 @@ urlpatterns = [
     path("api/fletes/exportar_csv/", views.api_fletes_exportar_csv, name="api_fletes_exportar_csv"),
     path("ocr/", views.ocr_page, name="ocr_page"),
     path("ocr/extract/", views.ocr_extract, name="ocr_extract"),
+    path("ocr/estado/<str:job_id>/", views.ocr_estado, name="ocr_estado"),
+
+    # Diagnóstico (staff)
+    path("diagnostico/sql/", views.diagnostico_sql, name="diagnostico_sql"),
 
     # URLS sistema 2026
     path('visualizacion/avance-2026/', views.dashboard_avance_nacional_2026, name='dashboard_avance_2026'),
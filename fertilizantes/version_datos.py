@@ -0,0 +1,260 @@
+"""
+Versión de la carga de datos.
+
+actualizar_todo.py registra en la tabla `version_datos` (una fila por
+vista materializada) el momento en que terminó cada REFRESH. La versión
+de una BD es el MAX(actualizado_en) de esa tabla: cambia sólo cuando
+termina una carga, así que sirve como parte de las llaves de caché
+(todo lo calculado con la versión anterior queda inalcanzable).
+
+Las BD sin `version_datos` (la carga 2026 no pasa por actualizar_todo.py)
+usan como versión una huella de la actividad de escritura acumulada por
+tabla (pg_stat_user_tables): cambia con cualquier carga o TRUNCATE +
+INSERT, sin depender de que el proceso de carga la registre. Las tablas
+que escribe el propio sitio (TABLAS_FUERA_DE_HUELLA: comentarios,
+sesiones) no cuentan; si no, cada comentario guardado sería una "carga
+nueva" y todos los workers volverían a precalentar.
+
+Versión "0" = desconocida (no se pudo leer): clave_cache devuelve None y
+no se guarda nada en caché ni se mandan validadores, para no servir datos
+viejos bajo una versión que nunca cambia.
+
+Para no consultar la BD en cada petición, la versión se memoriza en el
+proceso durante VERSION_TTL segundos.
+
+La misma versión respalda las respuestas condicionales
+(@respuesta_condicional): ETag / Last-Modified ligados a la carga, así
+que una visita repetida o un sondeo sin datos nuevos recibe
+304 Not Modified sin ejecutar la vista. Por omisión la versión es la del
+año activo de la sesión; las vistas que siempre consultan la BD 2025
+usan @respuesta_condicional(anio="2025"), si no un usuario en modo 2026
+recibiría 304 con datos 2025 viejos.
+"""
+
+import datetime
+import hashlib
+import time
+import threading
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from .routers import conexion_para_anio
+
+# Segundos que se reutiliza la versión leída antes de volver a consultarla
+VERSION_TTL = 15
+
+SQL_HAY_VERSION = "SELECT to_regclass('version_datos') IS NOT NULL"
+SQL_VERSION = "SELECT MAX(actualizado_en) FROM version_datos"
+# Tablas que escribe el sitio (no la carga): no cambian la versión
+TABLAS_FUERA_DE_HUELLA = ["comentarios_ceda", "django_session"]
+# Respaldo: huella de inserciones / actualizaciones / borrados por tabla
+SQL_HUELLA = """
+    SELECT md5(string_agg(s.relid::text || ':' || (s.n_tup_ins + s.n_tup_upd + s.n_tup_del)::text,
+                          ',' ORDER BY s.relid))
+    FROM pg_stat_user_tables s
+    JOIN pg_class c ON c.oid = s.relid
+    WHERE c.relpersistence = 'p'
+      AND s.relname::text <> ALL(%s::text[])
+"""
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+# Última versión vista por este proceso y funciones a avisar cuando cambia
+_vista = {}
+_al_cambiar = []
+
+
+def _consultar_version(anio: str) -> str:
+    try:
+        with conexion_para_anio(anio).cursor() as cur:
+            cur.execute(SQL_HAY_VERSION)
+            if cur.fetchone()[0]:
+                cur.execute(SQL_VERSION)
+                ultimo = cur.fetchone()[0]
+                if ultimo:
+                    # Siempre en UTC: la versión también se usa como Last-Modified
+                    if ultimo.tzinfo is not None:
+                        ultimo = ultimo.astimezone(datetime.timezone.utc)
+                    return ultimo.strftime("%Y%m%d%H%M%S%f")
+            # Sin carga registrada: huella de escritura ("h" + md5)
+            cur.execute(SQL_HUELLA, [TABLAS_FUERA_DE_HUELLA])
+            huella = cur.fetchone()[0]
+        return f"h{huella}" if huella else "0"
+    except Exception as e:
+        print(f"Error leyendo la versión de datos ({anio}): {e}")
+        return "0"
+
+
+def obtener_version_datos(anio) -> str:
+    """
+    Devuelve la versión de la carga vigente para la BD del año indicado,
+    como cadena (p.ej. "20260115053012123456"); "0" si no hay registro.
+    """
+    anio = str(anio)
+    ahora = time.monotonic()
+    memo = _memo.get(anio)
+    if memo and memo[0] > ahora:
+        return memo[1]
+
+    version = _consultar_version(anio)
+    with _memo_lock:
+        _memo[anio] = (ahora + VERSION_TTL, version)
+        nueva = version != "0" and _vista.get(anio) != version
+        _vista[anio] = version
+    if nueva:
+        for funcion in _al_cambiar:
+            try:
+                funcion(anio, version)
+            except Exception as e:
+                print(f"Error avisando nueva versión de datos ({anio}): {e}")
+    return version
+
+
+def al_cambiar_version(funcion):
+    """
+    Registra funcion(anio, version), que se llama cuando este proceso ve
+    por primera vez una versión de datos (al arrancar o tras una carga).
+    Debe regresar rápido: se ejecuta dentro de la petición que la detectó.
+    """
+    if funcion not in _al_cambiar:
+        _al_cambiar.append(funcion)
+
+
+def olvidar_version(anio=None):
+    """
+    Descarta la versión memorizada (de un año o de todos) para que la
+    siguiente lectura consulte la BD; se usa justo después de una carga.
+    """
+    with _memo_lock:
+        if anio is None:
+            _memo.clear()
+        else:
+            _memo.pop(str(anio), None)
+
+
+def clave_cache(anio, *partes):
+    """
+    Llave de caché ligada a la versión de datos del año:
+    "<prefijo>:<anio>:<version>:<partes...>". None si la versión es
+    desconocida ("0"): quien la pide no debe leer ni guardar en caché.
+    """
+    anio = str(anio)
+    version = obtener_version_datos(anio)
+    if version == "0":
+        return None
+    return ":".join(["fert", anio, version, *map(str, partes)])
+
+
+# ===========================
+# Respuestas condicionales (304)
+# ===========================
+
+def _anio_de(request, anio=None) -> str:
+    """Año de los datos: `anio` fijo, función(request) o, sin él, el de la sesión."""
+    if callable(anio):
+        return str(anio(request))
+    if anio is not None:
+        return str(anio)
+    return str(request.session.get("anio_activo", "2025"))
+
+
+def _etag_datos(request, anio=None):
+    """
+    La respuesta de una misma URL sólo cambia con la carga de datos (del
+    año que consulta la vista), el año activo y el usuario; el día entra
+    para las vistas que filtran por "hoy"/"ayer". La sesión y la cookie CSRF también entran: las páginas
+    con formularios llevan el token, y tras volver a iniciar sesión no debe
+    reutilizarse una copia con el token anterior. Sin versión conocida no
+    hay ETag (None).
+    """
+    datos = _anio_de(request, anio)
+    version = obtener_version_datos(datos)
+    if version == "0":
+        return None
+    usuario = getattr(getattr(request, "user", None), "pk", None)
+    sesion = getattr(getattr(request, "session", None), "session_key", None)
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")
+    # El año de la sesión también entra: la página lo muestra en el menú
+    crudo = f"{datos}:{version}:{_anio_de(request)}:{usuario}:{sesion}:{csrf}:{datetime.date.today()}"
+    return hashlib.md5(crudo.encode("utf-8")).hexdigest()
+
+
+def _ultima_carga(request, anio=None):
+    version = obtener_version_datos(_anio_de(request, anio))
+    if not version.isdigit() or version == "0":
+        # Versión por huella (sin fecha) o desconocida
+        return None
+    return datetime.datetime.strptime(version, "%Y%m%d%H%M%S%f").replace(tzinfo=datetime.timezone.utc)
+
+
+def respuesta_condicional(vista=None, *, anio=None):
+    """
+    Decorador para vistas GET cuyo contenido sólo cambia con la carga de
+    datos: agrega ETag y Last-Modified y responde 304 si el navegador ya
+    tiene esa versión. Cache-Control "private, no-cache" obliga a
+    revalidar siempre (nunca se sirve una copia vieja sin preguntar).
+
+    anio: año de la BD que consulta la vista ("2025") o función(request)
+    que lo devuelve; sin él, el año activo de la sesión.
+    """
+    if vista is None:
+        return lambda v: respuesta_condicional(v, anio=anio)
+    if iscoroutinefunction(vista):
+        return _respuesta_condicional_async(vista, anio)
+
+    condicionada = condition(
+        etag_func=lambda request, *args, **kwargs: _etag_datos(request, anio),
+        last_modified_func=lambda request, *args, **kwargs: _ultima_carga(request, anio),
+    )(vista)
+
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        resp = condicionada(request, *args, **kwargs)
+        if request.method in ("GET", "HEAD"):
+            patch_cache_control(resp, private=True, no_cache=True)
+        return resp
+
+    return envoltura
+
+
+def _validadores(request, anio=None):
+    etag = _etag_datos(request, anio)
+    if etag is None:
+        return None, None
+    ultima = _ultima_carga(request, anio)
+    return quote_etag(etag), (int(ultima.timestamp()) if ultima else None)
+
+
+def _respuesta_condicional_async(vista, anio=None):
+    """
+    Lo mismo que condition() para vistas async: la sesión y la versión de
+    datos se leen con la conexión de Django, así que los validadores se
+    calculan en el hilo síncrono de la petición.
+    """
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return await vista(request, *args, **kwargs)
+
+        etag, ultima = await sync_to_async(_validadores)(request, anio)
+        resp = None
+        if etag:
+            resp = get_conditional_response(request, etag=etag, last_modified=ultima)
+        if resp is None:
+            resp = await vista(request, *args, **kwargs)
+            if etag and resp.status_code == 200:
+                if not resp.has_header("ETag"):
+                    resp.headers["ETag"] = etag
+                if ultima and not resp.has_header("Last-Modified"):
+                    resp.headers["Last-Modified"] = http_date(ultima)
+        patch_cache_control(resp, private=True, no_cache=True)
+        return resp
+
+    return envoltura
@@ -1,106 +1,63 @@
-import csv
-import io
 import json
 import math
 import datetime
 import base64
-import subprocess
-import pandas as pd
+import asyncio
 import tempfile
 from pathlib import Path
 from decimal import Decimal
 from datetime import date, timedelta
 
 # Django Imports
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.http import JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.db import connection
 from django.db.models import Sum
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.http import require_GET, require_POST
 from django.utils.timezone import now
-from django.utils.encoding import smart_str
 from django.utils.dateparse import parse_date
-from django.core.paginator import Paginator  # ✨ Paginación
 
 
 # App Imports
 from .forms import ComentarioCEDAForm
 from .models import ComentarioCEDA, VwDerechohabientesConContexto as DH
-from sqlalchemy import text
-from .conexion import (
-    engine,
-    psycopg_conn,
-    get_engine_for_year,
-    get_psycopg_conn_for_year,
+from .catalogos import opciones_filtro
+from .paginacion import paginar_keyset
+from .conteos import contar
+from .exportacion import (
+    HAS_ARROW, FORMATOS_ARROW, comillas_ident, respuesta_copy_csv, respuesta_arrow_streaming,
 )
+from .respuestas import JsonRapidoResponse, a_columnar
+from . import instrumentacion, pipeline
+from .concurrente import consultar_async, consultar_con_totales_async, opciones_filtro_async
+from .cubo_kpi import consultar_kpi, resumen_por_estado
+from .eventos import flujo_version, flujo_version_wsgi
+from .version_datos import respuesta_condicional
+from .routers import conexion_para_anio
 
-# OCR Imports
-from PIL import Image, ImageOps, ImageFilter
-import pytesseract
-
-try:
-    from pdf2image import convert_from_bytes
-    HAS_PDF = True
-except Exception:
-    HAS_PDF = False
-
-
-from .conexion import get_psycopg_conn_for_year
+from .tablas import tabla_para_anio
+from .vistas_tabla import Filtro, VistaTabla, vista_tabla
+from .busqueda_masiva import CAMPOS_LLAVE, MAX_LLAVES, leer_llaves, preparar_llaves, sql_busqueda
+from .busqueda_dh import LIMITE_DEFECTO, buscar_derechohabientes
 
 
 # ==========================================
 # 🛠️ CONFIGURACIÓN DE TABLAS (2025 -> 2026)
 # ==========================================
 
-TABLE_MAPPING_2026 = {
-    # Fletes
-    "fletes_en_transito_resumen_estado": "fletes_en_transito_resumen_estado_2026",
-    "fletes_en_transito_resumen": "fletes_en_transito_resumen_2026",
-    "fletes_en_transito_detalle": "fletes_en_transito_detalle_2026",
-    "fletes_ton_conteo_detalle_td": "fletes_ton_conteo_detalle_2026_td",
-    "fletes_toneladas_recibidas_atipicas_2025": "fletes_toneladas_recibidas_atipicas_2026",
-    "fletes_fechas_incoherentes_2025": "fletes_fechas_incoherentes_2026",
-    "mv_fletes_enriquecidos": "mv_fletes_enriquecidos_2026",
-    
-    # Inventarios y Remanentes
-    "inventario_acumulado_x_ceda_diario_2025": "inventario_acumulado_x_ceda_diario_2026",
-    "inventarios_negativos_x_ceda_diario_2025": "inventarios_negativos_x_ceda_diario_2026",
-    "inventarios_negativos_2025": "inventarios_negativos_2026",
-    "resumen_remanente_estado_2025": "resumen_remanente_estado_2026",
-    "cedas_con_remanentes_2025": "cedas_con_remanentes_2026",
-    "cedas_con_remanentes_negativos_2025": "cedas_con_remanentes_negativos_2026",
-    "inventario_ceda_diario_2025_campo_sigap": "inventario_ceda_diario_2026_campo_sigap",
-    "estadisticas_inventarios_campo": "estadisticas_inventarios_campo_2026",
-    
-    # Operación y Pedidos
-    "pedidos_detalle_por_fecha_2025": "pedidos_detalle_por_fecha_2026",
-    "entregas_diarias_2025": "entregas_diarias_2026",
-    "vista_comentarios_ceda": "vista_comentarios_ceda_2026",
-    
-    # Tablas Base
-    "vw_derechohabientes_con_contexto": "vw_derechohabientes_con_contexto_2026",
-    "red_distribucion": "red_distribucion_2026",
-    "avance_operativo_ceda_2025": "avance_operativo_ceda_2026",
-    "metas_2025": "metas_2026"
-}
-
 def get_table_and_conn(request, base_table_name):
     """
     Determina la tabla y conexión correcta.
     Recibe siempre el nombre de la tabla de 2025.
+    La conexión es la persistente de Django del año (alias de
+    DATABASES, ver routers.py): no se cierra.
     """
     anio = get_anio_context(request)
-    
-    if anio == "2026":
-        conn = get_psycopg_conn_for_year(2026)
-        # Busca en el mapa, si no está, agrega _2026 por defecto
-        table_name = TABLE_MAPPING_2026.get(base_table_name, f"{base_table_name}_2026")
-        return table_name, conn, False
-    else:
-        # 2025 (Default)
-        return base_table_name, connection, True
-
+    return tabla_para_anio(anio, base_table_name), conexion_para_anio(anio)
 
 
 def get_anio_context(request):
@@ -192,20 +149,35 @@ def seleccionar_anio(request):
 
 @login_required
 def actualizar_bases(request):
+    """
+    Lanza actualizar_todo.py / Integrar_informe_2025.py en segundo plano
+    (pipeline.py) y muestra la ejecución más reciente; la página sigue su
+    avance y bitácora con pipeline_estado.
+    """
     mensaje = ''
     if request.method == 'POST':
-        # Rutas hardcoded (Validar si cambian en 2026)
-        path_python = "/Users/Arturo/AGRICULTURA/FERTILIZANTES/ENTORNO/env/bin/python"
-        path_scripts = "/Users/Arturo/AGRICULTURA/FERTILIZANTES/SCRIPTS/"
-        
-        script = "actualizar_todo.py" if 'actualizar_todo' in request.POST else "Integrar_informe_2025.py"
-        
-        resultado = subprocess.run(
-            [path_python, path_scripts + script],
-            capture_output=True, text=True
-        )
-        mensaje = resultado.stdout or resultado.stderr
-    return render(request, 'fertilizantes/actualizacion.html', {'mensaje': mensaje})
+        clave = "actualizar_todo" if 'actualizar_todo' in request.POST else "integrar_informe"
+        try:
+            pipeline.lanzar(clave, request.user.pk)
+            return redirect("actualizacion")
+        except pipeline.PipelineOcupado as e:
+            mensaje = str(e)
+        except Exception as e:
+            mensaje = f"No se pudo iniciar la actualización: {e}"
+    return render(request, 'fertilizantes/actualizacion.html', {
+        'mensaje': mensaje,
+        'ejecucion_id': pipeline.ultima_ejecucion(),
+    })
+
+@login_required
+def pipeline_estado(request, run_id):
+    """Avance de una ejecución; ?desde=N devuelve la bitácora a partir del byte N."""
+    try: desde = max(int(request.GET.get("desde", 0)), 0)
+    except ValueError: desde = 0
+    estado = pipeline.estado(run_id, desde)
+    if estado is None:
+        return JsonResponse({"error": "Ejecución no encontrada."}, status=404)
+    return JsonResponse(estado)
 
 # ==========================================
 # 📊 REPORTES Y MENÚS
@@ -241,7 +213,7 @@ def reporte_entregas_nacionales(request):
     tabla = f"entregas_diarias_{anio}"
     datos = []
     try:
-        with connection.cursor() as cursor:
+        with conexion_para_anio(anio).cursor() as cursor:
             cursor.execute(f"SELECT * FROM {tabla} LIMIT 100")
             columnas = [col[0] for col in cursor.description]
             datos = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
@@ -261,12 +233,9 @@ def dashboard_avance_nacional_2026(request):
     return render(request, 'fertilizantes/visualizacion/dashboard_nacional_2026.html', {"timestamp": int(now().timestamp())})
 
 @login_required
+@respuesta_condicional
 def api_kpi_avance_nacional(request):
     anio = get_anio_context(request)
-    tbl_avance = f"avance_operativo_ceda_{anio}"
-    tbl_metas  = f"metas_{anio}"
-    tbl_red    = f"red_distribucion_{anio}" if anio == "2026" else "red_distribucion"
-    
     filtros = {
         "unidad": request.GET.get("unidad_operativa"),
         "estado": request.GET.get("estado"),
@@ -274,44 +243,11 @@ def api_kpi_avance_nacional(request):
     }
     tipo_meta = request.GET.get("tipo_meta", "operativa")
 
-    cond, params = [], []
-    if filtros["unidad"]:
-        cond.append("rd.coordinacion_estatal = %s"); params.append(filtros["unidad"])
-    if filtros["estado"]:
-        cond.append("rd.estado = %s"); params.append(filtros["estado"])
-    if filtros["ceda"]:
-        cond.append("rd.id_ceda_agricultura = %s"); params.append(filtros["ceda"])
-
-    where = "WHERE " + " AND ".join(cond) if cond else ""
-    
+    # Búsqueda en el cubo de KPIs en memoria (se arma una vez por carga de datos)
     try:
-        if tipo_meta == "oficial" and not filtros["ceda"]:
-            sql = f"""
-            WITH avance_estado AS (
-                SELECT rd.estado,
-                       SUM(a.dap_flete + a.urea_flete + a.dap_transfer + a.urea_transfer
-                           + a.dap_remanente + a.urea_remanente
-                           - a.dap_transf_out - a.urea_transf_out - a.dap_rem_out - a.urea_rem_out) AS abasto,
-                       SUM(a.dap_dh + a.urea_dh) AS entregado,
-                       SUM(a.dh_apoyados) AS dh_apoyados, SUM(a.ha_apoyadas) AS ha_apoyadas
-                FROM   {tbl_avance} a JOIN {tbl_red} rd ON rd.id_ceda_agricultura = a.id_ceda_agricultura
-                {where} GROUP BY rd.estado
-            )
-            SELECT SUM(m.total_ton), SUM(av.abasto), SUM(av.entregado), SUM(av.dh_apoyados), SUM(av.ha_apoyadas), SUM(m.derechohabientes), SUM(m.superficie_ha)
-            FROM   avance_estado av JOIN {tbl_metas} m ON m.estado = av.estado;
-            """    
-        else:
-            sql = f"""
-                SELECT SUM(a.meta_total_ton), 
-                       SUM(a.dap_flete + a.urea_flete + a.dap_transfer + a.urea_transfer + a.dap_remanente + a.urea_remanente - a.dap_transf_out - a.urea_transf_out - a.dap_rem_out - a.urea_rem_out),
-                       SUM(a.dap_dh + a.urea_dh), SUM(a.dh_apoyados), SUM(a.ha_apoyadas), SUM(a.meta_derechohabientes), SUM(a.meta_superficie_ha)
-                FROM {tbl_avance} a JOIN {tbl_red} rd ON a.id_ceda_agricultura = rd.id_ceda_agricultura {where}
-            """
-
-        with connection.cursor() as cursor:
-            cursor.execute(sql, params)
-            meta, abasto, entregado, dh_apoyados, ha_apoyadas, meta_dh, meta_ha = cursor.fetchone()
-    
+        meta, abasto, entregado, dh_apoyados, ha_apoyadas, meta_dh, meta_ha = consultar_kpi(
+            anio, filtros["unidad"], filtros["estado"], filtros["ceda"], tipo_meta,
+        )
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
@@ -341,85 +277,90 @@ def api_kpi_avance_nacional_2026(request):
     return api_kpi_avance_nacional(request)
 
 @login_required
+@respuesta_condicional
 def api_filtros_kpi(request):
     anio = get_anio_context(request)
-    tbl_red = f"red_distribucion_{anio}" if anio == "2026" else "red_distribucion"
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(f"SELECT DISTINCT coordinacion_estatal FROM {tbl_red} ORDER BY 1")
-            unidades = [r[0] for r in cursor.fetchall() if r[0]]
-            cursor.execute(f"SELECT DISTINCT estado FROM {tbl_red} ORDER BY 1")
-            estados = [r[0] for r in cursor.fetchall() if r[0]]
-    except Exception: units, estados = [], []
-    return JsonResponse({"unidades": unidades, "estados": estados})
+    tbl_red = tabla_para_anio(anio, "red_distribucion")
+    ops = opciones_filtro(conexion_para_anio(anio), anio, tbl_red, ["coordinacion_estatal", "estado"])
+    return JsonResponse({"unidades": ops["coordinacion_estatal"], "estados": ops["estado"]})
+
+@login_required
+async def api_eventos_version(request):
+    """
+    Flujo SSE con la versión de datos del año activo (ver eventos.py): los
+    tableros vuelven a pedir KPIs sólo cuando termina una carga nueva.
+    """
+    anio = await request.session.aget("anio_activo", "2025")
+    ultima = request.headers.get("Last-Event-ID")
+    # Con WSGI (runserver) un generador async se consumiría completo antes de enviar nada
+    flujo = flujo_version if isinstance(request, ASGIRequest) else flujo_version_wsgi
+    resp = StreamingHttpResponse(flujo(anio, ultima), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    # Sin búfer en nginx: cada evento sale en cuanto se genera
+    resp["X-Accel-Buffering"] = "no"
+    return resp
 
 @login_required
 def resumen_estatal(request):
     return render(request, "fertilizantes/visualizacion/resumen_estatal.html")
 
 @login_required
+@respuesta_condicional
 def api_tabla_resumen_por_estado(request):
-    return JsonResponse({"resultados": []})
+    """
+    Tabla abasto / entregado / DH / ha contra meta por estado. Sale del cubo
+    de KPIs (una consulta agrupada por carga de datos), así que cambiar los
+    filtros no vuelve a consultar la BD.
+    """
+    anio = get_anio_context(request)
+    try:
+        filas = resumen_por_estado(
+            anio,
+            unidad=request.GET.get("unidad_operativa"),
+            estado=request.GET.get("estado"),
+            tipo_meta=request.GET.get("tipo_meta", "operativa"),
+        )
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    def pct(a, m): return round(a * 100 / m, 2) if m else 0
+
+    resultados = [{
+        "estado": estado,
+        "meta_total_ton": meta, "abasto": abasto, "entregado": entregado,
+        "dh_apoyados": dh, "ha_apoyadas": ha, "meta_dh": meta_dh, "meta_ha": meta_ha,
+        "pct_abasto": pct(abasto, meta), "pct_entregado": pct(entregado, meta),
+        "pct_dh": pct(dh, meta_dh), "pct_ha": pct(ha, meta_ha),
+    } for estado, meta, abasto, entregado, dh, ha, meta_dh, meta_ha in filas]
+    return JsonResponse({"resultados": resultados})
 
 # ==========================================
 # 🗂️ VISTAS DETALLADAS
 # ==========================================
 
-@login_required
-def vista_fletes_transito(request):
-    # 1. Obtener configuración dinámica
-    tabla, conn, es_django = get_table_and_conn(request, "fletes_en_transito_resumen_estado")
-    
-    datos = []
-    totales = {
-        'fletes_transito_dap': 0, 'fletes_transito_urea': 0, 'total_fletes_transito': 0,
-        'ton_transito_dap': 0, 'ton_transito_urea': 0, 'total_ton_transito': 0,
-        'max_dias_en_transito': 0
-    }
-
-    try:
-        # 2. Ejecutar consulta
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT * FROM {tabla} ORDER BY max_dias_en_transito DESC")
-            
-            # Normalizar obtención de columnas (Django vs Psycopg2 raw)
-            if es_django:
-                columnas = [col[0] for col in cursor.description]
-            else:
-                # Psycopg2 nativo devuelve objetos Column, pero el índice 0 suele ser el nombre también.
-                # Por seguridad usamos .name si existe, si no index 0
-                columnas = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-            
-            datos = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
-    
-    except Exception as e:
-        print(f"Error en vista_fletes_transito: {e}")
-        # Opcional: Agregar un mensaje flash al usuario
-    
-    finally:
-        # 3. IMPORTANTE: Cerrar conexión si es la manual (2026) para no saturar el pool
-        if not es_django and conn:
-            conn.close()
-    
-    # 4. Calcular totales (Lógica Python se mantiene igual)
-    if datos:
-        totales = {
-            'fletes_transito_dap': sum((d.get('fletes_transito_dap') or 0) for d in datos),
-            'fletes_transito_urea': sum((d.get('fletes_transito_urea') or 0) for d in datos),
-            'total_fletes_transito': sum((d.get('total_fletes_transito') or 0) for d in datos),
-            'ton_transito_dap': sum((d.get('ton_transito_dap') or 0) for d in datos),
-            'ton_transito_urea': sum((d.get('ton_transito_urea') or 0) for d in datos),
-            'total_ton_transito': sum((d.get('total_ton_transito') or 0) for d in datos),
-            'max_dias_en_transito': max(((d.get('max_dias_en_transito') or 0) for d in datos), default=0),
-        }
-
-    return render(request, 'fertilizantes/vista_fletes_transito.html', {'datos': datos, 'totales': totales})
+vista_fletes_transito = vista_tabla(VistaTabla(
+    "fletes_en_transito_resumen_estado", "fertilizantes/vista_fletes_transito.html",
+    columnas=["estado", "fletes_transito_dap", "fletes_transito_urea", "total_fletes_transito",
+              "ton_transito_dap", "ton_transito_urea", "total_ton_transito", "max_dias_en_transito"],
+    orden="ORDER BY max_dias_en_transito DESC",
+    totales={
+        'fletes_transito_dap': "SUM(fletes_transito_dap)",
+        'fletes_transito_urea': "SUM(fletes_transito_urea)",
+        'total_fletes_transito': "SUM(total_fletes_transito)",
+        'ton_transito_dap': "SUM(ton_transito_dap)",
+        'ton_transito_urea': "SUM(ton_transito_urea)",
+        'total_ton_transito': "SUM(total_ton_transito)",
+        'max_dias_en_transito': "MAX(max_dias_en_transito)",
+    },
+), "vista_fletes_transito")
 
 
 @login_required
-def vista_fletes_transito_por_CEDA(request):
+@respuesta_condicional
+async def vista_fletes_transito_por_CEDA(request):
     # 1. Configuración dinámica (BD y Tabla)
-    tabla, conn, es_django = get_table_and_conn(request, "fletes_en_transito_resumen")
+    anio = await request.session.aget("anio_activo", "2025")
+    tabla = tabla_para_anio(anio, "fletes_en_transito_resumen")
 
     # 2. Obtener parámetros GET
     u = request.GET.get('unidad_operativa')
@@ -435,69 +376,35 @@ def vista_fletes_transito_por_CEDA(request):
 
     datos = []
     unidades, estados, zonas = [], [], []
+    t = {'fletes_dap': 0, 'fletes_urea': 0, 'ton_dap': 0, 'ton_urea': 0, 'max_dias': 0}
 
     try:
-        with conn.cursor() as cursor:
-            # A) Consulta Principal de Datos
-            cursor.execute(f"SELECT * FROM {tabla} {where} ORDER BY max_dias_en_transito DESC", params)
-            
-            # Normalización de columnas
-            if es_django:
-                cols = [col[0] for col in cursor.description]
-            else:
-                cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-            
-            datos = [dict(zip(cols, f)) for f in cursor.fetchall()]
-            
-            # B) Consultas para llenar los Filtros
-            cursor.execute(f"SELECT DISTINCT unidad_operativa FROM {tabla} ORDER BY 1")
-            unidades = [r[0] for r in cursor.fetchall() if r[0]]
-
-            cursor.execute(f"SELECT DISTINCT estado FROM {tabla} ORDER BY 1")
-            estados = [r[0] for r in cursor.fetchall() if r[0]]
-
-            cursor.execute(f"SELECT DISTINCT zona_operativa FROM {tabla} ORDER BY 1")
-            zonas = [r[0] for r in cursor.fetchall() if r[0]]
+        # A) Consulta principal y B) opciones de los filtros, en paralelo
+        #    (cada una con su conexión del pool; el catálogo sale de caché si existe)
+        #    Los totales del pie salen de la misma consulta (ver agregados.py)
+        (datos, t), ops = await asyncio.gather(
+            consultar_con_totales_async(anio, tabla, {
+                'fletes_dap': "SUM(fletes_transito_dap)",
+                'fletes_urea': "SUM(fletes_transito_urea)",
+                'ton_dap': "SUM(ton_transito_dap)",
+                'ton_urea': "SUM(ton_transito_urea)",
+                'max_dias': "MAX(max_dias_en_transito)",
+            }, where, params, orden="ORDER BY max_dias_en_transito DESC"),
+            opciones_filtro_async(anio, tabla, ["unidad_operativa", "estado", "zona_operativa"]),
+        )
+        unidades, estados, zonas = ops["unidad_operativa"], ops["estado"], ops["zona_operativa"]
 
     except Exception as err:
         print(f"Error en vista_fletes_transito_por_CEDA: {err}")
 
-    finally:
-        if not es_django and conn:
-            conn.close()
-
-    # 4. Calcular Totales (CORREGIDO)
+    # 4. Totales combinados
     # Las claves del diccionario deben coincidir EXACTAMENTE con lo que pide el HTML:
     # {{ totales.total_fletes_transito }}, {{ totales.fletes_dap }}, etc.
-    t = {
-        'fletes_dap': 0, 
-        'fletes_urea': 0, 
-        'total_fletes_transito': 0, # <--- CORRECCIÓN DE NOMBRE DE CLAVE
-        'ton_dap': 0, 
-        'ton_urea': 0, 
-        'ton_total': 0, 
-        'max_dias': 0
-    }
-    
-    if datos:
-        # Sumas parciales
-        t['fletes_dap'] = sum((d.get('fletes_transito_dap') or 0) for d in datos)
-        t['fletes_urea'] = sum((d.get('fletes_transito_urea') or 0) for d in datos)
-        
-        # CORRECCIÓN LÓGICA: El total es la suma de los parciales (más seguro)
-        t['total_fletes_transito'] = t['fletes_dap'] + t['fletes_urea']
-        
-        # Sumas de toneladas
-        sum_dap = sum((d.get('ton_transito_dap') or 0) for d in datos)
-        sum_urea = sum((d.get('ton_transito_urea') or 0) for d in datos)
-        
-        t['ton_dap'] = sum_dap
-        t['ton_urea'] = sum_urea
-        t['ton_total'] = sum_dap + sum_urea
-        
-        t['max_dias'] = max(((d.get('max_dias_en_transito') or 0) for d in datos), default=0)
+    # El total es la suma de los parciales (más seguro)
+    t['total_fletes_transito'] = t['fletes_dap'] + t['fletes_urea']
+    t['ton_total'] = t['ton_dap'] + t['ton_urea']
 
-    return render(request, 'fertilizantes/vista_fletes_transito_por_CEDA.html', {
+    return await sync_to_async(render)(request, 'fertilizantes/vista_fletes_transito_por_CEDA.html', {
         'datos': datos, 
         'unidades': unidades, 
         'estados': estados, 
@@ -510,75 +417,24 @@ def vista_fletes_transito_por_CEDA(request):
 
 
 
-@login_required
-def vista_fletes_autorizados_en_transito(request):
-    # 1. Configuración dinámica
-    tabla, conn, es_django = get_table_and_conn(request, "fletes_en_transito_detalle")
-
-    # 2. Parámetros GET
-    u = request.GET.get('unidad_operativa')
-    e = request.GET.get('estado')
-    z = request.GET.get('zona_operativa')
-
-    # 3. Construir WHERE
-    cond, params = [], []
-    if u: cond.append("unidad_operativa = %s"); params.append(u)
-    if e: cond.append("estado = %s"); params.append(e)
-    if z: cond.append("zona_operativa = %s"); params.append(z)
-    where = f"WHERE {' AND '.join(cond)}" if cond else ""
-
-    datos = []
-    unidades, estados, zonas = [], [], []
-
-    try:
-        with conn.cursor() as cursor:
-            # A) Consulta Principal
-            cursor.execute(f"SELECT * FROM {tabla} {where} ORDER BY dias_en_transito DESC", params)
-            
-            # Normalización de columnas
-            if es_django:
-                cols = [col[0] for col in cursor.description]
-            else:
-                cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-            
-            datos = [dict(zip(cols, f)) for f in cursor.fetchall()]
-            
-            # B) Filtros Dinámicos (usando la misma conexión y tabla)
-            cursor.execute(f"SELECT DISTINCT unidad_operativa FROM {tabla} ORDER BY 1")
-            unidades = [r[0] for r in cursor.fetchall() if r[0]]
-
-            cursor.execute(f"SELECT DISTINCT estado FROM {tabla} ORDER BY 1")
-            estados = [r[0] for r in cursor.fetchall() if r[0]]
-
-            cursor.execute(f"SELECT DISTINCT zona_operativa FROM {tabla} ORDER BY 1")
-            zonas = [r[0] for r in cursor.fetchall() if r[0]]
-
-    except Exception as err:
-        print(f"Error en vista_fletes_autorizados_en_transito: {err}")
-
-    finally:
-        if not es_django and conn:
-            conn.close()
-
-    # 4. Totales (usando .get() para seguridad)
-    total_toneladas = sum((f.get('toneladas_iniciales') or 0) for f in datos)
-    max_dias = max(((f.get('dias_en_transito') or 0) for f in datos), default=0)
-
-    return render(request, 'fertilizantes/vista_fletes_autorizados_en_transito.html', {
-        'datos': datos, 
-        'total_fletes': len(datos), 
-        'total_toneladas': total_toneladas,
-        'max_dias': max_dias,
-        'unidades': unidades, 
-        'estados': estados, 
-        'zonas': zonas,
-        'unidad_seleccionada': u, 
-        'estado_seleccionado': e, 
-        'zona_seleccionada': z
-    })
+vista_fletes_autorizados_en_transito = vista_tabla(VistaTabla(
+    "fletes_en_transito_detalle", "fertilizantes/vista_fletes_autorizados_en_transito.html",
+    columnas=["folio_del_flete", "unidad_operativa", "estado", "zona_operativa", "id_ceda_agricultura",
+              "nombre_cedas", "producto", "toneladas_iniciales", "fecha_de_salida", "dias_en_transito"],
+    orden="ORDER BY dias_en_transito DESC",
+    filtros=["unidad_operativa", "estado", "zona_operativa"],
+    opciones={"unidades": "unidad_operativa", "estados": "estado", "zonas": "zona_operativa"},
+    totales={
+        'total_fletes': "COUNT(*)",
+        'total_toneladas': "SUM(toneladas_iniciales)",
+        'max_dias': "MAX(dias_en_transito)",
+    },
+    totales_en=None,
+), "vista_fletes_autorizados_en_transito")
 
 
 @login_required
+@respuesta_condicional
 def vista_inventario_diario_ceda(request):
     # anio = get_anio_context(request)  <-- Ya no necesitamos el año para el nombre de la tabla
     ceda = request.GET.get('ceda', '').strip()
@@ -588,7 +444,7 @@ def vista_inventario_diario_ceda(request):
     # El helper 'get_table_and_conn' se encarga de cambiarlo a la versión 2026 si es necesario.
     nombre_tabla_base = "inventario_acumulado_x_ceda_diario_2025"
     
-    tabla, conn, es_django = get_table_and_conn(request, nombre_tabla_base)
+    tabla, conn = get_table_and_conn(request, nombre_tabla_base)
 
     datos = []
     resumen = None
@@ -622,20 +478,11 @@ def vista_inventario_diario_ceda(request):
                     ORDER BY fecha DESC
                 """
                 cursor.execute(query, params)
-
-                if es_django:
-                    cols = [col[0] for col in cursor.description]
-                else:
-                    cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-                
+                cols = [col[0] for col in cursor.description]
                 datos = [dict(zip(cols, f)) for f in cursor.fetchall()]
 
         except Exception as e:
             print(f"Error en vista_inventario_diario_ceda: {e}")
-        
-        finally:
-            if not es_django and conn:
-                conn.close()
 
         if datos:
             ultimo = datos[0]
@@ -680,7 +527,7 @@ def ajax_filtros_generales(request):
     
     # 1. Determinar tabla y conexión correctas
     # Si la tabla viene sin año explícito, el helper decidirá si agregar _2026
-    tabla_real, conn, es_django = get_table_and_conn(request, tabla_param)
+    tabla_real, conn = get_table_and_conn(request, tabla_param)
     
     # Mapeo de columnas de unidad operativa (algunas tablas usan 'coordinacion_estatal')
     # Esto es crítico porque el nombre de la columna varía según la vista
@@ -707,185 +554,79 @@ def ajax_filtros_generales(request):
     except Exception as e:
         print(f"Error AJAX filtros ({tabla_real}): {e}")
         # En caso de error (ej. tabla no existe), devolvemos listas vacías para no romper el frontend
-        
-    finally:
-        if not es_django and conn:
-            conn.close()
-            
-    return JsonResponse(resp)
 
+    return JsonResponse(resp)
 
 
-@login_required
-def vista_inventarios_negativos_x_dia(request):
-    tabla, conn, es_django = get_table_and_conn(request, "inventarios_negativos_x_ceda_diario_2025")
-    
-    u, e = request.GET.get('unidad_operativa'), request.GET.get('estado')
-    cond, params = [], []
-    if u: cond.append("coordinacion_estatal = %s"); params.append(u)
-    if e: cond.append("estado = %s"); params.append(e)
-    where = (" AND " + " AND ".join(cond)) if cond else ""
-
-    datos = []
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(f"""
-                SELECT fecha, coordinacion_estatal AS unidad_operativa, estado, zona_operativa, 
-                       id_ceda_agricultura, nombre_cedas, dap_ton_total_entrada, urea_ton_total_entrada,
-                       dap_ton_total_salida, urea_ton_total_salida, 
-                       dap_ton_inventario_acumulado AS dap_inventario, 
-                       urea_ton_inventario_acumulado AS urea_inventario
-                FROM {tabla} WHERE fecha <= CURRENT_DATE {where}
-                ORDER BY unidad_operativa, estado, nombre_cedas, fecha DESC
-            """, params)
-            if es_django: cols = [col[0] for col in cursor.description]
-            else: cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-            datos = [dict(zip(cols, f)) for f in cursor.fetchall()]
-    except Exception: pass
-    finally:
-        if not es_django and conn: conn.close()
-
-    unidades = sorted(list(set(d['unidad_operativa'] for d in datos))) if datos else []
-    estados = sorted(list(set(d['estado'] for d in datos))) if datos else []
-    
-    return render(request, 'fertilizantes/vista_inventarios_negativos_x_dia.html', {
-        'datos': datos, 'unidades': unidades, 'estados': estados, 'unidad_seleccionada': u, 'estado_seleccionado': e
-    })
 
+vista_inventarios_negativos_x_dia = vista_tabla(VistaTabla(
+    "inventarios_negativos_x_ceda_diario_2025", "fertilizantes/vista_inventarios_negativos_x_dia.html",
+    columnas=["fecha", "coordinacion_estatal AS unidad_operativa", "estado", "zona_operativa",
+              "id_ceda_agricultura", "nombre_cedas", "dap_ton_total_entrada", "urea_ton_total_entrada",
+              "dap_ton_total_salida", "urea_ton_total_salida",
+              "dap_ton_inventario_acumulado AS dap_inventario",
+              "urea_ton_inventario_acumulado AS urea_inventario"],
+    condicion="fecha <= CURRENT_DATE",
+    orden="ORDER BY unidad_operativa, estado, nombre_cedas, fecha DESC",
+    filtros=[Filtro("unidad_operativa", "coordinacion_estatal"), "estado"],
+    opciones={"unidades": "coordinacion_estatal", "estados": "estado"},
+), "vista_inventarios_negativos_x_dia")
 
-@login_required
-def vista_inventarios_negativos_actuales(request):
-    tabla, conn, es_django = get_table_and_conn(request, "inventarios_negativos_2025")
-    
-    u = request.GET.get('unidad_operativa')
-    e = request.GET.get('estado')
-    z = request.GET.get('zona_operativa')
-    
-    cond, params = [], []
-    if u: cond.append("unidad_operativa = %s"); params.append(u)
-    if e: cond.append("estado = %s"); params.append(e)
-    if z: cond.append("zona_operativa = %s"); params.append(z)
-    where = f"WHERE {' AND '.join(cond)}" if cond else ""
 
-    datos, unidades, estados, zonas = [], [], [], []
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT * FROM {tabla} {where} ORDER BY unidad_operativa, estado", params)
-            if es_django: cols = [col[0] for col in cursor.description]
-            else: cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-            datos = [dict(zip(cols, f)) for f in cursor.fetchall()]
-            
-            cursor.execute(f"SELECT DISTINCT unidad_operativa FROM {tabla} ORDER BY 1")
-            unidades = [r[0] for r in cursor.fetchall() if r[0]]
-            cursor.execute(f"SELECT DISTINCT estado FROM {tabla} ORDER BY 1")
-            estados = [r[0] for r in cursor.fetchall() if r[0]]
-            cursor.execute(f"SELECT DISTINCT zona_operativa FROM {tabla} ORDER BY 1")
-            zonas = [r[0] for r in cursor.fetchall() if r[0]]
-    except Exception: pass
-    finally:
-        if not es_django and conn: conn.close()
+vista_inventarios_negativos_actuales = vista_tabla(VistaTabla(
+    "inventarios_negativos_2025", "fertilizantes/vista_inventarios_negativos_actuales.html",
+    columnas=["unidad_operativa", "estado", "zona_operativa", "id_ceda_agricultura", "nombre_cedas",
+              "dap_inventario", "urea_inventario"],
+    orden="ORDER BY unidad_operativa, estado",
+    filtros=["unidad_operativa", "estado", "zona_operativa"],
+    opciones={"unidades": "unidad_operativa", "estados": "estado", "zonas": "zona_operativa"},
+), "vista_inventarios_negativos_actuales")
 
-    return render(request, 'fertilizantes/vista_inventarios_negativos_actuales.html', {
-        'datos': datos, 'unidades': unidades, 'estados': estados, 'zonas': zonas,
-        'unidad_seleccionada': u, 'estado_seleccionado': e, 'zona_seleccionada': z
-    })
 
 
+vista_resumen_remanente_estado = vista_tabla(VistaTabla(
+    "resumen_remanente_estado_2025", "fertilizantes/vista_resumen_remanente_estado.html",
+    columnas=["unidad_operativa", "estado",
+              "dap_remanente_entrada", "dap_remanente_salida", "dap_remanente_inventario",
+              "urea_remanente_entrada", "urea_remanente_salida", "urea_remanente_inventario"],
+), "vista_resumen_remanente_estado")
 
-@login_required
-def vista_resumen_remanente_estado(request):
-    tabla, conn, es_django = get_table_and_conn(request, "resumen_remanente_estado_2025")
-    datos = []
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT * FROM {tabla}")
-            if es_django: cols = [col[0] for col in cursor.description]
-            else: cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-            datos = [dict(zip(cols, f)) for f in cursor.fetchall()]
-    except Exception: pass
-    finally:
-        if not es_django and conn: conn.close()
-    return render(request, 'fertilizantes/vista_resumen_remanente_estado.html', {'datos': datos})
 
+COLUMNAS_CEDAS_REMANENTES = ["coordinacion_estatal", "estado", "zona_operativa", "id_ceda_agricultura",
+                             "nombre_cedas", "dap_ton_remanente_inventario", "urea_ton_remanente_inventario"]
 
-@login_required
-def vista_cedas_con_remanentes(request):
-    tabla, conn, es_django = get_table_and_conn(request, "cedas_con_remanentes_2025")
-    
-    u = request.GET.get('unidad_operativa')
-    e = request.GET.get('estado')
-    cond, params = [], []
-    if u: cond.append("coordinacion_estatal = %s"); params.append(u)
-    if e: cond.append("estado = %s"); params.append(e)
-    where = f"WHERE {' AND '.join(cond)}" if cond else ""
+vista_cedas_con_remanentes = vista_tabla(VistaTabla(
+    "cedas_con_remanentes_2025", "fertilizantes/vista_cedas_con_remanentes.html",
+    columnas=COLUMNAS_CEDAS_REMANENTES,
+    orden="ORDER BY coordinacion_estatal, estado",
+    filtros=[Filtro("unidad_operativa", "coordinacion_estatal"), "estado"],
+    opciones={"unidades": "coordinacion_estatal", "estados": "estado", "zonas": "zona_operativa"},
+    totales={
+        'total_cedas': "COUNT(*)",
+        'total_ton': "SUM(COALESCE(dap_ton_remanente_inventario, 0) + COALESCE(urea_ton_remanente_inventario, 0))",
+    },
+    totales_en="resumen",
+), "vista_cedas_con_remanentes")
 
-    datos, unidades, estados, zonas = [], [], [], []
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT * FROM {tabla} {where} ORDER BY coordinacion_estatal, estado", params)
-            if es_django: cols = [col[0] for col in cursor.description]
-            else: cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-            datos = [dict(zip(cols, f)) for f in cursor.fetchall()]
-            
-            cursor.execute(f"SELECT DISTINCT coordinacion_estatal FROM {tabla} ORDER BY 1")
-            unidades = [r[0] for r in cursor.fetchall() if r[0]]
-            cursor.execute(f"SELECT DISTINCT estado FROM {tabla} ORDER BY 1")
-            estados = [r[0] for r in cursor.fetchall() if r[0]]
-            cursor.execute(f"SELECT DISTINCT zona_operativa FROM {tabla} ORDER BY 1")
-            zonas = [r[0] for r in cursor.fetchall() if r[0]]
-    except Exception: pass
-    finally:
-        if not es_django and conn: conn.close()
-
-    total_ton = sum((d.get('dap_ton_remanente_inventario') or 0) + (d.get('urea_ton_remanente_inventario') or 0) for d in datos)
-    return render(request, 'fertilizantes/vista_cedas_con_remanentes.html', {
-        'datos': datos, 'unidades': unidades, 'estados': estados, 'zonas': zonas,
-        'resumen': {'total_cedas': len(datos), 'total_ton': total_ton},
-        'unidad_seleccionada': u, 'estado_seleccionado': e
-    })
 
-
-@login_required
-def vista_cedas_con_remanentes_negativos(request):
-    tabla, conn, es_django = get_table_and_conn(request, "cedas_con_remanentes_negativos_2025")
-    
-    u = request.GET.get('unidad_operativa')
-    e = request.GET.get('estado')
-    cond, params = [], []
-    if u: cond.append("coordinacion_estatal = %s"); params.append(u)
-    if e: cond.append("estado = %s"); params.append(e)
-    where = f"WHERE {' AND '.join(cond)}" if cond else ""
-
-    datos, unidades, estados, zonas = [], [], [], []
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT * FROM {tabla} {where} ORDER BY coordinacion_estatal", params)
-            if es_django: cols = [col[0] for col in cursor.description]
-            else: cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-            datos = [dict(zip(cols, f)) for f in cursor.fetchall()]
-            
-            cursor.execute(f"SELECT DISTINCT coordinacion_estatal FROM {tabla} ORDER BY 1")
-            unidades = [r[0] for r in cursor.fetchall() if r[0]]
-            cursor.execute(f"SELECT DISTINCT estado FROM {tabla} ORDER BY 1")
-            estados = [r[0] for r in cursor.fetchall() if r[0]]
-            cursor.execute(f"SELECT DISTINCT zona_operativa FROM {tabla} ORDER BY 1")
-            zonas = [r[0] for r in cursor.fetchall() if r[0]]
-    except Exception: pass
-    finally:
-        if not es_django and conn: conn.close()
-
-    return render(request, 'fertilizantes/vista_cedas_con_remanentes_negativos.html', {
-        'datos': datos, 'unidades': unidades, 'estados': estados, 'zonas': zonas, 'unidad_seleccionada': u, 'estado_seleccionado': e
-    })
+vista_cedas_con_remanentes_negativos = vista_tabla(VistaTabla(
+    "cedas_con_remanentes_negativos_2025", "fertilizantes/vista_cedas_con_remanentes_negativos.html",
+    columnas=COLUMNAS_CEDAS_REMANENTES,
+    orden="ORDER BY coordinacion_estatal",
+    filtros=[Filtro("unidad_operativa", "coordinacion_estatal"), "estado"],
+    opciones={"unidades": "coordinacion_estatal", "estados": "estado", "zonas": "zona_operativa"},
+), "vista_cedas_con_remanentes_negativos")
 
 
 # 🔥 VISTAS RESTAURADAS QUE FALTABAN 🔥
 
 
 @login_required
-def vista_fletes_ton_conteo_detalle(request):
+@respuesta_condicional
+async def vista_fletes_ton_conteo_detalle(request):
     # Pasamos el nombre 2025, el helper lo mapeará a ..._2026_td
-    tabla, conn, es_django = get_table_and_conn(request, "fletes_ton_conteo_detalle_td")
+    anio = await request.session.aget("anio_activo", "2025")
+    tabla = tabla_para_anio(anio, "fletes_ton_conteo_detalle_td")
     
     u = request.GET.get('unidad_operativa')
     e = request.GET.get('estado')
@@ -901,117 +642,59 @@ def vista_fletes_ton_conteo_detalle(request):
     unidades, estados, procedencias = [], [], []
 
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT * FROM {tabla} {where} ORDER BY toneladas_iniciales DESC", params)
-            if es_django: cols = [col[0] for col in cursor.description]
-            else: cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-            datos = [dict(zip(cols, f)) for f in cursor.fetchall()]
-            
-            # Filtros
-            cursor.execute(f"SELECT DISTINCT unidad_operativa FROM {tabla} ORDER BY 1")
-            unidades = [r[0] for r in cursor.fetchall() if r[0]]
-            cursor.execute(f"SELECT DISTINCT estado FROM {tabla} ORDER BY 1")
-            estados = [r[0] for r in cursor.fetchall() if r[0]]
-            cursor.execute(f"SELECT DISTINCT estado_procedencia FROM {tabla} ORDER BY 1")
-            procedencias = [r[0] for r in cursor.fetchall() if r[0]]
+        # Datos y filtros en paralelo
+        datos, ops = await asyncio.gather(
+            consultar_async(anio, f"SELECT * FROM {tabla} {where} ORDER BY toneladas_iniciales DESC", params),
+            opciones_filtro_async(anio, tabla, ["unidad_operativa", "estado", "estado_procedencia"]),
+        )
+        unidades, estados, procedencias = ops["unidad_operativa"], ops["estado"], ops["estado_procedencia"]
     except Exception as err: print(f"Error: {err}")
-    finally:
-        if not es_django and conn: conn.close()
 
-    return render(request, "fertilizantes/vista_fletes_ton_conteo_detalle.html", {
+    return await sync_to_async(render)(request, "fertilizantes/vista_fletes_ton_conteo_detalle.html", {
         "datos": datos, "unidades": unidades, "estados": estados, "procedencias": procedencias,
         "unidad_seleccionada": u, "estado_seleccionado": e, "procedencia_seleccionada": p
     })
 
 
-@login_required
-def vista_fletes_toneladas_recibidas_atipicas(request):
-    tabla, conn, es_django = get_table_and_conn(request, "fletes_toneladas_recibidas_atipicas_2025")
-    datos = []
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT * FROM {tabla} ORDER BY diferencia_ton DESC")
-            if es_django: cols = [col[0] for col in cursor.description]
-            else: cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-            datos = [dict(zip(cols, f)) for f in cursor.fetchall()]
-    except Exception: pass
-    finally:
-        if not es_django and conn: conn.close()
-    return render(request, "fertilizantes/vista_fletes_toneladas_recibidas_atipicas.html", {"datos": datos})
-
-
-@login_required
-def vista_fletes_fechas_incoherentes(request):
-    tabla, conn, es_django = get_table_and_conn(request, "fletes_fechas_incoherentes_2025")
-    datos = []
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT * FROM {tabla} ORDER BY fecha_de_salida DESC")
-            if es_django: cols = [col[0] for col in cursor.description]
-            else: cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-            datos = [dict(zip(cols, f)) for f in cursor.fetchall()]
-    except Exception: pass
-    finally:
-        if not es_django and conn: conn.close()
-    return render(request, "fertilizantes/vista_fletes_fechas_incoherentes.html", {"datos": datos})
+vista_fletes_toneladas_recibidas_atipicas = vista_tabla(VistaTabla(
+    "fletes_toneladas_recibidas_atipicas_2025", "fertilizantes/vista_fletes_toneladas_recibidas_atipicas.html",
+    columnas=["folio_del_flete", "unidad_operativa", "coordinacion_estatal", "estado", "zona_operativa",
+              "id_ceda_agricultura", "nombre_cedas", "destino_final", "abreviacion_producto", "descripcion",
+              "fecha_de_salida", "fecha_de_entrega", "toneladas_iniciales", "toneladas_en_el_destino",
+              "diferencia_ton", "estatus_de_recepcion_incidente"],
+    orden="ORDER BY diferencia_ton DESC",
+), "vista_fletes_toneladas_recibidas_atipicas")
 
 
+vista_fletes_fechas_incoherentes = vista_tabla(VistaTabla(
+    "fletes_fechas_incoherentes_2025", "fertilizantes/vista_fletes_fechas_incoherentes.html",
+    columnas=["folio_del_flete", "unidad_operativa", "coordinacion_estatal", "estado", "zona_operativa",
+              "id_ceda_agricultura", "nombre_cedas", "abreviacion_producto",
+              "fecha_de_salida", "fecha_de_llegada", "fecha_de_entrega", "toneladas_en_el_destino"],
+    orden="ORDER BY fecha_de_salida DESC",
+), "vista_fletes_fechas_incoherentes")
 
-@login_required
-def vista_pedidos_detalle_fecha(request):
-    tabla, conn, es_django = get_table_and_conn(request, "pedidos_detalle_por_fecha_2025")
-    
-    u = request.GET.get('unidad_operativa')
-    e = request.GET.get('estado')
-    fi = request.GET.get('fecha_inicio')
-    ff = request.GET.get('fecha_fin')
-    
-    cond, params = [], []
-    if u: cond.append("unidad_operativa = %s"); params.append(u)
-    if e: cond.append("estado = %s"); params.append(e)
-    if fi: cond.append("fecha >= %s"); params.append(fi)
-    if ff: cond.append("fecha <= %s"); params.append(ff)
-    
-    where = f"WHERE {' AND '.join(cond)}" if cond else ""
-    datos, resumen = [], {"total": 0, "dap": 0, "urea": 0}
-    unidades, estados, zonas = [], [], []
 
-    try:
-        with conn.cursor() as cursor:
-            # Filtros (siempre se cargan)
-            cursor.execute(f"SELECT DISTINCT unidad_operativa FROM {tabla} ORDER BY 1")
-            unidades = [r[0] for r in cursor.fetchall() if r[0]]
-            cursor.execute(f"SELECT DISTINCT estado FROM {tabla} ORDER BY 1")
-            estados = [r[0] for r in cursor.fetchall() if r[0]]
-            cursor.execute(f"SELECT DISTINCT zona_operativa FROM {tabla} ORDER BY 1")
-            zonas = [r[0] for r in cursor.fetchall() if r[0]]
-
-            # Datos (solo si hay filtros)
-            if cond:
-                cursor.execute(f"SELECT * FROM {tabla} {where} ORDER BY fecha DESC", params)
-                if es_django: cols = [col[0] for col in cursor.description]
-                else: cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
-                datos = [dict(zip(cols, f)) for f in cursor.fetchall()]
-                
-                if datos:
-                    resumen = {
-                        "total": len(datos), 
-                        "dap": sum((d.get('dap') or 0) for d in datos), 
-                        "urea": sum((d.get('urea') or 0) for d in datos)
-                    }
-    except Exception as err: print(f"Error: {err}")
-    finally:
-        if not es_django and conn: conn.close()
 
-    return render(request, "fertilizantes/pedidos_detalle_por_fecha.html", {
-        "datos": datos, "resumen": resumen, "unidades": unidades, "estados": estados, "zonas": zonas,
-        "unidad_seleccionada": u, "estado_seleccionado": e, "fecha_inicio": fi, "fecha_fin": ff
-    })
+vista_pedidos_detalle_fecha = vista_tabla(VistaTabla(
+    "pedidos_detalle_por_fecha_2025", "fertilizantes/pedidos_detalle_por_fecha.html",
+    columnas=["fecha", "unidad_operativa", "estado", "zona_operativa", "id_ceda_agricultura",
+              "nombre_cedas", "dap", "urea"],
+    orden="ORDER BY fecha DESC",
+    filtros=["unidad_operativa", "estado",
+             Filtro("fecha_inicio", "fecha", ">="), Filtro("fecha_fin", "fecha", "<=")],
+    opciones={"unidades": "unidad_operativa", "estados": "estado", "zonas": "zona_operativa"},
+    # Sin filtros sólo se cargan los combos (la tabla completa es muy grande)
+    totales={"total": "COUNT(*)", "dap": "SUM(dap)", "urea": "SUM(urea)"},
+    totales_en="resumen",
+    requiere_filtro=True,
+), "vista_pedidos_detalle_fecha")
 
 
 
 # 🔥 AQUÍ ESTÁ LA VISTA QUE CAUSABA EL ERROR (RESTAURADA) 🔥
 @login_required
+@respuesta_condicional
 def vista_inventario_ceda_diario(request):
     """
     Vista comparativa Campo vs SIGAP (antes 'vista_inventario_ceda_diario_campo').
@@ -1021,9 +704,8 @@ def vista_inventario_ceda_diario(request):
     cols = ["unidad_operativa", "estado", "zona_operativa", "id_ceda_agricultura"]
     where, params, ctx = _aplicar_filtros_get(request, cols)
 
-    with connection.cursor() as cur:
-        cur.execute(f"SELECT DISTINCT unidad_operativa FROM {tbl} WHERE unidad_operativa IS NOT NULL ORDER BY 1")
-        ctx["unidades"] = [r[0] for r in cur.fetchall()]
+    conn = conexion_para_anio(anio)
+    ctx["unidades"] = opciones_filtro(conn, anio, tbl, ["unidad_operativa"])["unidad_operativa"]
 
     ctx["unidad_operativa_seleccionada"] = ctx.get("unidad_operativa_seleccionado")
 
@@ -1038,7 +720,7 @@ def vista_inventario_ceda_diario(request):
         ctx["fecha_fin"] = ayer.strftime("%Y-%m-%d")
 
     sql = f"SELECT * FROM {tbl} {where} ORDER BY fecha DESC, id_ceda_agricultura"
-    with connection.cursor() as cur:
+    with conn.cursor() as cur:
         cur.execute(sql, params)
         headers = [c[0] for c in cur.description]
         ctx["datos"] = [dict(zip(headers, row)) for row in cur.fetchall()]
@@ -1051,98 +733,110 @@ def vista_inventario_ceda_diario(request):
 
 # Asegúrate de tener este import al inicio de tu archivo views.py
 
-@login_required
-def vista_derechohabientes(request):
-    """
-    Consulta paginada en servidor (Server-side Pagination).
-    Permite navegar millones de registros en bloques de 200.
-    """
+def _filtrar_dh(datos):
+    """Queryset de derechohabientes con los filtros de `datos` (request.GET o request.POST)."""
     qs = DH.objects.all()
 
     # --- 1. Filtros Generales ---
-    uo   = request.GET.get("unidad_operativa")
-    edo  = request.GET.get("estado")
-    ceda = request.GET.get("id_ceda_agricultura")
-    
+    uo   = datos.get("unidad_operativa")
+    edo  = datos.get("estado")
+    ceda = datos.get("id_ceda_agricultura")
+
     if uo: qs = qs.filter(unidad_operativa=uo)
     if edo: qs = qs.filter(estado=edo)
     if ceda: qs = qs.filter(id_ceda_agricultura=ceda)
 
     # --- 2. Filtros de Fecha ---
-    fecha_inicio = request.GET.get("fecha_inicio")
-    fecha_fin    = request.GET.get("fecha_fin")
+    fecha_inicio = datos.get("fecha_inicio")
+    fecha_fin    = datos.get("fecha_fin")
 
     if fecha_inicio: qs = qs.filter(fecha_entrega__gte=fecha_inicio)
     if fecha_fin: qs = qs.filter(fecha_entrega__lte=fecha_fin)
 
     # --- 3. Búsquedas Específicas ---
     for campo in ("acuse_estatal", "curp_solicitud", "curp_renapo"):
-        v = request.GET.get(campo)
+        v = datos.get(campo)
         if v: qs = qs.filter(**{f"{campo}__iexact": v})
 
-    # --- 4. Búsqueda Masiva (Lista) ---
-    lista = request.GET.get("lista_acuses")
+    # --- 4. Búsqueda Masiva (Lista corta en GET; para miles usar derechohabientes_busqueda_masiva) ---
+    lista = datos.get("lista_acuses")
     if lista:
         acuses = [l.strip() for l in lista.splitlines() if l.strip()]
         qs = qs.filter(acuse_estatal__in=acuses)
 
-    # --- 5. Selección de Columnas ---
-    seleccion = request.GET.getlist("campos") or [f for f, _ in CAMPOS_DH]
+    return qs
+
+
+def _seleccion_dh(datos):
+    seleccion = datos.getlist("campos") or [f for f, _ in CAMPOS_DH]
     validos = {f for f, _ in CAMPOS_DH}
-    seleccion = [f for f in seleccion if f in validos]
+    return [f for f in seleccion if f in validos]
+
+
+@login_required
+@respuesta_condicional(anio="2025")
+def vista_derechohabientes(request):
+    """
+    Consulta paginada en servidor (Server-side Pagination).
+    Permite navegar millones de registros en bloques de 200.
+    """
+    uo  = request.GET.get("unidad_operativa")
+    edo = request.GET.get("estado")
+
+    # --- 1 a 4. Filtros ---
+    qs = _filtrar_dh(request.GET)
+
+    # --- 5. Selección de Columnas ---
+    seleccion = _seleccion_dh(request.GET)
 
     # --- MODO 1: DESCARGA CSV (Todo el resultado) ---
     # Si el usuario hace clic en "Descargar", se exporta todo sin paginar.
+    # PostgreSQL genera el CSV (COPY ... TO STDOUT) a partir del queryset filtrado;
+    # los alias de columna son las etiquetas legibles del encabezado.
     if request.GET.get("csv") == "1":
-        qs = qs.values(*seleccion) # Optimización: traer solo columnas necesarias
-        
-        def filas():
-            # Encabezados
-            yield [lbl for f, lbl in CAMPOS_DH if f in seleccion]
-            # Datos (usando iterator para no saturar RAM)
-            for fila in qs.iterator(chunk_size=10000):
-                yield [fila[c] for c in seleccion]
-
-        pseudo = io.StringIO()
-        writer = csv.writer(pseudo)
-
-        def stream():
-            first = True
-            for row in filas():
-                pseudo.seek(0)
-                pseudo.truncate(0)
-                writer.writerow(row)
-                data = pseudo.getvalue()
-                if first:
-                    data = '\ufeff' + data  # BOM para Excel
-                    first = False
-                yield data
+        sub_sql, sub_params = qs.values(*seleccion).query.sql_with_params()
+        etiquetas = dict(CAMPOS_DH)
+        select = "SELECT " + ", ".join(f"{c} AS {comillas_ident(etiquetas[c])}" for c in seleccion) + f" FROM ({sub_sql}) AS base"
 
         nombre = f"derechohabientes_{datetime.date.today():%Y%m%d}.csv"
-        resp = StreamingHttpResponse(stream(), content_type="text/csv; charset=utf-8")
-        resp["Content-Disposition"] = f'attachment; filename="{nombre}"'
-        return resp
-
-    # --- MODO 2: PANTALLA (Paginación) ---
+        return respuesta_copy_csv(2025, select, sub_params, nombre)
+
+    # --- MODO 1b: DESCARGA PARQUET / ARROW (record batches desde cursor en servidor) ---
+    formato = request.GET.get("formato")
+    if formato in FORMATOS_ARROW:
+        if not HAS_ARROW:
+            return HttpResponseBadRequest("La exportación Parquet/Arrow requiere pyarrow en el servidor.")
+        sub_sql, sub_params = qs.values(*seleccion).query.sql_with_params()
+        nombre = f"derechohabientes_{datetime.date.today():%Y%m%d}"
+        return respuesta_arrow_streaming(2025, sub_sql, sub_params, seleccion, nombre, formato)
+
+    # --- MODO 2: PANTALLA (Paginación por llave) ---
     
     # Solo buscamos si hay algún filtro aplicado para evitar cargar 2M de registros al inicio
     filtros_activos = bool(request.GET)
     
     if filtros_activos:
-        # Optimizamos query
-        qs = qs.values(*seleccion)
-        
-        # Paginador: 200 registros por página
-        paginator = Paginator(qs, 200)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        # El queryset filtrado se usa como subconsulta; cada página "salta"
+        # por índice desde (fecha_entrega, acuse_estatal) sin OFFSET.
+        llaves = ["fecha_entrega", "acuse_estatal"]
+        sub_sql, sub_params = qs.values(*dict.fromkeys(seleccion + llaves)).query.sql_with_params()
+        origen = f"({sub_sql}) AS base"
+        page_obj = paginar_keyset(
+            connection, origen, seleccion, *llaves,
+            params=sub_params, cursor=request.GET.get("cursor"), tamano=200,
+        )
+        # Total: estimado sin filtros, exacto en caché o "más de N" (ver conteos.py)
+        page_obj.asignar_conteo(contar(
+            connection, "2025", origen, params=sub_params,
+            con_filtros=bool(qs.query.where), modo=request.GET.get("conteo", "auto"),
+        ))
     else:
         # Lista vacía si no hay filtros
         page_obj = []
 
-    # Listas para los dropdowns
-    unidades = DH.objects.order_by('unidad_operativa').values_list('unidad_operativa', flat=True).distinct()
-    estados  = DH.objects.order_by('estado').values_list('estado', flat=True).distinct()
+    # Listas para los dropdowns (catálogo en caché por carga de datos)
+    ops = opciones_filtro(connection, "2025", DH._meta.db_table, ["unidad_operativa", "estado"])
+    unidades, estados = ops["unidad_operativa"], ops["estado"]
 
     return render(request, "fertilizantes/vista_derechohabientes.html", {
         "datos":         page_obj,  # Objeto paginado
@@ -1155,36 +849,88 @@ def vista_derechohabientes(request):
         "estado_seleccionada": edo,
     })
 
+@login_required
+@require_POST
+def derechohabientes_busqueda_masiva(request):
+    """
+    Búsqueda masiva por acuse o CURP (archivo o lista pegada, hasta
+    MAX_LLAVES): las llaves van a una tabla temporal vía COPY y se cruzan
+    con los derechohabientes filtrados; el resultado se descarga como CSV
+    en streaming (ver busqueda_masiva.py).
+    """
+    campo = request.POST.get("campo_masivo", "acuse_estatal")
+    if campo not in CAMPOS_LLAVE:
+        return HttpResponseBadRequest("Campo de búsqueda no válido.")
+
+    llaves = leer_llaves(campo, request.FILES.get("archivo_llaves"), request.POST.get("lista_llaves", ""))
+    if not llaves:
+        return HttpResponseBadRequest("No se recibieron llaves para buscar.")
+    if len(llaves) > MAX_LLAVES:
+        return HttpResponseBadRequest(f"Máximo {MAX_LLAVES:,} llaves por búsqueda (se recibieron {len(llaves):,}).")
+
+    # Mismos filtros y columnas que la consulta en pantalla (salvo la lista corta)
+    datos = request.POST.copy()
+    datos.pop("lista_acuses", None)
+    qs = _filtrar_dh(datos)
+    seleccion = _seleccion_dh(datos)
+
+    sub_sql, sub_params = qs.values(*dict.fromkeys(seleccion + [campo])).query.sql_with_params()
+    etiquetas = dict(CAMPOS_DH)
+    select = sql_busqueda(sub_sql, campo, [(c, comillas_ident(etiquetas[c])) for c in seleccion])
+
+    nombre = f"derechohabientes_busqueda_{campo}_{datetime.date.today():%Y%m%d}.csv"
+    try:
+        return respuesta_copy_csv(2025, select, sub_params, nombre, preparar=preparar_llaves(llaves))
+    except Exception as e:
+        return HttpResponseBadRequest(f"Error en la búsqueda masiva: {e}")
+
+@login_required
+@require_GET
+def api_buscar_derechohabientes(request):
+    """Búsqueda aproximada por nombre o CURP (top-N por similitud de trigramas, ver busqueda_dh.py)."""
+    try: limite = int(request.GET.get("limite", LIMITE_DEFECTO))
+    except ValueError: limite = LIMITE_DEFECTO
+    try:
+        resultados = buscar_derechohabientes(
+            connection, request.GET.get("q", ""), limite, request.GET.get("estado") or None,
+        )
+        return JsonRapidoResponse({"resultados": resultados})
+    except Exception as e:
+        print(f"Error en api_buscar_derechohabientes: {e}")
+        return JsonResponse({"error": str(e)}, status=500)
+
 # ==========================================
 # 💬 COMENTARIOS Y AJAX
 # ==========================================
 
 @login_required
 def comentarios_por_ceda(request):
-    from datetime import datetime
     if request.method == "POST":
         id_ceda = request.POST.get("id_ceda_agricultura")
         texto = request.POST.get("comentario", "").strip()
         if id_ceda and texto:
-            with psycopg_conn.cursor() as cur:
-                cur.execute("INSERT INTO comentarios_ceda (id_ceda_agricultura, comentario, fecha) VALUES (%s, %s, %s)", 
-                            (id_ceda, texto, datetime.now()))
-                psycopg_conn.commit()
+            # El router lo guarda en la BD del año activo
+            ComentarioCEDA.objects.create(id_ceda_agricultura=id_ceda, comentario=texto)
         return redirect("comentarios_por_ceda")
 
+    anio = get_anio_context(request)
+    tabla = tabla_para_anio(anio, "vista_comentarios_ceda")
+    conn = conexion_para_anio(anio)
     where, params, ctx = _aplicar_filtros_get(request, ["unidad_operativa", "estado", "zona_operativa", "id_ceda_agricultura"])
     params = [p for p in params if p not in ("", None)]
     
-    with connection.cursor() as cur:
-        cur.execute("SELECT DISTINCT unidad_operativa FROM vista_comentarios_ceda WHERE unidad_operativa IS NOT NULL ORDER BY 1")
-        ctx["unidades"] = [r[0] for r in cur.fetchall()]
+    ctx["unidades"] = opciones_filtro(conn, anio, tabla, ["unidad_operativa"])["unidad_operativa"]
 
     if not params:
         ctx["filtro_aplicado"] = False
         return render(request, "fertilizantes/comentarios_por_ceda.html", ctx)
 
-    query = f"SELECT * FROM vista_comentarios_ceda {where} ORDER BY unidad_operativa, estado, zona_operativa, nombre_cedas"
-    ctx["df"] = pd.read_sql(query, con=engine, params=[tuple(params)])
+    query = f"SELECT * FROM {tabla} {where} ORDER BY unidad_operativa, estado, zona_operativa, nombre_cedas"
+    import pandas as pd  # pandas sólo se carga en las vistas que lo usan
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        columnas = [c[0] for c in cur.description]
+        ctx["df"] = pd.DataFrame(cur.fetchall(), columns=columnas)
     ctx["filtro_aplicado"] = True
     return render(request, "fertilizantes/comentarios_por_ceda.html", ctx)
 
@@ -1193,18 +939,16 @@ def ajax_zonas_por_filtros(request):
     unidad, estado = request.GET.get("unidad", "").strip(), request.GET.get("estado", "").strip()
     if not unidad and not estado: return JsonResponse({"zonas": []})
     
-    query, params = "SELECT DISTINCT zona_operativa FROM vista_comentarios_ceda WHERE 1=1", []
-    if unidad: query += " AND unidad_operativa = %s"; params.append(unidad)
-    if estado: query += " AND estado = %s"; params.append(estado)
-    
-    try:
-        zonas = pd.read_sql(query, con=engine, params=params)
-        lista = sorted(zonas["zona_operativa"].dropna().unique().tolist())
-    except: lista = []
+    anio = get_anio_context(request)
+    filtros = {"unidad_operativa": unidad, "estado": estado}
+    lista = opciones_filtro(
+        conexion_para_anio(anio), anio, tabla_para_anio(anio, "vista_comentarios_ceda"), ["zona_operativa"], filtros,
+    )["zona_operativa"]
     return JsonResponse({"zonas": lista})
 
 @require_GET
 @login_required
+@respuesta_condicional
 def ajax_filtros_generales(request):
     tabla, unidad, estado = request.GET.get("tabla"), request.GET.get("unidad_operativa"), request.GET.get("estado")
     anio = get_anio_context(request)
@@ -1230,25 +974,21 @@ def ajax_filtros_generales(request):
     col_uo = tablas_validas.get(tabla, "unidad_operativa")
     resp = {"estados": [], "zonas": []}
 
-    try:
-        with connection.cursor() as cur:
-            sql = f"SELECT DISTINCT estado FROM {tabla} " + (f"WHERE {col_uo} = %s" if unidad else "") + " ORDER BY estado"
-            cur.execute(sql, [unidad] if unidad else [])
-            resp["estados"] = [r[0] for r in cur.fetchall()]
-            
-            if estado:
-                sql = f"SELECT DISTINCT zona_operativa FROM {tabla} WHERE estado = %s" + (f" AND {col_uo} = %s" if unidad else "") + " ORDER BY 1"
-                cur.execute(sql, [estado, unidad] if unidad else [estado])
-                resp["zonas"] = [r[0] for r in cur.fetchall()]
-    except Exception: pass
+    # Las tablas con el año en el nombre ya son las del año activo
+    tabla_real = tabla if anio in tabla else tabla_para_anio(anio, tabla)
+    conn = conexion_para_anio(anio)
+    resp["estados"] = opciones_filtro(conn, anio, tabla_real, ["estado"], {col_uo: unidad})["estado"]
+    if estado:
+        resp["zonas"] = opciones_filtro(conn, anio, tabla_real, ["zona_operativa"], {col_uo: unidad, "estado": estado})["zona_operativa"]
     return JsonResponse(resp)
 
 from datetime import date # Asegúrate de tener este import arriba
 
 @login_required
+@respuesta_condicional
 def vista_estadisticas_inventarios_campo(request):
     # 1. Configuración dinámica
-    tabla, conn, es_django = get_table_and_conn(request, "estadisticas_inventarios_campo")
+    tabla, conn = get_table_and_conn(request, "estadisticas_inventarios_campo")
     
     # 2. Parámetros GET
     u = request.GET.get('unidad_operativa')
@@ -1275,80 +1015,69 @@ def vista_estadisticas_inventarios_campo(request):
         'sin_reporte': 0
     }
 
-    try:
-        with conn.cursor() as cursor:
-            # A) Cargar Unidades
-            cursor.execute(f"SELECT DISTINCT unidad_operativa FROM {tabla} WHERE unidad_operativa IS NOT NULL ORDER BY 1")
-            unidades = [r[0] for r in cursor.fetchall() if r[0]]
-
-            # B) Cargar Datos
-            if params:
-                cursor.execute(f"SELECT * FROM {tabla} {where} ORDER BY estado", params)
+    with conn.cursor() as cursor:
+        # A) Cargar Unidades (catálogo en caché)
+        unidades = opciones_filtro(conn, get_anio_context(request), tabla, ["unidad_operativa"])["unidad_operativa"]
+
+        # B) Cargar Datos
+        if params:
+            cursor.execute(f"SELECT * FROM {tabla} {where} ORDER BY estado", params)
+            cols = [col[0] for col in cursor.description]
+            raw_data = [dict(zip(cols, f)) for f in cursor.fetchall()]
+            
+            # C) Procesamiento Lógico
+            from datetime import date, datetime
+            hoy = date.today()
+            
+            for d in raw_data:
+                # Diferencias
+                dif_dap = d.get('dap_campo_vs_sigap') or 0
+                dif_urea = d.get('urea_campo_vs_sigap') or 0
                 
-                if es_django:
-                    cols = [col[0] for col in cursor.description]
-                else:
-                    cols = [col.name if hasattr(col, 'name') else col[0] for col in cursor.description]
+                if dif_dap < -1.0: resumen['faltantes_graves'] += 1
+                elif dif_dap < -0.01: resumen['faltantes_menores'] += 1
+                elif dif_dap > 1.0: resumen['excedentes_graves'] += 1
+                elif dif_dap > 0.01: resumen['excedentes_menores'] += 1
                 
-                raw_data = [dict(zip(cols, f)) for f in cursor.fetchall()]
+                if dif_urea < -1.0: resumen['faltantes_graves'] += 1
+                elif dif_urea < -0.01: resumen['faltantes_menores'] += 1
+                elif dif_urea > 1.0: resumen['excedentes_graves'] += 1
+                elif dif_urea > 0.01: resumen['excedentes_menores'] += 1
+
+                # Cumplimiento (CORREGIDO)
+                fecha_rep = d.get('fecha_ultimo_reporte')
                 
-                # C) Procesamiento Lógico
-                from datetime import date, datetime
-                hoy = date.today()
+                if isinstance(fecha_rep, str):
+                    try: fecha_rep = parse_date(fecha_rep)
+                    except: fecha_rep = None
                 
-                for d in raw_data:
-                    # Diferencias
-                    dif_dap = d.get('dap_campo_vs_sigap') or 0
-                    dif_urea = d.get('urea_campo_vs_sigap') or 0
-                    
-                    if dif_dap < -1.0: resumen['faltantes_graves'] += 1
-                    elif dif_dap < -0.01: resumen['faltantes_menores'] += 1
-                    elif dif_dap > 1.0: resumen['excedentes_graves'] += 1
-                    elif dif_dap > 0.01: resumen['excedentes_menores'] += 1
-                    
-                    if dif_urea < -1.0: resumen['faltantes_graves'] += 1
-                    elif dif_urea < -0.01: resumen['faltantes_menores'] += 1
-                    elif dif_urea > 1.0: resumen['excedentes_graves'] += 1
-                    elif dif_urea > 0.01: resumen['excedentes_menores'] += 1
-
-                    # Cumplimiento (CORREGIDO)
-                    fecha_rep = d.get('fecha_ultimo_reporte')
-                    
-                    if isinstance(fecha_rep, str):
-                        try: fecha_rep = parse_date(fecha_rep)
-                        except: fecha_rep = None
-                    
-                    # Si es datetime, convertir a date para poder restar con 'hoy'
-                    if isinstance(fecha_rep, datetime):
-                        fecha_rep = fecha_rep.date()
-                        
-                    dias_atraso = (hoy - fecha_rep).days if fecha_rep else 999
+                # Si es datetime, convertir a date para poder restar con 'hoy'
+                if isinstance(fecha_rep, datetime):
+                    fecha_rep = fecha_rep.date()
                     
-                    dap_sis = abs(d.get('dap_sigap') or 0)
-                    urea_sis = abs(d.get('urea_sigap') or 0)
-                    dap_fis = abs(d.get('inventario_dap_ultimo') or 0)
-                    urea_fis = abs(d.get('inventario_urea_ultimo') or 0)
-
-                    es_cero_absoluto = (dap_sis < 0.01 and urea_sis < 0.01 and dap_fis < 0.01 and urea_fis < 0.01)
-                    
-                    if dias_atraso <= 1:
-                        d['cumplimiento_status'] = True
-                        d['dias_atraso'] = 0
-                    elif es_cero_absoluto:
-                        d['cumplimiento_status'] = True
-                        d['dias_atraso'] = dias_atraso
-                    else:
-                        d['cumplimiento_status'] = False
-                        d['dias_atraso'] = dias_atraso
-                        resumen['sin_reporte'] += 1
-                    
-                    datos.append(d)
-            else:
-                mensaje = "Seleccione al menos un filtro para consultar."
+                dias_atraso = (hoy - fecha_rep).days if fecha_rep else 999
+                
+                dap_sis = abs(d.get('dap_sigap') or 0)
+                urea_sis = abs(d.get('urea_sigap') or 0)
+                dap_fis = abs(d.get('inventario_dap_ultimo') or 0)
+                urea_fis = abs(d.get('inventario_urea_ultimo') or 0)
 
-    finally:
-        if not es_django and conn:
-            conn.close()
+                es_cero_absoluto = (dap_sis < 0.01 and urea_sis < 0.01 and dap_fis < 0.01 and urea_fis < 0.01)
+                
+                if dias_atraso <= 1:
+                    d['cumplimiento_status'] = True
+                    d['dias_atraso'] = 0
+                elif es_cero_absoluto:
+                    d['cumplimiento_status'] = True
+                    d['dias_atraso'] = dias_atraso
+                else:
+                    d['cumplimiento_status'] = False
+                    d['dias_atraso'] = dias_atraso
+                    resumen['sin_reporte'] += 1
+                
+                datos.append(d)
+        else:
+            mensaje = "Seleccione al menos un filtro para consultar."
 
     return render(request, "fertilizantes/vista_estadisticas_inventarios_campo.html", {
         "datos": datos, 
@@ -1408,6 +1137,7 @@ def _build_where_and_params(q):
 # ==========================================
 
 @login_required
+@respuesta_condicional(anio="2025")
 def vista_fletes(request):
     """
     Consulta de fletes con Paginación en Servidor y diseño robusto.
@@ -1462,85 +1192,32 @@ def vista_fletes(request):
     if request.GET.get("csv") == "1":
         sql = f"SELECT {', '.join(cols)} FROM {MATVIEW} {where} ORDER BY fecha_de_salida DESC NULLS LAST"
         
-        # Usamos generator para StreamingHttpResponse (igual que en Derechohabientes)
-        def filas():
-            yield cols # Header
-            with connection.cursor() as cur:
-                cur.execute(sql, params)
-                while True:
-                    rows = cur.fetchmany(5000)
-                    if not rows: break
-                    for row in rows:
-                        # Limpiamos datos para evitar errores de codificación
-                        yield [smart_str(v) if v is not None else "" for v in row]
-
-        pseudo = io.StringIO()
-        writer = csv.writer(pseudo)
-
-        def stream():
-            first = True
-            for row in filas():
-                pseudo.seek(0)
-                pseudo.truncate(0)
-                writer.writerow(row)
-                data = pseudo.getvalue()
-                if first:
-                    data = '\ufeff' + data  # BOM para Excel
-                    first = False
-                yield data
-
-        response = StreamingHttpResponse(stream(), content_type="text/csv; charset=utf-8")
-        response["Content-Disposition"] = 'attachment; filename="consulta_fletes.csv"'
-        return response
+        # COPY ... TO STDOUT: PostgreSQL arma el CSV y los bytes van directo al cliente
+        return respuesta_copy_csv(2025, sql, params, "consulta_fletes.csv")
+
+    # --- MODO 1b: DESCARGA PARQUET / ARROW ---
+    formato = request.GET.get("formato")
+    if formato in FORMATOS_ARROW:
+        if not HAS_ARROW:
+            return HttpResponseBadRequest("La exportación Parquet/Arrow requiere pyarrow en el servidor.")
+        sql = f"SELECT {', '.join(cols)} FROM {MATVIEW} {where} ORDER BY fecha_de_salida DESC NULLS LAST"
+        return respuesta_arrow_streaming(2025, sql, params, cols, "consulta_fletes", formato)
 
     # --- MODO 2: PANTALLA (Paginada) ---
     datos_paginados = None
     
     # Solo consultamos si hay filtros aplicados para evitar carga inicial pesada
     if request.GET:
-        # A) Conteo total
-        count_sql = f"SELECT COUNT(*) FROM {MATVIEW} {where}"
-        with connection.cursor() as cur:
-            cur.execute(count_sql, params)
-            total_registros = cur.fetchone()[0]
-
-        # B) Paginación manual
-        try:
-            page_number = int(request.GET.get("page", 1))
-        except ValueError:
-            page_number = 1
-            
-        page_size = 100
-        offset = (page_number - 1) * page_size
-        
-        data_sql = f"""
-            SELECT {', '.join(cols)} 
-            FROM {MATVIEW} 
-            {where} 
-            ORDER BY fecha_de_salida DESC NULLS LAST 
-            LIMIT {page_size} OFFSET {offset}
-        """
-        
-        with connection.cursor() as cur:
-            cur.execute(data_sql, params)
-            rows = cur.fetchall()
-            page_obj = [dict(zip(cols, row)) for row in rows]
-
-        # C) Crear objeto Paginator "falso" para el template
-        class FakePaginator:
-            def __init__(self, total, size, current):
-                self.count = total
-                self.num_pages = math.ceil(total / size)
-                self.current = current
-                self.has_next = current < self.num_pages
-                self.has_previous = current > 1
-                self.next_page_number = current + 1
-                self.previous_page_number = current - 1
-                self.start_index = offset + 1
-                self.end_index = min(offset + size, total)
-
-        datos_paginados = FakePaginator(total_registros, page_size, page_number)
-        datos_paginados.object_list = page_obj 
+        # A) Conteo total: estimado sin filtros, exacto en caché o "más de N"
+        conteo = contar(connection, "2025", MATVIEW, where, params, modo=request.GET.get("conteo", "auto"))
+
+        # B) Paginación por llave (fecha_de_salida, folio_del_flete): sin OFFSET,
+        #    la página N cuesta lo mismo que la página 1.
+        datos_paginados = paginar_keyset(
+            connection, MATVIEW, cols, "fecha_de_salida", "folio_del_flete",
+            where=where, params=params, cursor=request.GET.get("cursor"),
+        )
+        datos_paginados.asignar_conteo(conteo)
 
     return render(request, "fertilizantes/vistas_fletes.html", {
         "columnas_disponibles": all_cols,
@@ -1552,25 +1229,48 @@ def vista_fletes(request):
     })
 
 @require_GET
-def api_fletes_opciones(request):
+@respuesta_condicional(anio="2025")
+async def api_fletes_opciones(request):
     q = {k: request.GET.get(k) for k in ["unidad_operativa", "estado", "zona_operativa"]}
-    where, params = _build_where_and_params(q)
-    def distinct_of(field):
-        try:
-            with connection.cursor() as cur:
-                cur.execute(f"SELECT DISTINCT {field} FROM {MATVIEW} {where} ORDER BY {field} NULLS LAST;", params)
-                return [r[0] for r in cur.fetchall() if r[0] not in (None, "")]
-        except: return []
-    
-    return JsonResponse({
-        "unidad_operativa": distinct_of("unidad_operativa"), "estado": distinct_of("estado"),
-        "zona_operativa": distinct_of("zona_operativa"), "id_ceda_agricultura": distinct_of("id_ceda_agricultura"),
-        "estatus": distinct_of("estatus"), "abreviacion_producto": distinct_of("abreviacion_producto"),
-        "cdf_destino_original": distinct_of("cdf_destino_original"), "cdf_destino_final": distinct_of("cdf_destino_final"),
-    })
+    campos = ["unidad_operativa", "estado", "zona_operativa", "id_ceda_agricultura",
+              "estatus", "abreviacion_producto", "cdf_destino_original", "cdf_destino_final"]
+    # Catálogo en caché por versión de datos; si falta, los DISTINCT corren en paralelo
+    return JsonResponse(await opciones_filtro_async("2025", MATVIEW, campos, q))
+
+def _resumen_fletes(where, params):
+    """Totales de la consulta de fletes (mismo resultado para todas sus páginas)."""
+    agg_sql = f"""
+        SELECT COUNT(*)::int, COALESCE(SUM(toneladas_iniciales), 0)::float, COALESCE(SUM(toneladas_en_el_destino), 0)::float,
+               COUNT(*) FILTER (WHERE abreviacion_producto = 'DAP')::int, COUNT(*) FILTER (WHERE abreviacion_producto = 'UREA')::int,
+               COALESCE(SUM(CASE WHEN abreviacion_producto='DAP' THEN toneladas_iniciales END), 0)::float,
+               COALESCE(SUM(CASE WHEN abreviacion_producto='DAP' THEN toneladas_en_el_destino END), 0)::float,
+               COALESCE(SUM(CASE WHEN abreviacion_producto='UREA' THEN toneladas_iniciales END), 0)::float,
+               COALESCE(SUM(CASE WHEN abreviacion_producto='UREA' THEN toneladas_en_el_destino END), 0)::float
+        FROM {MATVIEW} {where};
+    """
+    with connection.cursor() as cur:
+        cur.execute(agg_sql, params)
+        a = cur.fetchone()
+    return {
+        "total": a[0], "sum_toneladas_iniciales": a[1], "sum_toneladas_en_el_destino": a[2],
+        "DAP": {"count": a[3], "sum_toneladas_iniciales": a[5], "sum_toneladas_en_el_destino": a[6]},
+        "UREA": {"count": a[4], "sum_toneladas_iniciales": a[7], "sum_toneladas_en_el_destino": a[8]},
+    }
+
+# Mismo tope que antes del cursor: quien no manda "limite" recibe lo de siempre
+API_FLETES_LIMITE = 10000
+API_FLETES_LIMITE_MAX = 10000
 
 @require_POST
 def api_fletes_consultar(request):
+    """
+    Consulta paginada por cursor. Body JSON: filtros, "columnas",
+    "limite" (default y máx. 10,000), "cursor" (next_cursor de la página
+    anterior) y "formato": "filas" (default, lista de filas, Decimal como
+    texto igual que siempre) o "columnar" (un arreglo por columna +
+    diccionarios para textos repetidos, serializado con JsonRapidoResponse:
+    Decimal como número). El resumen sólo se calcula en la primera página.
+    """
     try: body = json.loads(request.body.decode("utf-8"))
     except: return HttpResponseBadRequest("JSON inválido")
     
@@ -1584,34 +1284,31 @@ def api_fletes_consultar(request):
     cols = [c for c in user_cols if c in all_cols]
     if not cols: cols = [c for c in ["folio_del_flete", "unidad_operativa", "estado", "zona_operativa", "id_ceda_agricultura", "estatus", "abreviacion_producto", "fecha_de_salida", "fecha_de_entrega"] if c in all_cols]
 
+    try: limite = min(max(int(body.get("limite") or API_FLETES_LIMITE), 1), API_FLETES_LIMITE_MAX)
+    except (TypeError, ValueError): limite = API_FLETES_LIMITE
+
     where, params = _build_where_and_params(q)
-    sql = f"SELECT {', '.join(cols)} FROM {MATVIEW} {where} LIMIT 10000;"
+    cursor = body.get("cursor")
     
     try:
-        with connection.cursor() as cur:
-            cur.execute(sql, params)
-            rows = cur.fetchall()
-            
-            # Resumen Agregado
-            agg_sql = f"""
-                SELECT COUNT(*)::int, COALESCE(SUM(toneladas_iniciales), 0)::float, COALESCE(SUM(toneladas_en_el_destino), 0)::float,
-                       COUNT(*) FILTER (WHERE abreviacion_producto = 'DAP')::int, COUNT(*) FILTER (WHERE abreviacion_producto = 'UREA')::int,
-                       COALESCE(SUM(CASE WHEN abreviacion_producto='DAP' THEN toneladas_iniciales END), 0)::float,
-                       COALESCE(SUM(CASE WHEN abreviacion_producto='DAP' THEN toneladas_en_el_destino END), 0)::float,
-                       COALESCE(SUM(CASE WHEN abreviacion_producto='UREA' THEN toneladas_iniciales END), 0)::float,
-                       COALESCE(SUM(CASE WHEN abreviacion_producto='UREA' THEN toneladas_en_el_destino END), 0)::float
-                FROM {MATVIEW} {where};
-            """
-            cur.execute(agg_sql, params)
-            a = cur.fetchone()
-            summary = {
-                "total": a[0], "sum_toneladas_iniciales": a[1], "sum_toneladas_en_el_destino": a[2],
-                "DAP": {"count": a[3], "sum_toneladas_iniciales": a[5], "sum_toneladas_en_el_destino": a[6]},
-                "UREA": {"count": a[4], "sum_toneladas_iniciales": a[7], "sum_toneladas_en_el_destino": a[8]},
-            }
+        pagina = paginar_keyset(
+            connection, MATVIEW, cols, "fecha_de_salida", "folio_del_flete",
+            where=where, params=params, cursor=cursor, tamano=limite,
+        )
+        summary = None if cursor else _resumen_fletes(where, params)
     except Exception as e: return HttpResponseBadRequest(f"Error: {e}")
 
-    return JsonResponse({"columns": cols, "rows": rows, "count": len(rows), "summary": summary})
+    rows = [[d[c] for c in cols] for d in pagina.object_list]
+    resp = {
+        "columns": cols, "count": len(rows), "summary": summary,
+        "next_cursor": pagina.next_cursor or None,
+    }
+    if body.get("formato") == "columnar":
+        resp["formato"] = "columnar"
+        resp["data"], resp["dict"] = a_columnar(cols, rows)
+        return JsonRapidoResponse(resp)
+    resp["rows"] = rows
+    return JsonResponse(resp)
 
 @require_POST
 def api_fletes_exportar_csv(request):
@@ -1628,25 +1325,20 @@ def api_fletes_exportar_csv(request):
     cols = [c for c in user_cols if c in all_cols] or all_cols
     
     where, params = _build_where_and_params(q)
-    sql = f"SELECT {', '.join(cols)} FROM {MATVIEW} {where};"
+    sql = f"SELECT {', '.join(cols)} FROM {MATVIEW} {where}"
     
-    try:
-        with connection.cursor() as cur:
-            cur.execute(sql, params)
-            rows = cur.fetchall()
+    # COPY ... TO STDOUT en streaming: la conexión se libera (y el COPY se
+    # cancela) si el cliente interrumpe la descarga.
+    try: return respuesta_copy_csv(2025, sql, params, "fletes_consulta.csv")
     except Exception as e: return HttpResponseBadRequest(f"Error: {e}")
 
-    response = HttpResponse(content_type="text/csv; charset=utf-8")
-    response["Content-Disposition"] = 'attachment; filename="fletes_consulta.csv"'
-    writer = csv.writer(response)
-    writer.writerow(cols)
-    for r in rows: writer.writerow([smart_str(v) for v in r])
-    return response
-
 
 # ==============================================
 #   OCR RÁPIDO (MEJORADO)
 # ==============================================
+# El OCR corre en un pool de procesos (ocr.py): ocr_extract sólo encola el
+# trabajo y el navegador consulta ocr_estado hasta tener todas las páginas.
+# ocr.py (PIL, Tesseract, pdf2image) se importa hasta la primera petición de OCR.
 
 def _decode_data_url(data_url: str) -> bytes:
     if not data_url.startswith("data:"):
@@ -1654,30 +1346,6 @@ def _decode_data_url(data_url: str) -> bytes:
     header, b64data = data_url.split(",", 1)
     return base64.b64decode(b64data)
 
-def _procesar_imagen_pil(img: Image.Image, lang: str = "spa+eng", config: str = "--psm 6") -> str:
-    """
-    Preprocesamiento optimizado para capturas de pantalla y documentos.
-    """
-    # 1. Convertir a Escala de Grises
-    img = ImageOps.grayscale(img)
-    
-    # 2. ✨ MEJORA CLAVE: Re-escalado (Upscaling) 
-    # Aumentar el tamaño 2x ayuda a Tesseract a ver los espacios entre palabras
-    width, height = img.size
-    if width < 2000: # Solo escalamos si no es gigante
-        new_size = (width * 2, height * 2)
-        img = img.resize(new_size, Image.Resampling.LANCZOS)
-    
-    # 3. Mejora de Contraste (Sin binarización agresiva ni desenfoque)
-    img = ImageOps.autocontrast(img)
-    
-    # (Opcional) Enfocar ligeramente los bordes
-    # img = img.filter(ImageFilter.SHARPEN) 
-
-    # 4. Ejecutar OCR
-    texto = pytesseract.image_to_string(img, lang=lang, config=config)
-    return texto.strip()
-
 @login_required
 def ocr_page(request):
     return render(request, "fertilizantes/ocr_page.html")
@@ -1690,73 +1358,74 @@ def ocr_extract(request):
         lang = "spa+eng"
         psm = "6"
         whitelist = ""
-        
-        # Detectar origen de datos (FormData vs JSON)
-        # El fetch de JS usa FormData normalmente, pero tu versión anterior usaba JSON para clipboard.
-        # Aquí unificamos la lógica de extracción de parámetros.
-        
+
+        # Detectar origen de datos (FormData vs JSON) y obtener bytes + tipo
         if request.content_type.startswith("multipart/form-data"):
-            # Caso: Archivo subido o FormData standard
             lang = request.POST.get("lang", lang)
             psm = request.POST.get("psm", psm)
             whitelist = request.POST.get("whitelist", "")
-            
-            # Construir config string
-            cfg = f"--oem 3 --psm {psm}"
-            if whitelist:
-                cfg += f' -c tessedit_char_whitelist="{whitelist}"'
 
             if "file" in request.FILES:
                 f = request.FILES["file"]
-                if f.name.lower().endswith(".pdf"):
-                    if not HAS_PDF: return HttpResponseBadRequest("Servidor sin soporte PDF.")
-                    images = convert_from_bytes(f.read(), dpi=300)
-                    textos = [_procesar_imagen_pil(img, lang, cfg) for img in images]
-                    return JsonResponse({"texto": "\n\n".join(textos)})
-                else:
-                    img = Image.open(f)
-                    texto = _procesar_imagen_pil(img, lang, cfg)
-                    return JsonResponse({"texto": texto})
-            
+                datos, es_pdf = f.read(), f.name.lower().endswith(".pdf")
             elif "clipboard_data" in request.POST:
-                # Caso FormData con base64
                 data_url = request.POST["clipboard_data"]
-                bytes_data = _decode_data_url(data_url)
-                
-                if "application/pdf" in data_url:
-                    if not HAS_PDF: return HttpResponseBadRequest("Servidor sin soporte PDF.")
-                    images = convert_from_bytes(bytes_data, dpi=300)
-                    textos = [_procesar_imagen_pil(img, lang, cfg) for img in images]
-                    return JsonResponse({"texto": "\n\n".join(textos)})
-                else:
-                    img = Image.open(io.BytesIO(bytes_data))
-                    texto = _procesar_imagen_pil(img, lang, cfg)
-                    return JsonResponse({"texto": texto})
+                datos, es_pdf = _decode_data_url(data_url), "application/pdf" in data_url
+            else:
+                return HttpResponseBadRequest("Solicitud no válida.")
 
-        # Fallback si el JS envía JSON puro (tu versión anterior)
+        # Fallback si el JS envía JSON puro (versión anterior)
         elif request.content_type.startswith("application/json"):
             body = json.loads(request.body.decode("utf-8"))
-            # Extraer params del body si existen, o usar defaults
-            # (Tu JS anterior no los mandaba en el JSON, pero por si acaso)
-            
             data_url = body.get("data_url")
             if not data_url: return HttpResponseBadRequest("Falta data_url")
-            
-            # Config default para JSON ya que no vienen en el body actual del JS
-            cfg = f"--oem 3 --psm 6" 
-            
-            img_bytes = _decode_data_url(data_url)
-            
-            if "application/pdf" in data_url:
-                 images = convert_from_bytes(img_bytes, dpi=300)
-                 textos = [_procesar_imagen_pil(img, "spa+eng", cfg) for img in images]
-                 return JsonResponse({"texto": "\n\n".join(textos)})
-            else:
-                img = Image.open(io.BytesIO(img_bytes))
-                texto = _procesar_imagen_pil(img, "spa+eng", cfg)
-                return JsonResponse({"texto": texto})
+            datos, es_pdf = _decode_data_url(data_url), "application/pdf" in data_url
+
+        else:
+            return HttpResponseBadRequest("Solicitud no válida.")
+
+        # Construir config string
+        cfg = f"--oem 3 --psm {psm}"
+        if whitelist:
+            cfg += f' -c tessedit_char_whitelist="{whitelist}"'
 
-        return HttpResponseBadRequest("Solicitud no válida.")
+        from . import ocr
+        if es_pdf:
+            if not ocr.HAS_PDF: return HttpResponseBadRequest("Servidor sin soporte PDF.")
+            trabajo = ocr.enviar_pdf(request.user.pk, datos, lang, cfg)
+        else:
+            trabajo = ocr.enviar_imagen(request.user.pk, datos, lang, cfg)
+
+        # 202: el OCR sigue en el pool; el avance se consulta en ocr_estado
+        return JsonResponse({"job_id": trabajo.id, "total": len(trabajo.textos)}, status=202)
 
     except Exception as e:
-        return HttpResponseBadRequest(f"Error procesando OCR: {e}")
\ No newline at end of file
+        return HttpResponseBadRequest(f"Error procesando OCR: {e}")
+
+@login_required
+@require_GET
+def ocr_estado(request, job_id):
+    """Avance de un trabajo de OCR; ?desde=N devuelve sólo las páginas a partir de la N (0 = todas)."""
+    from . import ocr
+    trabajo = ocr.obtener_trabajo(job_id, request.user.pk)
+    if trabajo is None:
+        return JsonResponse({"error": "Trabajo no encontrado."}, status=404)
+    try: desde = max(int(request.GET.get("desde", 0)), 0)
+    except ValueError: desde = 0
+    return JsonResponse(trabajo.estado(desde))
+
+# ==========================================
+# 🩺 DIAGNÓSTICO (solo staff)
+# ==========================================
+
+@staff_member_required
+def diagnostico_sql(request):
+    """Consultas y tiempo SQL por vista, y bitácora de SQL lento de este proceso."""
+    if request.method == "POST" and "reiniciar" in request.POST:
+        instrumentacion.reiniciar()
+        return redirect("diagnostico_sql")
+    return render(request, "fertilizantes/diagnostico_sql.html", {
+        "vistas": instrumentacion.estadisticas_por_vista(),
+        "lentas": instrumentacion.consultas_lentas(),
+        "umbral_ms": instrumentacion.SQL_LENTO_MS,
+    })
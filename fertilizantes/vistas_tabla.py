@@ -0,0 +1,210 @@
+"""
+Vistas de tabla declarativas.
+
+La mayoría de las vistas de detalle hacen lo mismo: resolver la tabla del
+año, armar el WHERE con los filtros del GET, traer las filas, llenar los
+combos de filtros y mostrar una plantilla. Aquí ese patrón se describe una
+vez (VistaTabla) y vista_tabla() genera la función de vista, aplicando en
+un solo lugar:
+
+- lista explícita de columnas (sólo lo que usa la plantilla, no SELECT *;
+  las que no existan en la tabla del año salen como NULL);
+- totales del pie en la misma consulta (agregados.py);
+- combos de filtros en un solo viaje y en caché (catalogos.py);
+- filas como namedtuple (la plantilla usa fila.campo igual que con dicts);
+- resultado sin filtros (la primera visita, lo que deja precalentar.py)
+  en caché hasta la siguiente carga de datos (version_datos.py), además
+  del ETag / 304. Los resultados filtrados no se guardan: las
+  combinaciones (p.ej. rangos de fechas libres) no tienen límite y la
+  caché es memoria de cada proceso.
+"""
+
+import collections
+import datetime
+
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.shortcuts import render
+
+from .agregados import consultar_tuplas_con_totales
+from .catalogos import opciones_filtro
+from .routers import conexion_para_anio
+from .tablas import tabla_para_anio
+from .version_datos import clave_cache, respuesta_condicional
+
+RESULTADO_TTL = 24 * 60 * 60
+# Resultados sin filtros más grandes no se guardan en caché (memoria del proceso)
+RESULTADO_MAX_FILAS = 2000
+
+# nombre → VistaTabla de cada vista generada (las recorre precalentar.py)
+VISTAS = {}
+
+# Nombre en la plantilla del valor seleccionado de cada parámetro GET
+NOMBRES_SELECCION = {
+    "unidad_operativa": "unidad_seleccionada",
+    "estado": "estado_seleccionado",
+    "zona_operativa": "zona_seleccionada",
+}
+
+
+class Filtro:
+    """Parámetro GET → condición `columna operador %s` (columna por omisión = parámetro)."""
+
+    def __init__(self, param, columna=None, operador="=", contexto=None):
+        self.param = param
+        self.columna = columna or param
+        self.operador = operador
+        self.contexto = contexto or NOMBRES_SELECCION.get(param, param)
+
+
+class VistaTabla:
+    """
+    Descripción de una vista de tabla:
+
+    - tabla:      nombre 2025 (se traduce para 2026 con tablas.py).
+    - plantilla:  plantilla a renderizar; las filas van en "datos".
+    - columnas:   columnas del SELECT (admite "expr AS alias").
+    - orden:      "ORDER BY ..." (o "").
+    - filtros:    lista de Filtro (o nombres de parámetro).
+    - opciones:   {variable de plantilla: columna} para los combos.
+    - totales:    {nombre: agregado SQL}; van en contexto[totales_en], o
+                  sueltos en el contexto si totales_en es None.
+    - condicion:  condición fija que se agrega al WHERE.
+    - requiere_filtro: sin filtros no se consultan filas (sólo combos).
+    """
+
+    def __init__(self, tabla, plantilla, columnas, orden="", filtros=(), opciones=None,
+                 totales=None, totales_en="totales", condicion="", requiere_filtro=False):
+        self.tabla = tabla
+        self.plantilla = plantilla
+        self.columnas = list(columnas)
+        self.orden = orden
+        self.filtros = [f if isinstance(f, Filtro) else Filtro(f) for f in filtros]
+        self.opciones = dict(opciones or {})
+        self.totales = dict(totales or {})
+        self.totales_en = totales_en
+        self.condicion = condicion
+        self.requiere_filtro = requiere_filtro
+
+    def where(self, valores):
+        cond, params = [], []
+        if self.condicion:
+            cond.append(self.condicion)
+        for f in self.filtros:
+            if valores.get(f.param):
+                cond.append(f"{f.columna} {f.operador} %s")
+                params.append(valores[f.param])
+        return (f"WHERE {' AND '.join(cond)}" if cond else ""), params
+
+
+def _alias(columna):
+    return columna.split(" AS ")[-1].strip() if " AS " in columna else columna.split(".")[-1].strip()
+
+
+def _llave_resultado(anio, nombre):
+    # La fecha entra en la llave por las condiciones con CURRENT_DATE (igual que en el ETag)
+    return clave_cache(anio, "vista", nombre, datetime.date.today().isoformat())
+
+
+def _columnas_de_tabla(conn, anio, tabla):
+    """Columnas reales de la tabla/vista (SELECT ... LIMIT 0), en caché por carga."""
+    llave = clave_cache(anio, "columnas", tabla)
+    cols = cache.get(llave) if llave else None
+    if cols is None:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT * FROM {tabla} LIMIT 0")
+            cols = [d[0] for d in cur.description]
+        if llave:
+            cache.set(llave, cols, RESULTADO_TTL)
+    return cols
+
+
+def _select(espec, conn, anio, tabla):
+    """
+    Lista del SELECT: las columnas pedidas que existen en la tabla; las que
+    no (p.ej. diferencias entre 2025 y 2026) salen como NULL, igual que
+    antes se mostraban vacías con SELECT *.
+    """
+    existentes = set(_columnas_de_tabla(conn, anio, tabla))
+    return ", ".join(
+        c if (" AS " in c or c in existentes) else f"NULL AS {c}"
+        for c in espec.columnas
+    )
+
+
+def _consultar(espec, conn, anio, tabla, valores):
+    where, params = espec.where(valores)
+    return consultar_tuplas_con_totales(
+        conn, tabla, espec.totales, where, params, espec.orden, _select(espec, conn, anio, tabla),
+    )
+
+
+def _opciones(espec, conn, anio, tabla):
+    ops = opciones_filtro(conn, anio, tabla, list(dict.fromkeys(espec.opciones.values())))
+    return {var: ops[col] for var, col in espec.opciones.items()}
+
+
+def _resultado(espec, nombre, conn, anio, tabla, valores):
+    """
+    (columnas, tuplas, totales). Sin filtros sale de la caché (y se guarda
+    si no es enorme); con filtros siempre se consulta.
+    """
+    llave = None if any(valores.values()) else _llave_resultado(anio, nombre)
+    resultado = cache.get(llave) if llave else None
+    if resultado is None:
+        resultado = _consultar(espec, conn, anio, tabla, valores)
+        if llave and len(resultado[1]) <= RESULTADO_MAX_FILAS:
+            cache.set(llave, resultado, RESULTADO_TTL)
+    return resultado
+
+
+def precalentar_vista(nombre, anio):
+    """
+    Deja en caché lo que necesita la primera visita (sin filtros) a la
+    vista: los combos y, si no requiere filtro, las filas y totales.
+    """
+    espec = VISTAS[nombre]
+    anio = str(anio)
+    tabla = tabla_para_anio(anio, espec.tabla)
+    conn = conexion_para_anio(anio)
+    if espec.opciones:
+        _opciones(espec, conn, anio, tabla)
+    if not espec.requiere_filtro:
+        _resultado(espec, nombre, conn, anio, tabla, {})
+
+
+def vista_tabla(espec: VistaTabla, nombre: str):
+    """Genera la función de vista (con login y respuesta condicional) para `espec`."""
+    VISTAS[nombre] = espec
+    Fila = collections.namedtuple(f"Fila_{nombre}", [_alias(c) for c in espec.columnas])
+    totales_vacios = {t: 0 for t in espec.totales}
+
+    def vista(request):
+        anio = str(request.session.get("anio_activo", "2025"))
+        tabla = tabla_para_anio(anio, espec.tabla)
+        valores = {f.param: request.GET.get(f.param) for f in espec.filtros}
+
+        filas, totales, opciones = [], dict(totales_vacios), {}
+        conn = conexion_para_anio(anio)
+        try:
+            if espec.opciones:
+                opciones = _opciones(espec, conn, anio, tabla)
+
+            if not espec.requiere_filtro or any(valores.values()):
+                _cols, tuplas, totales = _resultado(espec, nombre, conn, anio, tabla, valores)
+                filas = [Fila._make(t) for t in tuplas]
+        except Exception as e:
+            print(f"Error en {nombre}: {e}")
+
+        ctx = {"datos": filas, **opciones}
+        if espec.totales:
+            if espec.totales_en:
+                ctx[espec.totales_en] = totales
+            else:
+                ctx.update(totales)
+        for f in espec.filtros:
+            ctx[f.contexto] = valores[f.param]
+        return render(request, espec.plantilla, ctx)
+
+    vista.__name__ = vista.__qualname__ = nombre
+    return login_required(respuesta_condicional(vista))
@@ -23,6 +23,12 @@ document.addEventListener("DOMContentLoaded", () => {
         cargarKpi(Object.fromEntries(params));
       });
     }
+
+    // Carga nueva: repetir la consulta con los filtros actuales
+    escucharVersion(() => {
+      cargarKpi(form ? Object.fromEntries(new FormData(form)) : {});
+      cargarFiltros("select");
+    });
   }
 
   // 2. Detectar Resumen Estatal
@@ -37,9 +43,35 @@ document.addEventListener("DOMContentLoaded", () => {
       const el = document.getElementById(id);
       if (el) el.addEventListener("change", cargarResumen);
     });
+
+    escucharVersion(() => {
+      cargarResumen();
+      cargarFiltros("datalist");
+    });
   }
 });
 
+// ==========================================
+//  AVISO DE DATOS NUEVOS (SSE)
+// ==========================================
+
+// Escucha /api/eventos/version/ y llama a `alCambiar` sólo cuando llega una
+// versión de datos distinta de la primera (la que ya está pintada).
+// EventSource se reconecta solo cuando el servidor cierra el flujo.
+function escucharVersion(alCambiar) {
+  if (!window.EventSource) return;
+  let actual = null;
+  const fuente = new EventSource("/api/eventos/version/");
+  fuente.addEventListener("version", (e) => {
+    const { version } = JSON.parse(e.data);
+    if (actual !== null && version !== actual) {
+      console.log("🔄 Datos nuevos:", version);
+      alCambiar();
+    }
+    actual = version;
+  });
+}
+
 // ==========================================
 //  DASHBOARD NACIONAL (KPIs)
 // ==========================================
@@ -299,8 +331,10 @@ function cargarFiltros(modo) {
 function llenarSelect(id, items) {
   const el = document.getElementById(id);
   if(el) {
+    const previo = el.value;  // conservar la selección al recargar
     el.innerHTML = '<option value="">-- Todas --</option>';
     items.forEach(i => el.add(new Option(i, i)));
+    el.value = previo;
   }
 }
 